@@ -0,0 +1,106 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AnalysisCache
+
+
+def normalize_contract_text(text):
+    """
+    Приводит текст к каноническому виду: схлопывает пробельные символы.
+    Один и тот же шаблон, выгруженный из PDF или DOCX с разными переносами
+    строк, даёт одинаковый ключ. Регистр сохраняется: из кэша отдаётся
+    rewritten_text, и договор с другим написанием имён и реквизитов
+    не должен получить чужой переписанный текст.
+    """
+    return " ".join(text.split())
+
+
+def make_cache_key(text, model_name, prompt_version):
+    """
+    SHA-256 от версии промпта, имени модели и нормализованного текста.
+    """
+    h = hashlib.sha256()
+    h.update(f"{prompt_version}:{model_name}\n".encode('utf-8'))
+    h.update(normalize_contract_text(text).encode('utf-8'))
+    return h.hexdigest()
+
+
+def get_cached_analysis(text, model_name, prompt_version):
+    """
+    Возвращает сохранённый результат анализа и запись кэша или (None, None).
+    Просроченные записи не отдаются. Попадание увеличивает счётчик hits.
+    """
+    key = make_cache_key(text, model_name, prompt_version)
+    ttl = timedelta(seconds=settings.ANALYSIS_CACHE_TTL)
+    entry = AnalysisCache.objects.filter(key=key, created_at__gte=timezone.now() - ttl).first()
+    if entry is None:
+        return None, None
+
+    AnalysisCache.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    # Отдаём копию, чтобы вызывающий код не мог испортить запись
+    return json.loads(json.dumps(entry.result)), entry
+
+
+def store_analysis(text, model_name, prompt_version, result, latency):
+    """
+    Сохраняет результат анализа в кэш и выполняет вытеснение по TTL и размеру.
+    Перезапись просроченной записи сохраняет hits и latency: на них считается
+    экономия кэша (analysis_cache_stats).
+    """
+    key = make_cache_key(text, model_name, prompt_version)
+    now = timezone.now()
+    AnalysisCache.objects.update_or_create(
+        key=key,
+        defaults={
+            'model_name': model_name,
+            'result': result,
+            'created_at': now,
+            'last_used_at': now,
+        },
+        create_defaults={
+            'model_name': model_name,
+            'result': result,
+            'latency': latency,
+            'hits': 0,
+            'created_at': now,
+            'last_used_at': now,
+        },
+    )
+    evict_analysis_cache()
+
+
+def evict_analysis_cache():
+    """
+    Удаляет просроченные записи, затем самые давно использованные,
+    пока размер кэша не уложится в ANALYSIS_CACHE_MAX_ENTRIES.
+    """
+    ttl = timedelta(seconds=settings.ANALYSIS_CACHE_TTL)
+    AnalysisCache.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+
+    max_entries = settings.ANALYSIS_CACHE_MAX_ENTRIES
+    overflow = AnalysisCache.objects.count() - max_entries
+    if overflow > 0:
+        stale_ids = list(
+            AnalysisCache.objects.order_by('last_used_at').values_list('id', flat=True)[:overflow]
+        )
+        AnalysisCache.objects.filter(id__in=stale_ids).delete()
+
+
+def analysis_cache_stats():
+    """
+    Сводка по кэшу: число записей, сэкономленные вызовы LLM и секунды ожидания.
+    """
+    totals = AnalysisCache.objects.aggregate(
+        saved_calls=Sum('hits'),
+        saved_seconds=Sum(F('hits') * F('latency')),
+    )
+    return {
+        'entries': AnalysisCache.objects.count(),
+        'saved_llm_calls': totals['saved_calls'] or 0,
+        'saved_seconds': round(totals['saved_seconds'] or 0, 2),
+    }
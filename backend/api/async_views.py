@@ -0,0 +1,61 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import generics
+from rest_framework.views import APIView
+
+# Асинхронные представления DRF для ASGI (config/asgi.py, uvicorn-воркеры gunicorn).
+# DRF вызывает обработчики синхронно, поэтому dispatch переопределён: аутентификация
+# (запрос токена в БД), проверка прав и разбор тела запроса выполняются в потоке
+# через sync_to_async, а сам обработчик — корутина, которая ждёт БД, кэш и диск,
+# не занимая воркер. Под WSGI (runserver) такие представления тоже работают:
+# Django выполняет их через async_to_sync.
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView с async-обработчиками (async def get/post/...).
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method in ('POST', 'PUT', 'PATCH'):
+                # Разбор multipart пишет крупные файлы во временные файлы на диске
+                await sync_to_async(getattr)(request, 'data')
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncGenericAPIView(AsyncAPIView, generics.GenericAPIView):
+    """
+    GenericAPIView с async-обработчиками и асинхронным поиском объекта.
+    """
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).afirst()
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
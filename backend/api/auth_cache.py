@@ -0,0 +1,98 @@
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .metrics import count_cache_lookup
+
+# Кэш аутентификации по токену и ответа /api/user/info/ (Redis в продакшне).
+# Дашборд опрашивает API каждые 5 секунд, и без кэша каждый запрос стоит запроса
+# токена с пользователем, а /user/info/ — ещё профиля.
+#
+# Токен: ключ — SHA-256 токена (сам токен в кэш не попадает), значение — Token
+# с загруженным пользователем. Запись удаляется при удалении токена и при сохранении
+# пользователя (смена пароля, блокировка, изменение данных).
+#
+# Профиль: ответ /user/info/ хранится под версией пользователя, как список документов
+# в notifications.py. Изменение профиля (резерв, списание, возврат, оплата) увеличивает
+# версию после коммита транзакции: запрос, прочитавший профиль до коммита, положит
+# устаревший ответ под старую версию, и его никто не прочитает.
+
+
+def _token_key(key):
+    return f"authtoken:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def _user_info_version_key(user_id):
+    return f"userinfo:{user_id}:version"
+
+
+def _user_info_key(user_id, version):
+    return f"userinfo:{user_id}:{version}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication DRF, запрос токена и пользователя — только при промахе кэша.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_key(key)
+        token = cache.get(cache_key)
+        count_cache_lookup('auth_token', token is not None)
+        if token is None:
+            # Неизвестный или неактивный пользователь — AuthenticationFailed, в кэш не попадает
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TTL)
+        return token.user, token
+
+
+def invalidate_user_auth(user_id):
+    """
+    Удаляет из кэша токены пользователя (после коммита текущей транзакции).
+    """
+    keys = [_token_key(key) for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True)]
+    if keys:
+        transaction.on_commit(partial(cache.delete_many, keys))
+
+
+def invalidate_token(key):
+    transaction.on_commit(partial(cache.delete, _token_key(key)))
+
+
+def _bump_user_info_version(user_id):
+    key = _user_info_version_key(user_id)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def invalidate_user_info(user_id):
+    """
+    Сбрасывает кэш /user/info/ пользователя (после коммита текущей транзакции).
+    """
+    if user_id:
+        transaction.on_commit(partial(_bump_user_info_version, user_id))
+
+
+async def aget_user_info(user):
+    """
+    Ответ /user/info/: пользователь с профилем. Профиль создаётся, если его нет.
+    """
+    from .models import UserProfile
+    from .serializers import UserSerializer
+
+    version = await cache.aget(_user_info_version_key(user.id)) or 0
+    cache_key = _user_info_key(user.id, version)
+    data = await cache.aget(cache_key)
+    count_cache_lookup('user_info', data is not None)
+    if data is None:
+        profile, created = await UserProfile.objects.aget_or_create(user=user)
+        # Профиль кладётся в кэш связи: сериализатор не делает синхронный запрос
+        user.profile = profile
+        data = dict(UserSerializer(user).data)
+        await cache.aset(cache_key, data, settings.USER_INFO_CACHE_TTL)
+    return data
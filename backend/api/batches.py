@@ -0,0 +1,191 @@
+import os
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Document, UploadBatch, UserProfile
+from .notifications import publish_document_status
+from .quota import record_reservations, reserve_checks
+from .uploads import VALID_EXTENSIONS, UploadError, check_file_signature, store_upload
+
+# Пакетная загрузка: много файлов и/или ZIP-архивов одним запросом вместо
+# отдельного запроса (аутентификация, проверка лимита, постановка в очередь) на каждый договор.
+# Файлы проверяются по расширению и сигнатуре и по одному пишутся в хранилище;
+# архив распаковывается потоком — каждый файл читается из ZIP по частям прямо в хранилище.
+# Проверки резервируются на весь пакет одним условным UPDATE: либо все, либо ни одной.
+# Документы создаются одним INSERT и ставятся в очередь планировщика (api/scheduler.py) разом.
+
+ARCHIVE_EXTENSIONS = ['.zip']
+
+
+class BatchQuotaError(Exception):
+    """
+    На балансе меньше проверок, чем новых документов в пакете.
+    """
+
+    def __init__(self, required):
+        super().__init__(f"Для пакета нужно проверок: {required}")
+        self.required = required
+
+
+def _archive_member_name(info):
+    # Архивы из Проводника Windows хранят имена в cp866 без флага UTF-8
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('cp866')
+    except UnicodeError:
+        return info.filename
+
+
+def _iter_archive(archive):
+    """
+    Файлы ZIP-архива: (имя, объявленный размер, открытый поток распаковки).
+    Каталоги, скрытые файлы и служебные __MACOSX пропускаются.
+    """
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise UploadError(f"Архив {archive.name} повреждён или не является ZIP")
+    with zf:
+        for info in zf.infolist():
+            name = _archive_member_name(info)
+            base = os.path.basename(name)
+            if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            # ZipExtFile отдаёт не больше объявленного file_size и сверяет CRC
+            with zf.open(info) as stream:
+                yield base, info.file_size, File(stream, name=base)
+
+
+def store_batch_files(files, archives):
+    """
+    Проверяет и сохраняет файлы пакета. Возвращает (сохранённые, отклонённые):
+    [{"stored_name", "name", "file_hash"}] и [{"name", "error"}].
+    Превышение числа файлов или общего размера пакета — UploadError,
+    уже сохранённые файлы при этом удаляются.
+    """
+    stored, rejected = [], []
+    seen_hashes = set()
+    total_size = 0
+
+    def accept(name, size, file_obj):
+        nonlocal total_size
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in VALID_EXTENSIONS:
+            rejected.append({"name": name, "error": f"Unsupported file type. Supported: {', '.join(VALID_EXTENSIONS)}"})
+            return
+        if size <= 0 or size > settings.UPLOAD_MAX_SIZE:
+            rejected.append({"name": name, "error": f"Размер файла должен быть от 1 байта до {settings.UPLOAD_MAX_SIZE} байт"})
+            return
+        if len(stored) >= settings.BATCH_MAX_FILES:
+            raise UploadError(f"В пакете больше {settings.BATCH_MAX_FILES} файлов")
+        total_size += size
+        if total_size > settings.BATCH_MAX_SIZE:
+            raise UploadError(f"Файлы пакета больше {settings.BATCH_MAX_SIZE} байт")
+        try:
+            check_file_signature(name, file_obj.read(512))
+            file_obj.seek(0)
+            stored_name, file_hash = store_upload(file_obj)
+        except UploadError as e:
+            rejected.append({"name": name, "error": str(e)})
+            return
+        except zipfile.BadZipFile:
+            rejected.append({"name": name, "error": "Файл в архиве повреждён"})
+            return
+        if file_hash in seen_hashes:
+            default_storage.delete(stored_name)
+            rejected.append({"name": name, "error": "Повтор файла в пакете"})
+            return
+        seen_hashes.add(file_hash)
+        stored.append({"stored_name": stored_name, "name": name, "file_hash": file_hash})
+
+    try:
+        for file_obj in files:
+            accept(os.path.basename(file_obj.name), file_obj.size, file_obj)
+        for archive in archives:
+            if os.path.splitext(archive.name)[1].lower() not in ARCHIVE_EXTENSIONS:
+                raise UploadError(f"Архив {archive.name}: поддерживается только ZIP")
+            for name, size, member in _iter_archive(archive):
+                accept(name, size, member)
+    except Exception:
+        delete_stored_files(stored)
+        raise
+    return stored, rejected
+
+
+def delete_stored_files(stored):
+    for entry in stored:
+        default_storage.delete(entry["stored_name"])
+
+
+def create_batch(user, stored):
+    """
+    Создаёт пакет и документы по сохранённым файлам с резервом проверок на весь пакет.
+    Файлы, уже загруженные пользователем в окне DUPLICATE_UPLOAD_WINDOW, не резервируются:
+    возвращается существующий документ, а файл пакета удаляется.
+    Возвращает (пакет, новые документы, найденные дубликаты).
+    Нехватка проверок — BatchQuotaError, ничего не создаётся.
+    """
+    with transaction.atomic():
+        # Блокировка профиля сериализует поиск дубликатов и резерв для пользователя
+        UserProfile.objects.select_for_update().filter(user=user).first()
+        existing = {}
+        for document in Document.objects.filter(
+            user=user,
+            file_hash__in=[entry["file_hash"] for entry in stored],
+            status__in=['pending', 'analyzing', 'processed'],
+            uploaded_at__gte=timezone.now() - timedelta(seconds=settings.DUPLICATE_UPLOAD_WINDOW),
+        ).order_by('uploaded_at'):
+            existing[document.file_hash] = document
+        new = [entry for entry in stored if entry["file_hash"] not in existing]
+        if new and not reserve_checks(user.id, len(new)):
+            raise BatchQuotaError(len(new))
+
+        batch = UploadBatch.objects.create(user=user)
+        documents = Document.objects.bulk_create([
+            Document(
+                file=entry["stored_name"], name=entry["name"], user=user, status='pending',
+                file_hash=entry["file_hash"], quota_state='reserved', batch=batch,
+            )
+            for entry in new
+        ])
+        record_reservations(documents)
+
+    for entry in stored:
+        if entry["file_hash"] in existing:
+            default_storage.delete(entry["stored_name"])
+    # bulk_create не вызывает post_save — уведомляем канал статусов вручную
+    for document in documents:
+        publish_document_status(user.id, document.id, document.status)
+    duplicates = [existing[entry["file_hash"]] for entry in stored if entry["file_hash"] in existing]
+    return batch, documents, duplicates
+
+
+def batch_progress(batch):
+    """
+    Сводный прогресс пакета: число документов по статусам, сколько ждут слота
+    планировщика и доля завершённых (processed и failed), %.
+    """
+    counts = batch.documents.aggregate(
+        total=Count('id'),
+        queued=Count('id', filter=Q(status='pending', queued_at__isnull=False, dispatched_at__isnull=True)),
+        pending=Count('id', filter=Q(status='pending')),
+        analyzing=Count('id', filter=Q(status='analyzing')),
+        processed=Count('id', filter=Q(status='processed')),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+    done = counts['processed'] + counts['failed']
+    return {
+        "id": str(batch.id),
+        "created_at": batch.created_at,
+        **counts,
+        "progress": round(100 * done / counts['total']) if counts['total'] else 100,
+        "completed": done == counts['total'],
+    }
@@ -0,0 +1,185 @@
+import contextvars
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Начало пункта или раздела договора: "1.", "2.3.", "Статья 5", "Раздел II", "IV.", markdown-заголовок
+CLAUSE_BOUNDARY_RE = re.compile(
+    r"^[ \t]*(?:\d+(?:\.\d+)*\.?[ \t]|(?:Статья|Раздел|Глава)[ \t]+\S|[IVXLC]+\.[ \t]|#{1,3}[ \t])",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def estimate_tokens(text):
+    """
+    Грубая оценка числа токенов: для русского текста ~3 символа на токен.
+    """
+    return len(text) // 3 + 1
+
+
+def _split_oversized(block, max_chars):
+    """
+    Делит слишком длинный пункт по абзацам, затем по строкам, в крайнем случае — по длине.
+    """
+    for separator in ("\n\n", "\n"):
+        pieces = block.split(separator)
+        if len(pieces) > 1:
+            parts = [p + separator for p in pieces[:-1]] + [pieces[-1]]
+            return [p for p in _pack(parts, max_chars) if p]
+    return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+
+
+def _pack(blocks, max_chars):
+    """
+    Жадно собирает соседние блоки в чанки не длиннее max_chars.
+    """
+    chunks = []
+    current = ""
+    for block in blocks:
+        if len(block) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_oversized(block, max_chars))
+            continue
+        if len(current) + len(block) > max_chars and current:
+            chunks.append(current)
+            current = ""
+        current += block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_contract(text, max_chars=None):
+    """
+    Делит текст договора на чанки по границам пунктов и разделов.
+    Склейка чанков в исходном порядке даёт исходный текст без потерь.
+    """
+    max_chars = max_chars or settings.AI_CHUNK_CHARS
+    if len(text) <= max_chars:
+        return [text]
+
+    starts = [m.start() for m in CLAUSE_BOUNDARY_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    blocks = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+    return _pack(blocks, max_chars)
+
+
+def _merge_unique(items, key):
+    """
+    Объединяет списки рисков/рекомендаций, убирая повторы по названию.
+    """
+    seen = set()
+    merged = []
+    for item in items:
+        marker = (item.get(key) or "").strip().lower()
+        if marker and marker in seen:
+            continue
+        seen.add(marker)
+        merged.append(item)
+    return merged
+
+
+def reduce_chunk_results(chunks, results):
+    """
+    Сводит результаты анализа чанков в один результат документа.
+    results[i] — dict с анализом chunks[i] или None, если чанк не проанализирован.
+    Улучшенный текст собирается в исходном порядке; для непроанализированных
+    чанков подставляется исходный текст, а результат помечается "partial": True.
+    """
+    analyzed = [(c, r) for c, r in zip(chunks, results) if r is not None]
+
+    total_len = sum(len(c) for c, _ in analyzed)
+    score = None
+    if total_len:
+        score = round(sum(int(r.get('score') or 0) * len(c) for c, r in analyzed) / total_len)
+
+    summaries = [r.get('summary') for _, r in analyzed if r.get('summary')]
+    if len(analyzed) < len(chunks):
+        summaries.append(
+            f"Внимание: проанализировано {len(analyzed)} из {len(chunks)} частей договора "
+            "(превышен лимит времени или токенов на документ)."
+        )
+
+    risks = _merge_unique([risk for _, r in analyzed for risk in (r.get('risks') or [])], 'title')
+    recommendations = _merge_unique(
+        [rec for _, r in analyzed for rec in (r.get('recommendations') or [])], 'title'
+    )
+
+    rewritten_parts = []
+    for chunk, result in zip(chunks, results):
+        part = result.get('rewritten_text') if result else None
+        rewritten_parts.append((part or chunk).strip("\n"))
+
+    result = {
+        "score": score,
+        "summary": "\n\n".join(summaries),
+        "risks": risks,
+        "recommendations": recommendations,
+        "rewritten_text": "\n".join(rewritten_parts),
+    }
+    if len(analyzed) < len(chunks):
+        result["partial"] = True
+    return result
+
+
+def analyze_contract_chunked(contract_text, analyze_chunk):
+    """
+    Map-reduce анализ длинного договора.
+
+    analyze_chunk(text, part, total) анализирует один чанк и возвращает dict
+    в формате analyze_contract_with_ai. Чанки обрабатываются параллельно
+    (не более AI_CHUNK_WORKERS одновременно), поэтому общее время определяется
+    самым долгим чанком, а не суммой. Бюджет токенов ограничивает число
+    отправляемых чанков, бюджет времени — ожидание результатов.
+    """
+    chunks = split_contract(contract_text)
+    total = len(chunks)
+
+    # Бюджет токенов: вход + переписанный текст на выходе ≈ 2x размер чанка
+    token_budget = settings.AI_DOCUMENT_TOKEN_BUDGET
+    selected = []
+    spent = 0
+    for index, chunk in enumerate(chunks):
+        cost = estimate_tokens(chunk) * 2
+        if spent + cost > token_budget:
+            break
+        spent += cost
+        selected.append(index)
+
+    logger.info(
+        f"Анализ по частям: к отправке {len(selected)} из {total}",
+        extra={"parts": total, "selected": len(selected), "estimated_tokens": spent},
+    )
+
+    results = [None] * total
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=settings.AI_CHUNK_WORKERS)
+    try:
+        futures = {
+            # Контекст (document_id для логов) переходит в поток части
+            pool.submit(contextvars.copy_context().run, analyze_chunk, chunks[i], i + 1, total): i for i in selected
+        }
+        done, not_done = wait(futures, timeout=settings.AI_DOCUMENT_TIME_BUDGET)
+        for future in done:
+            result = future.result()
+            # Ответ с ошибкой не содержит rewritten_text — такой чанк считаем непроанализированным
+            if result and "error" not in result and result.get('rewritten_text'):
+                results[futures[future]] = result
+        if not_done:
+            logger.warning("Анализ по частям: лимит времени", extra={"not_done": len(not_done)})
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    logger.info("Анализ по частям завершён", extra={"seconds": round(time.monotonic() - started, 1)})
+
+    if not any(results):
+        return {"error": "Не удалось проанализировать ни одну часть договора."}
+    return reduce_chunk_results(chunks, results)
@@ -0,0 +1,269 @@
+import contextlib
+import functools
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import xmlrpc.client
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Конвертация .doc -> .docx через пул "тёплых" headless LibreOffice.
+# Каждый воркер пула — процесс unoserver (XML-RPC поверх UNO) со своим
+# профилем LibreOffice и своими портами: запуск soffice (~1-3 с) оплачивается
+# один раз, а не на каждый файл. Результаты кэшируются по SHA-256 исходника.
+
+
+class ConversionError(Exception):
+    pass
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class SofficeWorker:
+    """
+    Один процесс unoserver с собственным профилем LibreOffice.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.port = None
+        self.uno_port = None
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f"contractcheck_lo_{os.getpid()}_{index}")
+        self.process = None
+        self.conversions = 0
+
+    def start(self):
+        # Порты выбираются свободные: пулы разных процессов Celery не конфликтуют
+        self.port = _free_port()
+        self.uno_port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                settings.DOC_CONVERTER_PYTHON, "-m", "unoserver.server",
+                "--interface", "127.0.0.1",
+                "--port", str(self.port),
+                "--uno-port", str(self.uno_port),
+                "--user-installation", f"file://{self.profile_dir}",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.conversions = 0
+
+        started = False
+        try:
+            # Ждём, пока XML-RPC порт начнёт принимать соединения
+            deadline = time.monotonic() + settings.DOC_CONVERTER_START_TIMEOUT
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise ConversionError(f"unoserver завершился при запуске (код {self.process.returncode})")
+                try:
+                    with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                        started = True
+                        return
+                except OSError:
+                    time.sleep(0.2)
+            raise ConversionError("unoserver не запустился за отведённое время")
+        finally:
+            # Неудачный запуск не оставляет ни процесса, ни временного профиля
+            if not started:
+                self.stop()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait(timeout=10)
+        self.process = None
+        # Вместе с процессом удаляется профиль: утечки и повреждения не переживают перезапуск
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, src_path, dst_path, timeout):
+        proxy = xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}", transport=_TimeoutTransport(timeout), allow_none=True
+        )
+        # convert(inpath, indata, outpath, convert_to)
+        proxy.convert(src_path, None, dst_path, "docx")
+        self.conversions += 1
+
+
+class SofficePool:
+    """
+    Пул воркеров LibreOffice в рамках процесса.
+
+    Воркер, упавший или не уложившийся в таймаут, перезапускается;
+    после DOC_CONVERTER_MAX_CONVERSIONS конвертаций воркер пересоздаётся
+    профилактически (LibreOffice со временем накапливает память).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {"conversions": 0, "failures": 0, "restarts": 0, "cache_hits": 0, "seconds": 0.0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            workers = []
+            try:
+                for index in range(self.size):
+                    worker = SofficeWorker(index)
+                    workers.append(worker)
+                    worker.start()
+            except Exception as e:
+                # Уже запущенные воркеры останавливаются: следующий вызов запустит пул заново
+                for worker in workers:
+                    worker.stop()
+                raise ConversionError(f"Не удалось запустить пул LibreOffice: {e}") from e
+            for worker in workers:
+                self._idle.put(worker)
+            self._started = True
+
+    def _record(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def convert(self, src_path, dst_path):
+        self._ensure_started()
+        try:
+            worker = self._idle.get(timeout=settings.DOC_CONVERTER_QUEUE_TIMEOUT)
+        except queue.Empty:
+            raise ConversionError("Нет свободного воркера LibreOffice")
+
+        started = time.monotonic()
+        try:
+            if not worker.is_alive():
+                self._record("restarts")
+                worker.restart()
+            worker.convert(src_path, dst_path, settings.DOC_CONVERTER_TIMEOUT)
+            self._record("conversions")
+            self._record("seconds", time.monotonic() - started)
+        except Exception as e:
+            self._record("failures")
+            self._record("restarts")
+            try:
+                worker.restart()
+            except ConversionError as restart_error:
+                logger.error(f"Ошибка перезапуска LibreOffice: {restart_error}")
+            raise ConversionError(f"Ошибка конвертации LibreOffice: {e}") from e
+        finally:
+            if worker.is_alive() and worker.conversions >= settings.DOC_CONVERTER_MAX_CONVERSIONS:
+                self._record("restarts")
+                try:
+                    worker.restart()
+                except ConversionError as restart_error:
+                    logger.error(f"Ошибка перезапуска LibreOffice: {restart_error}")
+            self._idle.put(worker)
+
+    def throughput(self):
+        """
+        Сводка: конвертации, ошибки, перезапуски, попадания в кэш и документов в секунду
+        (по суммарному времени работы воркеров).
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["docs_per_second"] = round(stats["conversions"] / stats["seconds"], 2) if stats["seconds"] else 0.0
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get_nowait().stop()
+            self._started = False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_converter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SofficePool(settings.DOC_CONVERTER_POOL_SIZE)
+        return _pool
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def convert_doc_with_libreoffice(doc_path):
+    """
+    Конвертирует .doc в .docx через пул LibreOffice.
+    Результат кэшируется по хэшу исходника в DOC_CONVERTER_CACHE_DIR.
+    Возвращает путь к .docx в кэше.
+    """
+    cache_dir = settings.DOC_CONVERTER_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, f"{file_sha256(doc_path)}.docx")
+
+    pool = get_converter_pool()
+    if os.path.exists(cached_path):
+        pool._record("cache_hits")
+        return cached_path
+
+    # Пишем во временный файл и переименовываем: параллельные конвертации
+    # одного исходника не увидят недописанный результат
+    tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp.docx"
+    try:
+        pool.convert(os.path.abspath(doc_path), tmp_path)
+        os.replace(tmp_path, cached_path)
+    finally:
+        # После ошибки конвертации недописанный результат не остаётся в кэше
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+    return cached_path
+
+
+@functools.lru_cache(maxsize=1)
+def libreoffice_available():
+    """
+    Доступен ли unoserver в настроенном интерпретаторе (DOC_CONVERTER_PYTHON).
+    """
+    try:
+        result = subprocess.run(
+            [settings.DOC_CONVERTER_PYTHON, "-c", "import unoserver"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+        return result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
@@ -0,0 +1,116 @@
+import functools
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+# Быстрая сборка улучшенного договора в DOCX без объектной модели python-docx.
+# Шаблон (стили, шрифт Normal, тема) готовится один раз на процесс: из файла
+# DOCX_TEMPLATE_PATH или из шаблона python-docx с теми же настройками Normal,
+# что и в services.render_docx_with_python_docx. Для каждого договора
+# в шаблонный word/document.xml вставляется XML параграфов одной строкой,
+# остальные части архива копируются как есть. Время записи в архиве
+# фиксировано, поэтому одинаковый текст даёт побайтово одинаковый файл.
+
+DOCUMENT_PART = 'word/document.xml'
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+HEADING_PREFIXES = (('### ', 'Heading3'), ('## ', 'Heading2'), ('# ', 'Heading1'))
+
+# Символы, недопустимые в XML 1.0 (python-docx на них падает с ValueError)
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_BODY_RE = re.compile(rb'(<w:body>)(.*?)(<w:sectPr[ >].*</w:body>)', re.S)
+
+
+class DocxTemplate:
+    """
+    Разобранный шаблон: части архива и word/document.xml, разрезанный
+    по месту вставки параграфов (перед w:sectPr).
+    """
+
+    def __init__(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.parts = [(info.filename, archive.read(info)) for info in archive.infolist()]
+        document_xml = dict(self.parts)[DOCUMENT_PART]
+        match = _BODY_RE.search(document_xml)
+        if not match:
+            raise ValueError("В шаблоне DOCX не найден w:body с w:sectPr")
+        self.head = document_xml[:match.end(1)]
+        self.tail = document_xml[match.start(3):]
+
+    def render(self, body_xml):
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in self.parts:
+                if name == DOCUMENT_PART:
+                    content = self.head + body_xml + self.tail
+                info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, content)
+        return out.getvalue()
+
+
+def build_default_template():
+    """
+    Шаблон python-docx со стилем Normal: Times New Roman 12 pt, чёрный цвет.
+    """
+    import docx
+    from docx.shared import Pt, RGBColor
+
+    doc = docx.Document()
+    font = doc.styles['Normal'].font
+    font.name = 'Times New Roman'
+    font.size = Pt(12)
+    font.color.rgb = RGBColor(0, 0, 0)
+    f = io.BytesIO()
+    doc.save(f)
+    return f.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def get_docx_template():
+    path = settings.DOCX_TEMPLATE_PATH
+    if path:
+        with open(path, 'rb') as f:
+            return DocxTemplate(f.read())
+    return DocxTemplate(build_default_template())
+
+
+def _run(text, bold=False):
+    props = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:r>{props}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def paragraphs_xml(text):
+    """
+    XML параграфов для текста с разметкой '#', '##', '###' (заголовки)
+    и '**' (жирный текст) — та же разметка, что понимает python-docx версия.
+    """
+    text = _INVALID_XML_RE.sub('', text)
+    out = []
+    for para_text in text.split('\n'):
+        para_text = para_text.strip()
+        if not para_text:
+            continue
+
+        for prefix, style in HEADING_PREFIXES:
+            if para_text.startswith(prefix):
+                out.append(
+                    f'<w:p><w:pPr><w:pStyle w:val="{style}"/><w:jc w:val="left"/></w:pPr>'
+                    f'{_run(para_text[len(prefix):])}</w:p>'
+                )
+                break
+        else:
+            # Нечётные фрагменты между '**' — жирные
+            runs = ''.join(_run(part, i % 2 == 1) for i, part in enumerate(para_text.split('**')) if part)
+            out.append(f'<w:p><w:pPr><w:jc w:val="both"/></w:pPr>{runs}</w:p>')
+    return ''.join(out).encode('utf-8')
+
+
+def render_docx(text):
+    """
+    Собирает DOCX из текста по шаблону. Возвращает байты файла.
+    """
+    return get_docx_template().render(paragraphs_xml(text))
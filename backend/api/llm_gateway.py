@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+import openai
+from django.conf import settings
+
+from .chunked_analysis import estimate_tokens
+from .metrics import LLM_DURATION, LLM_IN_FLIGHT, LLM_REQUESTS, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых повтор запроса имеет смысл: таймауты, обрывы соединения,
+# 429 и 5xx. Ошибки 4xx (неверный ключ, запрос) повторять бесполезно.
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMGatewayError(Exception):
+    pass
+
+
+class LLMMetrics:
+    """
+    Метрики шлюза в рамках процесса: число запросов, ошибок, повторов
+    и перцентили задержки по последним LATENCY_WINDOW запросам.
+    Те же события пишутся в метрики Prometheus (api/metrics.py).
+    """
+    LATENCY_WINDOW = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.errors_by_type = {}
+        self.in_flight = 0
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+    def started(self):
+        LLM_IN_FLIGHT.inc()
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def finished(self, latency, error=None):
+        LLM_IN_FLIGHT.dec()
+        LLM_DURATION.observe(latency)
+        LLM_REQUESTS.labels('success' if error is None else type(error).__name__).inc()
+        with self._lock:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            if error is None:
+                self.successes += 1
+            else:
+                self.failures += 1
+                name = type(error).__name__
+                self.errors_by_type[name] = self.errors_by_type.get(name, 0) + 1
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def tokens(self, request, usage=None, completion_text=''):
+        """
+        Токены запроса и ответа: из usage, если провайдер его вернул, иначе оценка по длине текста.
+        """
+        if usage is not None and getattr(usage, 'completion_tokens', None) is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens or 0, usage.completion_tokens
+        else:
+            prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in request.get('messages', []))
+            completion_tokens = estimate_tokens(completion_text)
+        LLM_TOKENS.labels('prompt').inc(prompt_tokens)
+        LLM_TOKENS.labels('completion').inc(completion_tokens)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            completed = self.successes + self.failures
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+            return {
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "in_flight": self.in_flight,
+                "error_rate": round(self.failures / completed, 4) if completed else 0.0,
+                "errors_by_type": dict(self.errors_by_type),
+                "latency_p50": percentile(0.50),
+                "latency_p95": percentile(0.95),
+                "latency_p99": percentile(0.99),
+            }
+
+
+class LLMGateway:
+    """
+    Шлюз к OpenAI-совместимому API (DeepSeek через polza.ai).
+
+    - один HTTP-клиент на процесс: соединения переиспользуются (keep-alive);
+    - таймаут на каждый запрос;
+    - повторы с экспоненциальной задержкой и полным джиттером;
+    - общий семафор ограничивает число одновременных запросов из всех задач
+      воркера (потоки Celery, части map-reduce анализа, async-код).
+
+    Асинхронный вызов (achat_completion) занимает тот же семафор, ожидая слот
+    в потоке пула event loop; слот, полученный после отмены корутины, сразу
+    освобождается. AsyncOpenAI-клиент создаётся на каждый event loop.
+
+    base_url настраивается через LLM_BASE_URL, что позволяет гонять шлюз
+    против локального мок-сервера (benchmarks/mock_llm_server.py).
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_retries=None,
+                 max_concurrency=None, backoff_base=None, backoff_max=None):
+        self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
+        self.base_url = base_url or settings.LLM_BASE_URL
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base or settings.LLM_BACKOFF_BASE
+        self.backoff_max = backoff_max or settings.LLM_BACKOFF_MAX
+        self.semaphore = threading.BoundedSemaphore(max_concurrency or settings.LLM_MAX_CONCURRENCY)
+        self.metrics = LLMMetrics()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Клиент создаётся лениво: без ключа API модуль services должен импортироваться
+        with self._client_lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=0,  # Повторы делает шлюз, с джиттером и метриками
+                )
+            return self._client
+
+    @property
+    def async_client(self):
+        # Соединения AsyncOpenAI привязаны к event loop, в котором клиент создан
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = openai.AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=0,
+                )
+                self._async_clients[loop] = client
+            return client
+
+    def backoff_delay(self, attempt):
+        """
+        Полный джиттер: случайная задержка от 0 до base * 2^attempt (не более backoff_max).
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _acquire(self):
+        if not self.semaphore.acquire(timeout=settings.LLM_QUEUE_TIMEOUT):
+            raise LLMGatewayError("Превышено время ожидания свободного слота для запроса к AI")
+
+    async def _aacquire(self):
+        """
+        Занимает слот семафора, не блокируя event loop. Если корутину отменили,
+        пока поток ждал слот, полученный потоком слот освобождается в колбэке.
+        """
+        future = asyncio.get_running_loop().run_in_executor(None, self._acquire)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.semaphore.release()
+
+    def chat_completion(self, **kwargs):
+        """
+        Синхронный вызов chat.completions.create с повторами.
+        Возвращает текст первого варианта ответа.
+        """
+        self._acquire()
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.metrics.started()
+                started = time.monotonic()
+                try:
+                    response = self.client.chat.completions.create(**kwargs)
+                except RETRYABLE_ERRORS as e:
+                    self.metrics.finished(time.monotonic() - started, error=e)
+                    if attempt >= self.max_retries:
+                        raise
+                    self.metrics.retried()
+                    delay = self.backoff_delay(attempt)
+                    logger.warning(
+                        f"LLM: {type(e).__name__}, повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с",
+                        extra={"error": type(e).__name__, "attempt": attempt + 1, "delay": round(delay, 2)},
+                    )
+                    time.sleep(delay)
+                    continue
+                except Exception as e:
+                    self.metrics.finished(time.monotonic() - started, error=e)
+                    raise
+                self.metrics.finished(time.monotonic() - started)
+                content = response.choices[0].message.content
+                self.metrics.tokens(kwargs, getattr(response, 'usage', None), content or '')
+                return content
+        finally:
+            self.semaphore.release()
+
+    def stream_chat_completion(self, **kwargs):
+        """
+        Потоковый вызов: генератор текстовых фрагментов ответа по мере генерации.
+        Повтор возможен только до получения первого фрагмента — после этого
+        ошибка пробрасывается, чтобы не склеивать части разных ответов.
+        """
+        self._acquire()
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.metrics.started()
+                started = time.monotonic()
+                received = False
+                usage = None
+                completion_chars = []
+                stream = None
+                error = None
+                try:
+                    stream = self.client.chat.completions.create(stream=True, **kwargs)
+                    for chunk in stream:
+                        # Часть провайдеров присылает usage в последнем фрагменте
+                        usage = getattr(chunk, 'usage', None) or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            received = True
+                            completion_chars.append(delta)
+                            yield delta
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                    if received or attempt >= self.max_retries:
+                        raise
+                except BaseException as e:
+                    # В том числе GeneratorExit: потребитель перестал читать поток
+                    error = e
+                    raise
+                finally:
+                    # Соединение с провайдером и счётчик запросов в работе освобождаются при любом исходе
+                    if stream is not None:
+                        stream.close()
+                    self.metrics.finished(time.monotonic() - started, error=error)
+                if error is None:
+                    self.metrics.tokens(kwargs, usage, ''.join(completion_chars))
+                    return
+                self.metrics.retried()
+                delay = self.backoff_delay(attempt)
+                logger.warning(
+                    f"LLM: {type(error).__name__}, повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с",
+                    extra={"error": type(error).__name__, "attempt": attempt + 1, "delay": round(delay, 2)},
+                )
+                time.sleep(delay)
+        finally:
+            self.semaphore.release()
+
+    async def achat_completion(self, **kwargs):
+        """
+        Асинхронный вариант chat_completion. Использует тот же семафор,
+        что и синхронные вызовы, поэтому лимит общий для всего процесса.
+        """
+        await self._aacquire()
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.metrics.started()
+                started = time.monotonic()
+                try:
+                    response = await self.async_client.chat.completions.create(**kwargs)
+                except RETRYABLE_ERRORS as e:
+                    self.metrics.finished(time.monotonic() - started, error=e)
+                    if attempt >= self.max_retries:
+                        raise
+                    self.metrics.retried()
+                    delay = self.backoff_delay(attempt)
+                    logger.warning(
+                        f"LLM: {type(e).__name__}, повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с",
+                        extra={"error": type(e).__name__, "attempt": attempt + 1, "delay": round(delay, 2)},
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException as e:
+                    # В том числе CancelledError: счётчик запросов в работе не должен расти
+                    self.metrics.finished(time.monotonic() - started, error=e)
+                    raise
+                self.metrics.finished(time.monotonic() - started)
+                content = response.choices[0].message.content
+                self.metrics.tokens(kwargs, getattr(response, 'usage', None), content or '')
+                return content
+        finally:
+            self.semaphore.release()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """
+    Общий для процесса экземпляр шлюза.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
@@ -0,0 +1,51 @@
+import contextlib
+import contextvars
+import json
+import logging
+
+# Структурированные логи: каждая запись — JSON-объект в одну строку с полями
+# ts, level, logger, message и дополнительными полями из extra=... (stage, seconds ...).
+# document_id добавляется автоматически внутри document_context(): задачи конвейера
+# открывают контекст, и записи services, шлюза LLM и анализа по частям
+# получают тот же document_id без передачи его через аргументы.
+
+_document_id = contextvars.ContextVar('document_id', default=None)
+
+# Стандартные атрибуты LogRecord — всё остальное попало туда из extra
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+@contextlib.contextmanager
+def document_context(document_id):
+    token = _document_id.set(document_id)
+    try:
+        yield
+    finally:
+        _document_id.reset(token)
+
+
+class DocumentContextFilter(logging.Filter):
+    """
+    Добавляет к записи document_id из document_context(), если он не передан явно.
+    """
+
+    def filter(self, record):
+        if getattr(record, 'document_id', None) is None:
+            record.document_id = _document_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
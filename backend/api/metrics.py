@@ -0,0 +1,239 @@
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models import Count
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+
+# Метрики в формате Prometheus, отдаются на /api/metrics/.
+# Процессы gunicorn и Celery пишут значения в общий каталог PROMETHEUS_MULTIPROC_DIR
+# (режим multiprocess prometheus_client), эндпоинт суммирует их по всем процессам.
+# Без этой переменной окружения (runserver, eager-режим Celery) метрики живут
+# в памяти процесса. Глубина очередей и число документов в работе считаются
+# в момент запроса метрик по Redis и БД — они не зависят от того, какой процесс
+# начал или закончил обработку.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_DURATION = Histogram(
+    'contractcheck_stage_duration_seconds', 'Длительность стадии конвейера анализа',
+    ['stage'], buckets=DURATION_BUCKETS,
+)
+STAGE_QUEUE_WAIT = Histogram(
+    'contractcheck_stage_queue_wait_seconds', 'Ожидание стадии в очереди Celery',
+    ['stage'], buckets=DURATION_BUCKETS,
+)
+STAGE_OUTCOMES = Counter(
+    'contractcheck_stage_outcomes_total', 'Завершения стадий конвейера по результату',
+    ['stage', 'outcome'],
+)
+HTTP_DURATION = Histogram(
+    'contractcheck_http_request_duration_seconds', 'Длительность обработки запроса API',
+    ['view', 'method'], buckets=DURATION_BUCKETS,
+)
+HTTP_REQUESTS = Counter(
+    'contractcheck_http_requests_total', 'Запросы API по представлению и коду ответа',
+    ['view', 'method', 'status'],
+)
+LLM_DURATION = Histogram(
+    'contractcheck_llm_request_duration_seconds', 'Длительность одной попытки запроса к LLM',
+    buckets=DURATION_BUCKETS,
+)
+LLM_REQUESTS = Counter(
+    'contractcheck_llm_requests_total', 'Попытки запросов к LLM по результату',
+    ['outcome'],
+)
+LLM_TOKENS = Counter(
+    'contractcheck_llm_tokens_total', 'Токены LLM (usage ответа или оценка по длине текста)',
+    ['kind'],
+)
+CACHE_LOOKUPS = Counter(
+    'contractcheck_cache_lookups_total', 'Обращения к кэшам API по результату (hit/miss)',
+    ['cache', 'result'],
+)
+OCR_PAGES = Counter(
+    'contractcheck_ocr_pages_total', 'Страницы сканов: распознанные Tesseract, взятые из кэша OCR и с ошибкой распознавания',
+    ['result'],
+)
+LLM_IN_FLIGHT = Gauge(
+    'contractcheck_llm_in_flight', 'Запросы к LLM, ожидающие ответа',
+    multiprocess_mode='livesum',
+)
+
+
+def observe_stage(stage, seconds, queue_wait=None):
+    STAGE_DURATION.labels(stage).observe(seconds)
+    if queue_wait is not None:
+        STAGE_QUEUE_WAIT.labels(stage).observe(queue_wait)
+
+
+def count_stage_outcome(stage, outcome):
+    STAGE_OUTCOMES.labels(stage, outcome).inc()
+
+
+def count_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def count_ocr_pages(result, pages):
+    if pages:
+        OCR_PAGES.labels(result).inc(pages)
+
+
+class PipelineCollector:
+    """
+    Метрики, вычисляемые при каждом запросе /api/metrics/:
+    документы в работе (по статусу), очередь планировщика, экономия кэша анализа
+    и глубина очередей Celery в Redis.
+    """
+
+    def collect(self):
+        from .models import Document
+
+        in_flight = GaugeMetricFamily(
+            'contractcheck_documents_in_flight', 'Документы в конвейере анализа', labels=['status'],
+        )
+        counts = dict(
+            Document.objects.filter(status__in=['pending', 'analyzing'])
+            .values('status').annotate(total=Count('id')).values_list('status', 'total')
+        )
+        for status in ('pending', 'analyzing'):
+            in_flight.add_metric([status], counts.get(status, 0))
+        yield in_flight
+
+        # Очередь планировщика (api/scheduler.py): документы, ожидающие слота, по полосам тарифа
+        from .scheduler import TIER_LANES
+
+        queued = GaugeMetricFamily(
+            'contractcheck_documents_queued', 'Документы в очереди планировщика анализов', labels=['lane'],
+        )
+        lanes = dict(
+            Document.objects.filter(status='pending', queued_at__isnull=False, dispatched_at__isnull=True)
+            .values('queue_lane').annotate(total=Count('id')).values_list('queue_lane', 'total')
+        )
+        for tier, lane in TIER_LANES.items():
+            queued.add_metric([tier], lanes.get(lane, 0))
+        yield queued
+
+        # Кэш результатов AI-анализа (api/analysis_cache.py): попадания по записям, которые ещё в кэше
+        from .analysis_cache import analysis_cache_stats
+
+        stats = analysis_cache_stats()
+        yield GaugeMetricFamily(
+            'contractcheck_analysis_cache_entries', 'Записи в кэше анализа', value=stats['entries'],
+        )
+        yield GaugeMetricFamily(
+            'contractcheck_analysis_cache_saved_llm_calls', 'Вызовы LLM, заменённые попаданием в кэш анализа',
+            value=stats['saved_llm_calls'],
+        )
+        yield GaugeMetricFamily(
+            'contractcheck_analysis_cache_saved_seconds', 'Секунды ожидания LLM, сэкономленные кэшем анализа',
+            value=stats['saved_seconds'],
+        )
+
+        depths = celery_queue_depths()
+        if depths is not None:
+            queue_depth = GaugeMetricFamily(
+                'contractcheck_celery_queue_depth', 'Задачи, ожидающие воркера в очереди Celery', labels=['queue'],
+            )
+            for queue, depth in sorted(depths.items()):
+                queue_depth.add_metric([queue], depth)
+            yield queue_depth
+
+
+def celery_queue_names():
+    queues = {'celery'}
+    for route in settings.CELERY_TASK_ROUTES.values():
+        if route.get('queue'):
+            queues.add(route['queue'])
+    return sorted(queues)
+
+
+def celery_queue_depths():
+    """
+    Длина списков очередей в Redis-брокере. None — брокер недоступен или задачи
+    выполняются сразу (CELERY_TASK_ALWAYS_EAGER).
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER or not settings.CELERY_BROKER_URL.startswith('redis'):
+        return None
+    import redis
+
+    try:
+        client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        with client.pipeline() as pipe:
+            for queue in celery_queue_names():
+                pipe.llen(queue)
+            return dict(zip(celery_queue_names(), pipe.execute()))
+    except redis.RedisError:
+        return None
+
+
+_pipeline_registry = CollectorRegistry()
+_pipeline_registry.register(PipelineCollector())
+
+
+def render_metrics():
+    """
+    Возвращает (тело ответа, Content-Type) для /api/metrics/.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_pipeline_registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """
+    Удаляет файлы gauge завершившегося процесса (воркер gunicorn или Celery).
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """
+    Длительность и коды ответов каждого представления API. Представление
+    определяется по имени маршрута (api/urls.py), поэтому число меток ограничено.
+    Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        HTTP_DURATION.labels(view, request.method).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(view, request.method, str(response.status_code)).inc()
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_analysiscache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('analyzing', 'Analyzing'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
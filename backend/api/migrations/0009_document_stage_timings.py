@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_document_status_analyzing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='stage_timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_document_stage_timings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='api_doc_user_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_document_file_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='quota_state',
+            field=models.CharField(blank=True, choices=[('reserved', 'Reserved'), ('committed', 'Committed'), ('released', 'Released')], default='', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='CheckLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reserve', 'Reserve'), ('commit', 'Commit'), ('release', 'Release'), ('credit', 'Credit')], max_length=10)),
+                ('amount', models.IntegerField()),
+                ('payment_id', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='check_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('document__isnull', False)), fields=('document', 'kind'), name='api_ledger_document_kind_uniq')],
+            },
+        ),
+    ]
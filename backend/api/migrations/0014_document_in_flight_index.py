@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_upload_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'analyzing'])), fields=['status'], name='api_doc_in_flight_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_document_in_flight_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='queue_lane',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Полнотекстовый индекс (api/search.py) зависит от СУБД: в PostgreSQL — столбец tsvector
+# с GIN-индексом, в SQLite — таблица FTS5. Схема Django этих структур не описывает.
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE api_documenttext ADD COLUMN search_vector tsvector")
+        schema_editor.execute("CREATE INDEX api_doctext_search_idx ON api_documenttext USING GIN (search_vector)")
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_document_fts USING fts5("
+            "name, annotations, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_doctext_search_idx")
+        schema_editor.execute("ALTER TABLE api_documenttext DROP COLUMN IF EXISTS search_vector")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_document_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_upload_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='api.document')),
+                ('content', models.BinaryField()),
+                ('chars', models.IntegerField()),
+                ('page_offsets', models.JSONField(default=list)),
+                ('clause_offsets', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
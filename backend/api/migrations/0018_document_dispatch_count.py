@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_document_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='dispatch_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_document_dispatch_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='rewritten_content',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
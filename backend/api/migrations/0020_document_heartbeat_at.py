@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_documenttext_rewritten_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
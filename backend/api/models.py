@@ -1,7 +1,12 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.core.files.storage import default_storage
+from rest_framework.authtoken.models import Token
+from .notifications import publish_document_status
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -16,15 +21,31 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+# Профиль не сохраняется вместе с User: баланс проверок меняет только api/quota.py
+# условными UPDATE, а полное сохранение профиля затирало бы параллельные изменения
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+# Кэш токенов и /user/info/ (api/auth_cache.py): смена пароля, блокировка или данные
+# пользователя, изменение профиля и удаление токена сбрасывают закэшированное
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+def invalidate_user_caches(sender, instance, created, **kwargs):
+    from .auth_cache import invalidate_user_auth, invalidate_user_info
+    if not created:
+        invalidate_user_auth(instance.id)
+    invalidate_user_info(instance.id)
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    from .auth_cache import invalidate_user_info
+    invalidate_user_info(instance.user_id)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    from .auth_cache import invalidate_token
+    invalidate_token(instance.key)
 
 class Document(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -35,6 +56,7 @@ class Document(models.Model):
     # Analysis Results
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('analyzing', 'Analyzing'),  # Частичный результат AI уже сохранён, идёт переписывание текста
         ('processed', 'Processed'),
         ('failed', 'Failed'),
     ]
@@ -44,7 +66,38 @@ class Document(models.Model):
     risks = models.JSONField(null=True, blank=True) # Requires Django 3.1+
     recommendations = models.JSONField(null=True, blank=True)
     improved_file = models.FileField(upload_to='improved_contracts/', null=True, blank=True)
+    stage_timings = models.JSONField(null=True, blank=True)  # Длительность стадий конвейера, сек
+    file_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 исходного файла
+    # Состояние зарезервированной проверки (api/quota.py); пусто у документов до учёта резервов
+    QUOTA_STATE_CHOICES = [
+        ('reserved', 'Reserved'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    ]
+    quota_state = models.CharField(max_length=10, choices=QUOTA_STATE_CHOICES, blank=True, default='')
+    # Очередь анализа (api/scheduler.py): полоса тарифа, постановка в очередь и запуск конвейера
+    queue_lane = models.PositiveSmallIntegerField(default=0)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    dispatch_count = models.PositiveSmallIntegerField(default=0)  # Запусков конвейера, включая повторные после зависания
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Последняя отметка работающей стадии конвейера
+    # Пакетная загрузка (api/batches.py), в которой создан документ
+    batch = models.ForeignKey('UploadBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='documents')
     
+    class Meta:
+        indexes = [
+            # Список документов пользователя с курсорной пагинацией
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='api_doc_user_uploaded_idx'),
+            # Поиск повторной загрузки того же файла пользователем
+            models.Index(fields=['user', 'file_hash'], name='api_doc_user_hash_idx'),
+            # Документы в конвейере (метрики, поиск зависших): частичный индекс
+            # только по незавершённым — обработанные строки его не раздувают
+            models.Index(
+                fields=['status'], name='api_doc_in_flight_idx',
+                condition=models.Q(status__in=['pending', 'analyzing']),
+            ),
+        ]
+
     def __str__(self):
         return self.name or f"Document {self.id}"
 
@@ -53,6 +106,47 @@ class Document(models.Model):
             self.name = self.file.name
         super().save(*args, **kwargs)
 
+@receiver(post_save, sender=Document)
+def notify_document_status(sender, instance, **kwargs):
+    publish_document_status(instance.user_id, instance.id, instance.status, instance.score)
+
+@receiver(post_delete, sender=Document)
+def notify_document_deleted(sender, instance, **kwargs):
+    publish_document_status(instance.user_id, instance.id, 'deleted')
+
+@receiver(post_delete, sender=Document)
+def release_deleted_document_check(sender, instance, **kwargs):
+    from .quota import release_deleted_document
+    release_deleted_document(instance)
+
+@receiver(post_delete, sender=Document)
+def release_deleted_document_slot(sender, instance, **kwargs):
+    # Удалённый документ в конвейере освобождает слот планировщика
+    if instance.dispatched_at and instance.status in ('pending', 'analyzing'):
+        from .scheduler import dispatch_queued
+        dispatch_queued()
+
+class DocumentText(models.Model):
+    """
+    Извлечённый текст документа (api/text_store.py): хранится один раз, сжатым zlib,
+    со смещениями начала страниц и пунктов. Повторный анализ и поиск не разбирают файл заново.
+    """
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='extracted_text')
+    content = models.BinaryField()
+    chars = models.IntegerField()  # длина текста, символов
+    page_offsets = models.JSONField(default=list)  # начало каждой страницы, символы
+    clause_offsets = models.JSONField(default=list)  # [[начало пункта, заголовок], ...]
+    rewritten_content = models.BinaryField(null=True, blank=True)  # улучшенный текст от AI, zlib
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"DocumentText {self.document_id} ({self.chars} символов)"
+
+@receiver(post_delete, sender=Document)
+def remove_deleted_document_from_search(sender, instance, **kwargs):
+    from .search import remove_from_index
+    remove_from_index(instance.id)
+
 class Transaction(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -70,3 +164,105 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"Transaction {self.id} - {self.user.username} - {self.status}"
+
+class CheckLedgerEntry(models.Model):
+    """
+    Журнал движений баланса проверок (api/quota.py).
+    amount — изменение checks_remaining: -1 резерв, +1 возврат, +N оплата, 0 подтверждение.
+    """
+    KIND_CHOICES = [
+        ('reserve', 'Reserve'),
+        ('commit', 'Commit'),
+        ('release', 'Release'),
+        ('credit', 'Credit'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='check_ledger')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.IntegerField()
+    payment_id = models.CharField(max_length=100, unique=True, null=True, blank=True)  # InvId для начислений
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Одно движение каждого вида на документ: повтор стадии не пишет запись дважды
+            models.UniqueConstraint(
+                fields=['document', 'kind'],
+                condition=models.Q(document__isnull=False),
+                name='api_ledger_document_kind_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount:+d} ({self.user_id})"
+
+class UploadSession(models.Model):
+    """
+    Возобновляемая загрузка файла по частям (api/uploads.py).
+    received — сколько байт уже принято; клиент после обрыва продолжает с этого смещения.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('finalizing', 'Finalizing'),
+        ('completed', 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"UploadSession {self.id} ({self.received}/{self.size})"
+
+class UploadChunk(models.Model):
+    """
+    Принятая часть файла; содержимое лежит в хранилище под именем name.
+    """
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    offset = models.BigIntegerField()
+    size = models.IntegerField()
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'offset'], name='api_upload_chunk_offset_uniq'),
+        ]
+
+@receiver(post_delete, sender=UploadChunk)
+def delete_upload_chunk_file(sender, instance, **kwargs):
+    default_storage.delete(instance.name)
+
+class UploadBatch(models.Model):
+    """
+    Пакетная загрузка: несколько файлов или ZIP-архив одним запросом (api/batches.py).
+    Прогресс считается по документам пакета.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"UploadBatch {self.id}"
+
+class AnalysisCache(models.Model):
+    """
+    Кэш результатов AI-анализа. Ключ — хэш нормализованного текста договора
+    вместе с моделью и версией промпта (см. api/analysis_cache.py).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    result = models.JSONField()
+    latency = models.FloatField(default=0)  # Длительность исходного вызова AI, сек
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"AnalysisCache {self.key[:12]} ({self.hits} hits)"
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+
+# Канал уведомлений о смене статуса документов. Хранится в кэше Django
+# (Redis в продакшне, LocMem в разработке): на каждого пользователя —
+# счётчик версии и журнал последних изменений по номеру версии.
+# Опрос статуса без изменений обходится одним чтением из кэша, без запросов к БД.
+
+EVENT_TTL = 3600  # Сколько хранится запись журнала, сек
+MAX_REPLAY = 100  # Больше изменений за раз — клиент получает полный снимок
+
+
+def _version_key(user_id):
+    return f"docstatus:{user_id}:version"
+
+
+def _event_key(user_id, version):
+    return f"docstatus:{user_id}:event:{version}"
+
+
+def publish_document_status(user_id, document_id, status, score=None):
+    """
+    Записывает смену статуса документа в канал пользователя.
+    Вызывается из post_save Document и из задачи анализа.
+    """
+    if not user_id:
+        return None
+    key = _version_key(user_id)
+    cache.add(key, 0, timeout=None)
+    version = cache.incr(key)
+    cache.set(
+        _event_key(user_id, version),
+        {"id": document_id, "status": status, "score": score},
+        timeout=EVENT_TTL,
+    )
+    return version
+
+
+def current_version(user_id):
+    return cache.get(_version_key(user_id)) or 0
+
+
+async def acurrent_version(user_id):
+    return await cache.aget(_version_key(user_id)) or 0
+
+
+def changes_since(user_id, since, version):
+    """
+    Возвращает список изменений с версии since (не включая) по version
+    или None, если журнал неполон и клиенту нужен полный снимок.
+    """
+    if since < 0 or since > version or version - since > MAX_REPLAY:
+        return None
+    keys = [_event_key(user_id, v) for v in range(since + 1, version + 1)]
+    events = cache.get_many(keys)
+    if len(events) != len(keys):
+        return None
+
+    # Последнее изменение документа перекрывает предыдущие
+    latest = {}
+    for key in keys:
+        event = events[key]
+        latest[event["id"]] = event
+    return list(latest.values())
@@ -0,0 +1,244 @@
+import functools
+import hashlib
+import logging
+import os
+import subprocess
+import time
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from .metrics import count_ocr_pages
+from .processes import run_in_processes
+
+logger = logging.getLogger(__name__)
+
+# Распознавание сканов: страницы PDF без текстового слоя (меньше OCR_MIN_PAGE_CHARS
+# символов и есть изображения) растеризуются PyMuPDF и распознаются локальным
+# Tesseract (OCR_LANGUAGES, по умолчанию rus+eng). Страницы с текстовым слоем не трогаются.
+#
+# DPI растеризации подбирается по самому крупному изображению страницы — примерно
+# его собственное разрешение в пределах [OCR_MIN_DPI, OCR_MAX_DPI]: мелкий скан
+# не раздувается, а плотный не теряет мелкий шрифт.
+#
+# Страницы распознаются параллельно несколькими процессами (каждый сам открывает PDF
+# по пути) — run_in_processes (api/processes.py), в том числе внутри prefork-воркера Celery.
+# Результат страницы кэшируется в OCR_CACHE_DIR по SHA-256 изображения и языков,
+# поэтому повторная загрузка того же скана (или одинаковые страницы) не распознаётся заново.
+# После распознавания новых страниц кэш вытесняется (evict_ocr_cache): результаты,
+# не использованные OCR_CACHE_TTL секунд, затем самые давние сверх OCR_CACHE_MAX_SIZE.
+
+
+def _page_dpi(page, min_dpi, max_dpi):
+    """
+    Собственное разрешение самого крупного изображения страницы в пределах [min_dpi, max_dpi].
+    """
+    native = 0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"])
+        if bbox.width > 0:
+            native = max(native, info["width"] / (bbox.width / 72))
+    if not native:
+        return max_dpi
+    return int(min(max(native, min_dpi), max_dpi))
+
+
+def _ocr_image(png, languages, cmd, timeout):
+    # OMP_THREAD_LIMIT=1: параллельность даёт пул страниц, потоки tesseract её только перегружают
+    result = subprocess.run(
+        [cmd, "stdin", "stdout", "-l", languages, "--psm", "1"],
+        input=png, capture_output=True, timeout=timeout,
+        env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or f"tesseract: код {result.returncode}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _ocr_page(path, index, options):
+    """
+    Растеризует и распознаёт одну страницу (в процессе или потоке пула).
+    Возвращает (номер страницы, текст, взят ли из кэша); текст None — страницу
+    распознать не удалось (ошибка Tesseract, таймаут, недоступный OCR_CACHE_DIR),
+    остальные страницы при этом распознаются.
+    """
+    try:
+        return _recognize_page(path, index, options)
+    except Exception as e:
+        logger.warning(f"Страница {index + 1} не распознана: {type(e).__name__}: {e}")
+        return index, None, False
+
+
+def _recognize_page(path, index, options):
+    with fitz.open(path) as doc:
+        page = doc[index]
+        dpi = _page_dpi(page, options["min_dpi"], options["max_dpi"])
+        png = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+
+    digest = hashlib.sha256(png + options["languages"].encode()).hexdigest()
+    cache_dir = options["cache_dir"]
+    cached_path = os.path.join(cache_dir, digest[:2], f"{digest}.txt")
+    if os.path.exists(cached_path):
+        with open(cached_path, encoding="utf-8") as f:
+            text = f.read()
+        # Время изменения — время последнего использования для вытеснения
+        os.utime(cached_path)
+        return index, text, True
+
+    text = _ocr_image(png, options["languages"], options["cmd"], options["timeout"])
+    # Временный файл и переименование: параллельное распознавание той же страницы
+    # не увидит недописанный результат
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    tmp_path = f"{cached_path}.{os.getpid()}.{index}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, cached_path)
+    return index, text, False
+
+
+def find_scanned_pages(path, pages):
+    """
+    Номера страниц без текстового слоя: текста меньше OCR_MIN_PAGE_CHARS
+    и на странице есть изображения (пустые страницы не распознаются).
+    """
+    candidates = [i for i, text in enumerate(pages) if len(text.strip()) < settings.OCR_MIN_PAGE_CHARS]
+    if not candidates:
+        return []
+    with fitz.open(path) as doc:
+        return [i for i in candidates if doc[i].get_images()]
+
+
+def _ocr_page_group(path, indices, options, conn):
+    """
+    Распознаёт страницы indices в отдельном процессе и отправляет по каналу
+    результат каждой страницы сразу после распознавания.
+    """
+    try:
+        for index in indices:
+            conn.send(_ocr_page(path, index, options))
+    finally:
+        conn.close()
+
+
+def _run_processes(workers, path, indices, options):
+    """
+    Распределяет страницы между workers процессами (через одну: соседние сканы
+    достаются разным процессам). Страницы процесса, завершившегося аварийно,
+    считаются нераспознанными.
+    """
+    results = {}
+    groups = [(path, indices[worker::workers], options) for worker in range(workers)]
+    for index, text, hit in run_in_processes(_ocr_page_group, groups):
+        results[index] = (index, text, hit)
+    return [results.get(index, (index, None, False)) for index in indices]
+
+
+def ocr_pages(path, indices, workers=None):
+    """
+    Распознаёт страницы indices документа. Возвращает ({номер: текст}, статистика):
+    число страниц, из кэша, время и страниц в секунду.
+    """
+    options = {
+        "languages": settings.OCR_LANGUAGES,
+        "min_dpi": settings.OCR_MIN_DPI,
+        "max_dpi": settings.OCR_MAX_DPI,
+        "cache_dir": settings.OCR_CACHE_DIR,
+        "cmd": settings.OCR_TESSERACT_CMD,
+        "timeout": settings.OCR_PAGE_TIMEOUT,
+    }
+    workers = max(1, min(workers or settings.OCR_MAX_WORKERS, len(indices)))
+    path = os.fspath(path)
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_ocr_page(path, index, options) for index in indices]
+    else:
+        results = _run_processes(workers, path, indices, options)
+    wall_time = time.perf_counter() - started
+
+    cached = sum(1 for _, _, hit in results if hit)
+    failed = sum(1 for _, text, _ in results if text is None)
+    count_ocr_pages('cached', cached)
+    count_ocr_pages('recognized', len(results) - cached - failed)
+    count_ocr_pages('failed', failed)
+    stats = {
+        "pages": len(results),
+        "cached": cached,
+        "failed": failed,
+        "wall_time": round(wall_time, 3),
+        "pages_per_sec": round(len(results) / wall_time, 2) if wall_time else 0,
+    }
+    return {index: text for index, text, _ in results if text is not None}, stats
+
+
+def ocr_missing_pages(path, pages):
+    """
+    Дополняет текст страниц PDF распознаванием страниц без текстового слоя.
+    Без Tesseract (или при OCR_ENABLED=False) страницы возвращаются как есть,
+    у нераспознанных страниц остаётся текст текстового слоя.
+    """
+    if not settings.OCR_ENABLED:
+        return pages
+    scanned = find_scanned_pages(path, pages)
+    if not scanned:
+        return pages
+    if not tesseract_available():
+        logger.warning(f"Страниц без текстового слоя: {len(scanned)}, Tesseract недоступен — распознавание пропущено")
+        return pages
+
+    recognized, stats = ocr_pages(path, scanned)
+    logger.info(
+        f"Распознано страниц: {stats['pages']} ({stats['pages_per_sec']} стр/с)",
+        extra={"ocr_" + key: value for key, value in stats.items()},
+    )
+    if stats['pages'] > stats['cached'] + stats['failed']:
+        evict_ocr_cache()
+    return [recognized.get(i, text) for i, text in enumerate(pages)]
+
+
+def evict_ocr_cache():
+    """
+    Удаляет результаты, не использованные OCR_CACHE_TTL секунд, затем самые давно
+    использованные, пока размер кэша не уложится в OCR_CACHE_MAX_SIZE.
+    """
+    expires = time.time() - settings.OCR_CACHE_TTL
+    entries, total = [], 0
+    for root, _, names in os.walk(settings.OCR_CACHE_DIR):
+        for name in names:
+            if not name.endswith(".txt"):
+                continue  # Недописанные временные файлы
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime < expires:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue  # Удалён параллельным вытеснением
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= settings.OCR_CACHE_MAX_SIZE:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+@functools.lru_cache(maxsize=1)
+def tesseract_available():
+    """
+    Установлен ли Tesseract (OCR_TESSERACT_CMD) со всеми языками OCR_LANGUAGES.
+    """
+    try:
+        result = subprocess.run(
+            [settings.OCR_TESSERACT_CMD, "--list-langs"], capture_output=True, timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    installed = set(result.stdout.decode(errors="replace").split())
+    return result.returncode == 0 and set(settings.OCR_LANGUAGES.split("+")) <= installed
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DocumentCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация списка документов по (uploaded_at, id), от новых к старым.
+    Стоимость страницы не растёт с числом документов пользователя
+    (индекс api_doc_user_uploaded_idx), в отличие от OFFSET.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-uploaded_at', '-id')
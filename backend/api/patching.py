@@ -0,0 +1,150 @@
+import re
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+# Применение правок модели к извлечённому тексту договора (режим AI_REWRITE_MODE='patch').
+# Модель возвращает не весь переписанный договор, а список правок по пунктам:
+#   {"op": "replace" | "delete" | "insert_after", "anchor": "<цитата исходного пункта>", "text": "..."}
+# Якорь ищется в тексте по очереди: точное совпадение, совпадение без учёта
+# пробелов и переносов строк, нечёткое совпадение с абзацами текста
+# (SequenceMatcher, порог AI_PATCH_FUZZY_THRESHOLD).
+
+PATCH_OPS = ('replace', 'delete', 'insert_after')
+
+_WS_RE = re.compile(r'\s+')
+_MAX_FUZZY_LINES = 3  # якорь может занимать несколько соседних строк
+
+
+def _normalize_with_map(text):
+    """
+    Схлопывает пробельные символы в один пробел. Возвращает нормализованную строку
+    и позиции её символов в исходном тексте.
+    """
+    chars = []
+    positions = []
+    in_ws = False
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if not in_ws and chars:
+                chars.append(' ')
+                positions.append(i)
+            in_ws = True
+        else:
+            chars.append(ch)
+            positions.append(i)
+            in_ws = False
+    return ''.join(chars), positions
+
+
+def _line_spans(text):
+    spans = []
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped:
+            start = pos + line.index(stripped[0])
+            spans.append((start, start + len(stripped)))
+        pos += len(line)
+    return spans
+
+
+def _fuzzy_find(text, anchor, lines):
+    target = _WS_RE.sub(' ', anchor).strip().lower()
+    threshold = settings.AI_PATCH_FUZZY_THRESHOLD
+    best = None
+    for i in range(len(lines)):
+        for k in range(1, _MAX_FUZZY_LINES + 1):
+            if i + k > len(lines):
+                break
+            start, end = lines[i][0], lines[i + k - 1][1]
+            candidate = _WS_RE.sub(' ', text[start:end]).lower()
+            matcher = SequenceMatcher(None, target, candidate, autojunk=False)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold and (best is None or ratio > best[2]):
+                best = (start, end, ratio)
+    return best
+
+
+def find_anchor(text, anchor, normalized=None, lines=None):
+    """
+    Ищет якорь в тексте. Возвращает (start, end, способ) или None.
+    """
+    anchor = (anchor or '').strip()
+    if not anchor:
+        return None
+
+    start = text.find(anchor)
+    if start != -1:
+        return start, start + len(anchor), 'exact'
+
+    norm_text, positions = normalized or _normalize_with_map(text)
+    norm_anchor = _WS_RE.sub(' ', anchor)
+    start = norm_text.find(norm_anchor)
+    if start != -1:
+        return positions[start], positions[start + len(norm_anchor) - 1] + 1, 'normalized'
+
+    match = _fuzzy_find(text, anchor, lines if lines is not None else _line_spans(text))
+    if match:
+        return match[0], match[1], 'fuzzy'
+    return None
+
+
+def apply_edits(text, edits):
+    """
+    Применяет правки к исходному тексту.
+
+    Возвращает словарь:
+      text — текст с применёнными правками;
+      applied, fuzzy — число применённых правок (из них найденных нечётко);
+      appended — insert_after без найденного якоря, добавлены в конец текста;
+      unmatched — replace/delete, для которых якорь не найден или пересекается
+      с другой правкой (для них нужен запасной вариант, см. services).
+    """
+    normalized = _normalize_with_map(text)
+    lines = _line_spans(text)
+    spans = []
+    unmatched = []
+    appended = []
+    fuzzy = 0
+
+    for edit in edits or []:
+        if not isinstance(edit, dict) or edit.get('op', 'replace') not in PATCH_OPS:
+            continue
+        op = edit.get('op', 'replace')
+        found = find_anchor(text, edit.get('anchor'), normalized, lines)
+        if found is None:
+            (appended if op == 'insert_after' and edit.get('text') else unmatched).append(edit)
+            continue
+        start, end, method = found
+        if any(start < s_end and s_start < end for s_start, s_end, _, _ in spans):
+            unmatched.append(edit)
+            continue
+        if method == 'fuzzy':
+            fuzzy += 1
+        spans.append((start, end, op, (edit.get('text') or '').strip()))
+
+    parts = []
+    pos = 0
+    for start, end, op, new_text in sorted(spans):
+        if op == 'insert_after':
+            parts.append(text[pos:end])
+            parts.append('\n' + new_text)
+        else:
+            parts.append(text[pos:start])
+            if op == 'replace':
+                parts.append(new_text)
+        pos = end
+    parts.append(text[pos:])
+    for edit in appended:
+        parts.append('\n' + edit['text'].strip())
+
+    return {
+        "text": ''.join(parts),
+        "applied": len(spans),
+        "fuzzy": fuzzy,
+        "appended": len(appended),
+        "unmatched": unmatched,
+    }
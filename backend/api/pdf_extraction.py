@@ -0,0 +1,121 @@
+import os
+import time
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from .processes import run_in_processes
+
+# Большие PDF извлекаются параллельно — до PDF_MAX_WORKERS процессов начиная
+# с PDF_PARALLEL_MIN_PAGES страниц: для небольших документов запуск процессов дороже
+# самого извлечения. Процессы запускает run_in_processes (api/processes.py) —
+# в том числе внутри prefork-воркера Celery.
+
+
+def _open_pdf(source):
+    """
+    Открывает PDF по пути (PyMuPDF читает файл сам, без копии в памяти)
+    или, для обратной совместимости, из файлового потока.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open(stream=source.read(), filetype="pdf")
+
+
+def _extract_page_ranges(path, ranges, conn):
+    """
+    Извлекает текст диапазонов страниц в отдельном процессе и отправляет
+    по каналу (номер диапазона, тексты страниц) — либо (None, ошибка).
+    Каждый процесс сам открывает файл по пути — байты между процессами не передаются.
+    """
+    try:
+        with fitz.open(path) as doc:
+            for index, (start, stop) in ranges:
+                conn.send((index, [doc[i].get_text() for i in range(start, stop)]))
+    except Exception as e:
+        conn.send((None, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _page_ranges(page_count, workers):
+    """
+    Делит документ на непрерывные диапазоны страниц — по несколько на процесс,
+    чтобы медленные страницы (сканы, таблицы) не задерживали один процесс.
+    """
+    chunk = max(1, -(-page_count // (workers * 4)))
+    return [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+
+
+def iter_pdf_pages(source, workers=None):
+    """
+    Лениво отдаёт текст PDF постранично, в исходном порядке страниц.
+
+    Для больших файлов, переданных по пути, страницы извлекаются параллельно
+    несколькими процессами (в том числе внутри prefork-воркера Celery).
+    """
+    workers = workers or settings.PDF_MAX_WORKERS
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        parallel = (
+            isinstance(source, (str, os.PathLike))
+            and workers > 1
+            and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+        )
+        if not parallel:
+            for page in doc:
+                yield page.get_text()
+            return
+
+    path = os.fspath(source)
+    ranges = list(enumerate(_page_ranges(page_count, workers)))
+    count = min(workers, len(ranges))
+    # Диапазоны через один: медленные страницы подряд достаются разным процессам
+    messages = run_in_processes(_extract_page_ranges, [(path, ranges[worker::count]) for worker in range(count)])
+    received, next_index = {}, 0
+    try:
+        for index, pages in messages:
+            if index is None:
+                raise RuntimeError(f"Ошибка извлечения страниц PDF: {pages}")
+            received[index] = pages
+            while next_index in received:
+                yield from received.pop(next_index)
+                next_index += 1
+    finally:
+        # В том числе если страницы дочитаны не до конца
+        messages.close()
+    if next_index < len(ranges):
+        raise RuntimeError("Процесс извлечения PDF завершился, не вернув страницы")
+
+
+def extract_pdf_pages(source, workers=None):
+    """
+    Возвращает список текстов страниц и статистику извлечения:
+    число страниц, общее время, время на страницу и пиковый RSS.
+    """
+    started = time.perf_counter()
+    pages = list(iter_pdf_pages(source, workers=workers))
+    wall_time = time.perf_counter() - started
+
+    stats = {
+        "pages": len(pages),
+        "wall_time": round(wall_time, 4),
+        "ms_per_page": round(wall_time * 1000 / len(pages), 3) if pages else 0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return pages, stats
+
+
+def peak_rss_mb():
+    """
+    Пиковый RSS текущего процесса и его завершённых дочерних процессов, МБ.
+    На Linux ru_maxrss измеряется в килобайтах. Модуль resource есть только
+    в Unix — на Windows возвращается None.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
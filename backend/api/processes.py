@@ -0,0 +1,46 @@
+from billiard import Pipe, Process
+from billiard.connection import wait
+
+# Параллельная обработка страниц PDF (api/pdf_extraction.py) и распознавание сканов
+# (api/ocr.py) в отдельных процессах. Процессы — billiard.Process (зависимость Celery):
+# в отличие от multiprocessing, он запускается и внутри дочернего процесса
+# prefork-воркера, где выполняется extract_text_stage. Пул billiard.Pool не подходит:
+# его служебные потоки опрашивают очереди с паузами до секунды, и остановка пула
+# дороже самой работы.
+
+
+def run_in_processes(target, arg_slices):
+    """
+    Запускает по процессу на каждый набор аргументов из arg_slices:
+    target(*args, conn) отправляет результаты в канал conn и закрывает его.
+
+    Генератор отдаёт сообщения всех процессов по мере поступления и завершается,
+    когда закрыты все каналы. При закрытии генератора (ошибка, потребитель
+    перестал читать) ещё работающие процессы останавливаются.
+    """
+    processes, conns = [], []
+    try:
+        for args in arg_slices:
+            reader, writer = Pipe(duplex=False)
+            process = Process(target=target, args=(*args, writer), daemon=True)
+            process.start()
+            writer.close()
+            processes.append(process)
+            conns.append(reader)
+
+        while conns:
+            for conn in wait(conns):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    conn.close()
+                    conns.remove(conn)
+                    continue
+                yield message
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for conn in conns:
+            conn.close()
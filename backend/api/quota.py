@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models import F, Q
+
+from .auth_cache import invalidate_user_info
+from .models import CheckLedgerEntry, Document, Transaction, UserProfile
+
+# Учёт проверок: резерв при загрузке, списание при успехе, возврат при ошибке.
+# Баланс меняется только условными UPDATE с F-выражениями (без чтения-изменения-записи),
+# поэтому параллельные загрузки не уводят checks_remaining в минус, а повторы
+# задач и вебхуков не списывают и не начисляют проверки дважды.
+# Каждое движение баланса пишется в журнал CheckLedgerEntry и сбрасывает кэш /user/info/
+# (UPDATE по queryset не вызывает post_save профиля).
+
+
+def reserve_check(user_id):
+    """
+    Резервирует одну проверку: списывает её, только если баланс положителен.
+    Вызывается внутри transaction.atomic() вместе с созданием документа.
+    Возвращает True, если резерв получен.
+    """
+    reserved = UserProfile.objects.filter(user_id=user_id, checks_remaining__gt=0).update(
+        checks_remaining=F('checks_remaining') - 1
+    ) == 1
+    if reserved:
+        invalidate_user_info(user_id)
+    return reserved
+
+
+def reserve_checks(user_id, count):
+    """
+    Резервирует count проверок пакета одним условным UPDATE: все или ни одной.
+    Вызывается внутри transaction.atomic() вместе с созданием документов.
+    Возвращает True, если резерв получен.
+    """
+    reserved = UserProfile.objects.filter(user_id=user_id, checks_remaining__gte=count).update(
+        checks_remaining=F('checks_remaining') - count
+    ) == 1
+    if reserved:
+        invalidate_user_info(user_id)
+    return reserved
+
+
+def record_reservation(document):
+    CheckLedgerEntry.objects.create(user_id=document.user_id, document=document, kind='reserve', amount=-1)
+
+
+def record_reservations(documents):
+    CheckLedgerEntry.objects.bulk_create([
+        CheckLedgerEntry(user_id=document.user_id, document=document, kind='reserve', amount=-1)
+        for document in documents
+    ])
+
+
+def commit_check(document_id):
+    """
+    Подтверждает резерв документа после успешного анализа.
+    Повторный вызов ничего не меняет. Возвращает True, если резерв подтверждён сейчас.
+    """
+    with transaction.atomic():
+        if not Document.objects.filter(pk=document_id, quota_state='reserved').update(quota_state='committed'):
+            return False
+        user_id = Document.objects.filter(pk=document_id).values_list('user_id', flat=True).first()
+        UserProfile.objects.filter(user_id=user_id).update(total_checks_count=F('total_checks_count') + 1)
+        CheckLedgerEntry.objects.create(user_id=user_id, document_id=document_id, kind='commit', amount=0)
+        invalidate_user_info(user_id)
+    return True
+
+
+def release_check(document_id):
+    """
+    Возвращает зарезервированную проверку на баланс (ошибка анализа).
+    Повторный вызов ничего не меняет. Возвращает True, если проверка возвращена сейчас.
+    """
+    with transaction.atomic():
+        if not Document.objects.filter(pk=document_id, quota_state='reserved').update(quota_state='released'):
+            return False
+        user_id = Document.objects.filter(pk=document_id).values_list('user_id', flat=True).first()
+        UserProfile.objects.filter(user_id=user_id).update(checks_remaining=F('checks_remaining') + 1)
+        CheckLedgerEntry.objects.create(user_id=user_id, document_id=document_id, kind='release', amount=1)
+        invalidate_user_info(user_id)
+    return True
+
+
+def release_deleted_document(document):
+    """
+    Возврат резерва документа, удалённого до завершения анализа (post_delete).
+    Строки документа уже нет, поэтому защита от повтора — состояние удалённого экземпляра.
+    """
+    if document.quota_state != 'reserved' or not document.user_id:
+        return False
+    UserProfile.objects.filter(user_id=document.user_id).update(checks_remaining=F('checks_remaining') + 1)
+    CheckLedgerEntry.objects.create(user_id=document.user_id, kind='release', amount=1)
+    invalidate_user_info(document.user_id)
+    return True
+
+
+def credit_payment(inv_id):
+    """
+    Начисляет проверки по оплаченной транзакции (вебхук Robokassa).
+    Идемпотентно по InvId: переход транзакции pending -> completed выполняется
+    условным UPDATE, повторное уведомление ничего не начисляет.
+    Возвращает транзакцию, если начисление выполнено сейчас, иначе None.
+    """
+    payment_id = str(inv_id)
+    with transaction.atomic():
+        if not Transaction.objects.filter(id=inv_id, status='pending').update(status='completed', payment_id=payment_id):
+            return None
+        payment = Transaction.objects.select_related('user').get(id=inv_id)
+        UserProfile.objects.get_or_create(user=payment.user)
+        profiles = UserProfile.objects.filter(user=payment.user)
+        profiles.update(checks_remaining=F('checks_remaining') + payment.checks_count)
+
+        # Повышение тарифа (business не понижается до pro)
+        if payment.checks_count >= 100:
+            profiles.update(subscription_tier='business')
+        elif payment.checks_count >= 20:
+            profiles.filter(~Q(subscription_tier='business')).update(subscription_tier='pro')
+
+        CheckLedgerEntry.objects.create(
+            user=payment.user, kind='credit', amount=payment.checks_count, payment_id=payment_id
+        )
+        invalidate_user_info(payment.user_id)
+    return payment
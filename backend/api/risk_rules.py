@@ -0,0 +1,267 @@
+import functools
+import json
+import re
+
+from django.conf import settings
+
+# Быстрая предварительная проверка договора по правилам, до ответа AI.
+# Свод — DEFAULT_RISK_RULES или JSON-файл RISK_RULES_PATH в том же формате:
+#   [{"id": "...", "title": "...", "description": "...",
+#     "severity": "high" | "medium" | "low",
+#     "keywords": ["основа слова", ...], "patterns": ["регулярное выражение", ...]}]
+# Правила компилируются один раз на процесс. keywords — подстроки, одна из которых
+# обязательно входит в любое совпадение правила: регулярные выражения запускаются
+# только в окнах вокруг найденных подстрок, а если подстрок в тексте нет — не
+# запускаются вовсе. Поиск ведётся по тексту в нижнем регистре шаблонами
+# в нижнем регистре (без re.IGNORECASE, который для кириллицы в разы медленнее),
+# поэтому регистр в шаблонах и ключевых словах не важен.
+
+SEVERITY_WEIGHTS = {'high': 25, 'medium': 10, 'low': 5}
+QUOTE_CHARS = 200  # длина цитаты пункта в найденном риске
+KEYWORD_WINDOW = 300  # символов вокруг ключевой подстроки; совпадение правила не длиннее окна
+
+_ESCAPE_OR_TEXT_RE = re.compile(r'\\.|[^\\]+', re.S)
+
+DEFAULT_RISK_RULES = [
+    {
+        "id": "high_penalty",
+        "title": "Высокая неустойка за просрочку",
+        "description": "Пеня от 0,5% в день — сотни процентов годовых, суд может признать её несоразмерной.",
+        "severity": "high",
+        "keywords": ["пен", "неустойк"],
+        "patterns": [
+            r"(?:пен[яиеюь]|неустойк\w*)[^.;\n]{0,80}?(?<![\d.,])(?:[1-9]\d*(?:[.,]\d+)?|0[.,][5-9]\d*)\s*%"
+            r"[^.;\n]{0,80}?(?:кажд\w+\s+(?:календарн\w+\s+)?д(?:ень|ня)|в\s+день|ежедневн)",
+        ],
+    },
+    {
+        "id": "unilateral_termination",
+        "title": "Одностороннее расторжение или изменение",
+        "description": "Контрагент может расторгнуть или изменить договор без согласия второй стороны и без суда.",
+        "severity": "high",
+        "keywords": ["односторонн"],
+        "patterns": [
+            r"в\s+одностороннем\s+(?:внесудебном\s+)?порядке",
+            r"односторонн\w+\s+(?:отказ|расторжени|изменени)",
+        ],
+    },
+    {
+        "id": "unilateral_price_change",
+        "title": "Изменение цены без согласования",
+        "description": "Сторона вправе повышать цену или арендную плату без дополнительного соглашения.",
+        "severity": "high",
+        "keywords": ["измен", "повыш", "повыс", "увелич", "пересмотр"],
+        "patterns": [
+            r"(?:вправе|может|имеет\s+право)\s+(?:[^.;\n]{0,40}?\s)?(?:изменить|изменять|повысить|повышать|увеличить|увеличивать|пересмотреть)"
+            r"\s+(?:размер\s+)?(?:арендн\w+\s+плат|цен|стоимост|тариф)",
+        ],
+    },
+    {
+        "id": "deposit_not_returned",
+        "title": "Невозврат обеспечительного платежа",
+        "description": "Обеспечительный платёж или залог не возвращается — фактически это скрытый штраф.",
+        "severity": "high",
+        "keywords": ["возвра"],
+        "patterns": [
+            r"(?:обеспечительн\w+\s+плат[её]ж\w*|залог\w*|депозит\w*|задат\w*)[^.;\n]{0,100}?не\s+(?:возвраща|подлежит\s+возврат)",
+        ],
+    },
+    {
+        "id": "liability_exclusion",
+        "title": "Исключение ответственности контрагента",
+        "description": "Контрагент освобождён от ответственности за нарушение своих обязательств.",
+        "severity": "medium",
+        "keywords": ["ответственност"],
+        "patterns": [
+            r"не\s+нес[её]т\s+(?:никакой\s+)?ответственност",
+            r"освобожда\w+\s+от\s+(?:любой\s+)?ответственност",
+        ],
+    },
+    {
+        "id": "full_prepayment",
+        "title": "Полная предоплата",
+        "description": "100% предоплата без гарантий исполнения переносит весь риск на плательщика.",
+        "severity": "medium",
+        "keywords": ["предоплат"],
+        "patterns": [
+            r"100\s*%\s*(?:\(сто\s+процентов\)\s*)?предоплат",
+            r"предоплат\w*\s+в\s+размере\s+100\s*%",
+        ],
+    },
+    {
+        "id": "short_notice",
+        "title": "Короткий срок уведомления",
+        "description": "Срок уведомления меньше двух недель не оставляет времени подготовиться к расторжению или изменениям.",
+        "severity": "medium",
+        "keywords": ["уведом"],
+        "patterns": [
+            r"уведом\w+[^.;\n]{0,40}?за\s+(?:[1-9]|1[0-3])\s*(?:\([^)]{1,20}\)\s*)?(?:календарн\w+\s+|рабоч\w+\s+)?(?:дн|день|сут)",
+        ],
+    },
+    {
+        "id": "silent_acceptance",
+        "title": "Согласие по умолчанию",
+        "description": "Документы или изменения считаются принятыми, если возражения не поступили в срок.",
+        "severity": "medium",
+        "keywords": ["счита"],
+        "patterns": [
+            r"счита\w+\s+(?:принят|согласован|подписан|одобрен)\w*[^.;\n]{0,80}?(?:не\s+поступ|отсутстви\w+\s+(?:письменн\w+\s+)?(?:возражени|претензи|замечани))",
+        ],
+    },
+    {
+        "id": "auto_prolongation",
+        "title": "Автоматическая пролонгация",
+        "description": "Договор продлевается автоматически — легко пропустить срок отказа от продления.",
+        "severity": "low",
+        "keywords": ["автоматически", "продл"],
+        "patterns": [
+            r"автоматически\s+(?:пролонгир|продлева|продлев)",
+            r"счита\w+\s+продл[её]нн\w+\s+на\s+(?:тот\s+же|следующ|аналогичн)",
+        ],
+    },
+    {
+        "id": "foreign_jurisdiction",
+        "title": "Споры по месту нахождения контрагента",
+        "description": "Подсудность по месту контрагента увеличивает расходы на защиту своих интересов.",
+        "severity": "low",
+        "keywords": ["нахождени"],
+        "patterns": [
+            r"по\s+месту\s+нахождения\s+(?:Арендодателя|Исполнителя|Поставщика|Продавца|Займодавца|Подрядчика|Лицензиара)",
+        ],
+    },
+]
+
+
+def _lower_pattern(pattern):
+    """
+    Шаблон в нижнем регистре; экранированные последовательности (\\S, \\W, \\D) не меняются.
+    """
+    return _ESCAPE_OR_TEXT_RE.sub(lambda m: m.group() if m.group().startswith('\\') else m.group().lower(), pattern)
+
+
+def _lower_text(text):
+    lower = text.lower()
+    if len(lower) != len(text):
+        # Редкие символы, у которых строчная форма длиннее, оставляем как есть — позиции должны совпадать
+        lower = ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+    return lower
+
+
+def _keyword_windows(lower, keywords):
+    """
+    Объединённые окна [start, end) вокруг всех вхождений ключевых подстрок.
+    """
+    positions = []
+    for keyword in keywords:
+        pos = lower.find(keyword)
+        while pos != -1:
+            positions.append(pos)
+            pos = lower.find(keyword, pos + 1)
+    windows = []
+    for pos in sorted(positions):
+        start, end = max(0, pos - KEYWORD_WINDOW), pos + KEYWORD_WINDOW
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return windows
+
+
+class RiskMatcher:
+    """
+    Скомпилированный свод правил: регулярное выражение и ключевые подстроки каждого правила.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self._compiled = []
+        for rule in rules:
+            if rule.get('severity') not in SEVERITY_WEIGHTS or not rule.get('patterns'):
+                raise ValueError(f"Некорректное правило риска: {rule.get('id')!r}")
+            regex = re.compile('|'.join(f'(?:{_lower_pattern(p)})' for p in rule['patterns']))
+            keywords = tuple(keyword.lower() for keyword in rule.get('keywords', ()))
+            self.rules.append(rule)
+            self._compiled.append((regex, keywords))
+
+    def find(self, text):
+        """
+        Возвращает {индекс правила: (число совпадений, первое совпадение)}.
+        Позиции совпадений совпадают с позициями в исходном тексте.
+        """
+        lower = _lower_text(text)
+        hits = {}
+        for index, (regex, keywords) in enumerate(self._compiled):
+            windows = _keyword_windows(lower, keywords) if keywords else [[0, len(lower)]]
+            count, first = 0, None
+            for start, end in windows:
+                for match in regex.finditer(lower, start, end):
+                    count += 1
+                    first = first or match
+            if first is not None:
+                hits[index] = (count, first)
+        return hits
+
+
+def load_risk_rules():
+    path = settings.RISK_RULES_PATH
+    if not path:
+        return DEFAULT_RISK_RULES
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def get_risk_matcher():
+    return RiskMatcher(load_risk_rules())
+
+
+def _quote(text, start, end):
+    """
+    Предложение или строка, в которой найдено совпадение.
+    """
+    left = text.rfind('\n', 0, start) + 1
+    sentence = text.rfind('. ', left, start)
+    if sentence != -1:
+        left = sentence + 2
+    ends = [i for i in (text.find('\n', end), text.find('. ', end)) if i != -1]
+    right = min(ends) + 1 if ends else len(text)
+    quote = ' '.join(text[left:right].split())
+    return quote if len(quote) <= QUOTE_CHARS else quote[:QUOTE_CHARS - 1] + '…'
+
+
+def prescreen_contract(text):
+    """
+    Проверяет текст по своду правил. Возвращает предварительную оценку
+    (100 минус веса найденных правил) и риски в формате ответа AI
+    с цитатой пункта и числом совпадений.
+    """
+    matcher = get_risk_matcher()
+    hits = matcher.find(text or '')
+    risks = []
+    penalty = 0
+    for index in sorted(hits, key=lambda i: (-SEVERITY_WEIGHTS[matcher.rules[i]['severity']], hits[i][1].start())):
+        rule = matcher.rules[index]
+        count, match = hits[index]
+        penalty += SEVERITY_WEIGHTS[rule['severity']]
+        risks.append({
+            "title": rule['title'],
+            "description": rule['description'],
+            "severity": rule['severity'],
+            "rule": rule['id'],
+            "quote": _quote(text, match.start(), match.end()),
+            "matches": count,
+        })
+    return {
+        "score": max(0, 100 - penalty),
+        "risks": risks,
+    }
+
+
+def is_clean_prescreen(prescreen):
+    """
+    Документ без рисков high/medium и с оценкой не ниже AI_PRESCREEN_CLEAN_SCORE.
+    """
+    return (
+        prescreen['score'] >= settings.AI_PRESCREEN_CLEAN_SCORE
+        and not any(risk['severity'] in ('high', 'medium') for risk in prescreen['risks'])
+    )
@@ -0,0 +1,309 @@
+import contextlib
+import logging
+import math
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Document, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Планировщик анализов перед конвейером (api/tasks.py). Загруженный документ
+# не уходит в Celery сразу, а встаёт в очередь в БД (Document.queued_at) и запускается,
+# когда освобождается слот: всего в конвейере не больше ANALYSIS_MAX_RUNNING документов,
+# у одного пользователя — не больше ANALYSIS_MAX_PER_USER. Очереди Celery остаются
+# короткими, а порядок запуска решает планировщик, а не FIFO брокера.
+#
+# Порядок: сначала полоса тарифа (business > pro > free), внутри полосы — пользователь
+# с наименьшим числом запущенных документов, затем самый давний документ. Каждые
+# ANALYSIS_LANE_AGING секунд ожидания поднимают документ на полосу выше,
+# поэтому поток загрузок старших тарифов не останавливает бесплатные проверки.
+#
+# Слот занят, пока документ в статусе pending/analyzing с dispatched_at; завершение
+# анализа (processed/failed) или удаление документа освобождает его и запускает следующие.
+# Работающая стадия конвейера раз в ANALYSIS_HEARTBEAT_INTERVAL секунд отмечает документ
+# (stage_heartbeat, Document.heartbeat_at). Слот перестаёт учитываться, когда документ
+# запущен дольше ANALYSIS_SLOT_TIMEOUT и отметок нет ANALYSIS_HEARTBEAT_TIMEOUT секунд
+# (воркер упал, задача потеряна): медленный, но живой анализ не запускается второй раз.
+# Периодическая задача recover_stale_analyses_task (Celery beat) возвращает такой документ
+# в очередь, а после ANALYSIS_MAX_DISPATCHES запусков переводит в failed с возвратом проверки.
+#
+# Выбор выполняет один процесс за раз (блокировка в кэше). Вызов, не получивший
+# блокировку, ставит флаг, и держатель блокировки повторяет выбор. В режиме eager
+# завершение конвейера вызывает выбор внутри запуска — вложенный вызов только ставит
+# флаг, иначе длинная очередь превратилась бы в глубокую рекурсию.
+
+TIER_LANES = {'free': 0, 'pro': 1, 'business': 2}
+IN_FLIGHT_STATUSES = ['pending', 'analyzing']
+
+LOCK_KEY = 'scheduler:lock'
+LOCK_TIMEOUT = 30  # Блокировка выбора, сек: снимается раньше, если процесс упал
+DIRTY_KEY = 'scheduler:dirty'
+DURATION_KEY = 'scheduler:duration'
+DURATION_WEIGHT = 0.2  # Вес последнего анализа в скользящей средней длительности
+
+_local = threading.local()
+
+
+def _queued():
+    return Document.objects.filter(status='pending', queued_at__isnull=False, dispatched_at__isnull=True)
+
+
+def _alive(now):
+    return (
+        Q(dispatched_at__gte=now - timedelta(seconds=settings.ANALYSIS_SLOT_TIMEOUT))
+        | Q(dispatched_at__isnull=False, heartbeat_at__gte=now - timedelta(seconds=settings.ANALYSIS_HEARTBEAT_TIMEOUT))
+    )
+
+
+def _running(now):
+    return Document.objects.filter(_alive(now), status__in=IN_FLIGHT_STATUSES)
+
+
+def _effective_lane(lane, queued_at, now):
+    aging = settings.ANALYSIS_LANE_AGING
+    if aging <= 0:
+        return lane
+    return lane + int((now - queued_at).total_seconds() // aging)
+
+
+def schedule_analysis(document):
+    """
+    Ставит документ в очередь на анализ в полосе тарифа владельца и запускает
+    свободные слоты. На документе заполняются queue_position и estimated_wait.
+    """
+    schedule_analyses([document])
+    document.refresh_from_db(fields=['status', 'score', 'dispatched_at'])
+    annotate_queue(document)
+
+
+def schedule_analyses(documents):
+    """
+    Ставит документы одного пользователя в очередь одним UPDATE (пакетная загрузка)
+    и один раз запускает свободные слоты.
+    """
+    if not documents:
+        return
+    user_id = documents[0].user_id
+    tier = UserProfile.objects.filter(user_id=user_id).values_list('subscription_tier', flat=True).first()
+    lane = TIER_LANES.get(tier, 0)
+    queued_at = timezone.now()
+    Document.objects.filter(pk__in=[document.pk for document in documents]).update(queue_lane=lane, queued_at=queued_at)
+    for document in documents:
+        document.queue_lane, document.queued_at = lane, queued_at
+        logger.info("Документ в очереди на анализ", extra={"document_id": document.id, "lane": lane})
+
+    dispatch_queued()
+
+
+def dispatch_queued():
+    """
+    Запускает ожидающие документы на свободные слоты.
+    """
+    cache.set(DIRTY_KEY, True, timeout=None)
+    if getattr(_local, 'dispatching', False):
+        return  # Вызов из конвейера, запущенного этим же потоком (eager)
+    _local.dispatching = True
+    try:
+        while cache.get(DIRTY_KEY):
+            if not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+                return  # Держатель блокировки увидит флаг и повторит выбор
+            try:
+                cache.delete(DIRTY_KEY)
+                started = _claim_slots()
+            finally:
+                cache.delete(LOCK_KEY)
+            # Задачи ставятся без блокировки: в режиме eager конвейер выполняется здесь же
+            _start(started)
+    finally:
+        _local.dispatching = False
+
+
+def _claim_slots():
+    """
+    Выбирает документы на свободные слоты и отмечает их dispatched_at.
+    Возвращает id запущенных документов.
+    """
+    now = timezone.now()
+    running = _running(now)
+    free = settings.ANALYSIS_MAX_RUNNING - running.count()
+    if free <= 0:
+        return []
+
+    per_user = dict(running.values('user_id').annotate(total=Count('id')).values_list('user_id', 'total'))
+    waiting = {
+        row['user_id']: row
+        for row in _queued().values('user_id').annotate(
+            lane=Min('queue_lane'), oldest=Min('queued_at'), total=Count('id'),
+        )
+    }
+    for row in waiting.values():
+        row['lane'] = _effective_lane(row['lane'], row['oldest'], now)
+
+    slots = {}
+    for _ in range(free):
+        eligible = [
+            row for user_id, row in waiting.items()
+            if row['total'] > slots.get(user_id, 0)
+            and per_user.get(user_id, 0) < settings.ANALYSIS_MAX_PER_USER
+        ]
+        if not eligible:
+            break
+        row = min(eligible, key=lambda r: (-r['lane'], per_user.get(r['user_id'], 0), r['oldest']))
+        slots[row['user_id']] = slots.get(row['user_id'], 0) + 1
+        per_user[row['user_id']] = per_user.get(row['user_id'], 0) + 1
+
+    started = []
+    for user_id, count in slots.items():
+        ids = _queued().filter(user_id=user_id).order_by('queued_at', 'id').values_list('id', flat=True)[:count]
+        for document_id in ids:
+            # Условное обновление: документ не запускается дважды, даже если блокировка истекла
+            if _queued().filter(pk=document_id).update(dispatched_at=now, dispatch_count=F('dispatch_count') + 1):
+                started.append(document_id)
+    return started
+
+
+def _start(document_ids):
+    from .tasks import analyze_document_task
+
+    for document_id in document_ids:
+        logger.info("Анализ документа запущен планировщиком", extra={"document_id": document_id})
+        analyze_document_task.delay(document_id)
+
+
+def recover_stale_analyses():
+    """
+    Документы, занимающие слот дольше ANALYSIS_SLOT_TIMEOUT без отметок стадии
+    за ANALYSIS_HEARTBEAT_TIMEOUT (воркер упал, задача потеряна): возвращаются в очередь,
+    а исчерпавшие ANALYSIS_MAX_DISPATCHES запусков переводятся в failed.
+    Затем свободные слоты отдаются ожидающим.
+    Возвращает (возвращено в очередь, переведено в failed).
+    """
+    from .tasks import mark_document_failed
+
+    now = timezone.now()
+    stale = Document.objects.filter(
+        status__in=IN_FLIGHT_STATUSES, dispatched_at__isnull=False,
+    ).exclude(_alive(now)).values_list('id', 'dispatched_at', 'dispatch_count')
+
+    requeued = failed = 0
+    for document_id, dispatched_at, dispatch_count in stale:
+        # Условие по dispatched_at: документ, завершившийся за это время, не трогается
+        current = Document.objects.filter(pk=document_id, status__in=IN_FLIGHT_STATUSES, dispatched_at=dispatched_at)
+        if dispatch_count < settings.ANALYSIS_MAX_DISPATCHES:
+            # Стадии идемпотентны: повторный запуск берёт сохранённый текст и кэш анализа
+            if current.update(status='pending', dispatched_at=None, queued_at=now):
+                requeued += 1
+                logger.warning(
+                    "Зависший анализ возвращён в очередь",
+                    extra={"document_id": document_id, "dispatch_count": dispatch_count},
+                )
+        elif current.exists():
+            failed += 1
+            logger.error(
+                "Зависший анализ остановлен: исчерпаны повторные запуски",
+                extra={"document_id": document_id, "dispatch_count": dispatch_count},
+            )
+            mark_document_failed(document_id, "Анализ не завершился за отведённое время. Проверка возвращена на баланс.")
+
+    dispatch_queued()
+    return requeued, failed
+
+
+@contextlib.contextmanager
+def stage_heartbeat(document_id):
+    """
+    Пока выполняется стадия конвейера, фоновый поток раз в ANALYSIS_HEARTBEAT_INTERVAL
+    секунд обновляет Document.heartbeat_at. Остановка воркера останавливает и отметки.
+    """
+    if document_id is None:
+        yield
+        return
+
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while True:
+                Document.objects.filter(pk=document_id).update(heartbeat_at=timezone.now())
+                if stop.wait(settings.ANALYSIS_HEARTBEAT_INTERVAL):
+                    return
+        except Exception as e:
+            logger.warning(f"Отметка стадии не записана: {e}", extra={"document_id": document_id})
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{document_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def finish_analysis(document_id):
+    """
+    Освобождает слот документа после перевода в processed/failed:
+    учитывает длительность анализа в оценке ожидания и запускает следующие документы.
+    """
+    dispatched_at = Document.objects.filter(pk=document_id).values_list('dispatched_at', flat=True).first()
+    if dispatched_at:
+        seconds = (timezone.now() - dispatched_at).total_seconds()
+        average = cache.get(DURATION_KEY)
+        if average is not None:
+            seconds = average + DURATION_WEIGHT * (seconds - average)
+        cache.set(DURATION_KEY, seconds, timeout=None)
+    dispatch_queued()
+
+
+def queue_estimate(document):
+    """
+    Позиция документа в очереди (1 — запустится следующим) и оценка ожидания в секундах.
+    (None, None), если документ не ждёт в очереди.
+
+    Оценка повторяет порядок выбора: документы более высоких полос идут раньше,
+    в своей полосе каждый пользователь получает слот по очереди (k-й документ
+    пользователя ждёт не больше k документов каждого соседа по полосе).
+    """
+    if document.status != 'pending' or document.queued_at is None or document.dispatched_at is not None:
+        return None, None
+
+    now = timezone.now()
+    lane = _effective_lane(document.queue_lane, document.queued_at, now)
+    queued = _queued()
+    own_rank = queued.filter(user_id=document.user_id).filter(
+        Q(queued_at__lt=document.queued_at) | Q(queued_at=document.queued_at, id__lte=document.id)
+    ).count()
+
+    position = own_rank
+    rows = queued.exclude(user_id=document.user_id).values('user_id').annotate(
+        lane=Min('queue_lane'), oldest=Min('queued_at'), total=Count('id'),
+    )
+    for row in rows:
+        other_lane = _effective_lane(row['lane'], row['oldest'], now)
+        if other_lane > lane:
+            position += row['total']
+        elif other_lane == lane:
+            position += min(row['total'], own_rank)
+
+    average = cache.get(DURATION_KEY) or settings.ANALYSIS_DEFAULT_DURATION
+    rounds = max(
+        math.ceil(position / max(settings.ANALYSIS_MAX_RUNNING, 1)),
+        math.ceil(own_rank / max(settings.ANALYSIS_MAX_PER_USER, 1)),
+    )
+    return position, round(rounds * average)
+
+
+def annotate_queue(document):
+    """
+    Заполняет queue_position и estimated_wait для DocumentSerializer.
+    """
+    document.queue_position, document.estimated_wait = queue_estimate(document)
+    return document
@@ -0,0 +1,206 @@
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Document, DocumentText
+from .text_store import decompress_text, load_document_text, locate
+
+logger = logging.getLogger(__name__)
+
+# Полнотекстовый поиск по документам пользователя: название (вес A), резюме и заголовки
+# рисков (B), извлечённый текст (C). Индекс обновляется после извлечения текста
+# и после анализа AI (index_document), удаляется вместе с документом.
+#
+# PostgreSQL — столбец tsvector api_documenttext.search_vector с конфигурацией 'russian'
+# (морфология: «договора» находит «договор») и GIN-индексом, запрос — websearch_to_tsquery.
+# SQLite (разработка) — таблица FTS5 api_document_fts; морфологии нет, поэтому слова
+# запроса ищутся по префиксу без окончания. Обе структуры создаёт миграция 0017.
+#
+# В индекс попадают первые SEARCH_INDEX_MAX_CHARS символов текста (предел размера tsvector).
+# Ошибка индексации не останавливает анализ: конвейер вызывает update_search_index.
+#
+# Ранжирует БД (ts_rank_cd / bm25), фрагменты с подсветкой строятся по сохранённому
+# тексту (api/text_store.py) одинаково для обеих БД и несут страницу и пункт договора.
+
+SQLITE_FTS_TABLE = 'api_document_fts'
+MAX_TERMS = 8
+WORD_RE = re.compile(r'\w+')
+
+
+def query_terms(query):
+    return [term for term in WORD_RE.findall(query.lower()) if len(term) > 1][:MAX_TERMS]
+
+
+def _stem(term):
+    # Грубое отсечение окончания для SQLite и подсветки: «договора» -> «догово», «плата» -> «плат»
+    if len(term) > 5:
+        return term[:-2]
+    return term[:-1] if len(term) > 3 else term
+
+
+def _term_pattern(terms):
+    return re.compile(
+        r'(?<!\w)(?:' + '|'.join(re.escape(_stem(term)) for term in terms) + r')\w*', re.IGNORECASE,
+    )
+
+
+def _index_fields(document_id):
+    row = Document.objects.filter(pk=document_id).values('name', 'summary', 'risks').first()
+    if row is None:
+        return None
+    titles = [risk.get('title', '') for risk in row['risks'] or [] if isinstance(risk, dict)]
+    return row['name'] or '', "\n".join([row['summary'] or ''] + titles)
+
+
+def index_document(document_id):
+    """
+    Обновляет запись документа в полнотекстовом индексе.
+    """
+    fields = _index_fields(document_id)
+    if fields is None:
+        return
+    name, annotations = fields
+    body = (load_document_text(document_id) or '')[:settings.SEARCH_INDEX_MAX_CHARS]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"UPDATE {DocumentText._meta.db_table} SET search_vector = "
+                "setweight(to_tsvector('russian', %s), 'A') || "
+                "setweight(to_tsvector('russian', %s), 'B') || "
+                "setweight(to_tsvector('russian', %s), 'C') "
+                "WHERE document_id = %s",
+                [name, annotations, body, document_id],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [document_id])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, annotations, body) VALUES (%s, %s, %s, %s)",
+                [document_id, name, annotations, body],
+            )
+
+
+def update_search_index(document_id):
+    """
+    index_document для конвейера: ошибка индексации записывается в лог, анализ продолжается.
+    """
+    try:
+        # Точка сохранения: в PostgreSQL ошибка не прерывает внешнюю транзакцию
+        with transaction.atomic():
+            index_document(document_id)
+    except Exception as e:
+        logger.error(f"Ошибка индексации для поиска: {e}", extra={"document_id": document_id})
+        return False
+    return True
+
+
+def remove_from_index(document_id):
+    # В PostgreSQL вектор удаляется каскадом вместе с DocumentText
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [document_id])
+
+
+def _ranked_ids(user_id, query, terms, limit):
+    """
+    [(id документа, ранг)] по убыванию релевантности.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"SELECT t.document_id, ts_rank_cd(t.search_vector, q) AS rank "
+                f"FROM {DocumentText._meta.db_table} t "
+                f"JOIN {Document._meta.db_table} d ON d.id = t.document_id, "
+                "websearch_to_tsquery('russian', %s) q "
+                "WHERE d.user_id = %s AND t.search_vector @@ q "
+                "ORDER BY rank DESC, t.document_id DESC LIMIT %s",
+                [query, user_id, limit],
+            )
+        elif connection.vendor == 'sqlite':
+            match = " ".join(f'"{_stem(term)}"*' for term in terms)
+            cursor.execute(
+                f"SELECT f.rowid, -bm25({SQLITE_FTS_TABLE}, 10.0, 4.0, 1.0) AS rank "
+                f"FROM {SQLITE_FTS_TABLE} f JOIN {Document._meta.db_table} d ON d.id = f.rowid "
+                f"WHERE {SQLITE_FTS_TABLE} MATCH %s AND d.user_id = %s "
+                "ORDER BY rank DESC, f.rowid DESC LIMIT %s",
+                [match, user_id, limit],
+            )
+        else:
+            logger.warning(f"Полнотекстовый поиск не поддерживается для {connection.vendor}")
+            return []
+        return cursor.fetchall()
+
+
+def _fragment(text, pattern, start, end):
+    """
+    Фрагмент text[start:end] по границам слов, пробелы схлопнуты; подсветка — смещения совпадений.
+    """
+    if start > 0:
+        space = text.find(' ', start, end)
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+    fragment = " ".join(text[start:end].split())
+    fragment = ("…" if start > 0 else "") + fragment + ("…" if end < len(text) else "")
+    return fragment, [[m.start(), m.end()] for m in pattern.finditer(fragment)]
+
+
+def build_snippets(text, pattern, stored):
+    """
+    До SEARCH_SNIPPETS_PER_DOCUMENT непересекающихся фрагментов вокруг совпадений
+    со страницей и пунктом договора.
+    """
+    snippets, covered = [], 0
+    width = settings.SEARCH_SNIPPET_CHARS
+    for match in pattern.finditer(text):
+        if match.start() < covered:
+            continue
+        start = max(0, match.start() - width // 2)
+        end = min(len(text), match.end() + width // 2)
+        fragment, highlights = _fragment(text, pattern, start, end)
+        page, clause = locate(stored, match.start())
+        snippets.append({"text": fragment, "highlights": highlights, "page": page, "clause": clause})
+        covered = end
+        if len(snippets) >= settings.SEARCH_SNIPPETS_PER_DOCUMENT:
+            break
+    return snippets
+
+
+def search_documents(user_id, query, limit=None):
+    """
+    Поиск по документам пользователя: результаты по убыванию релевантности
+    с фрагментами текста и совпавшими заголовками рисков.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    limit = min(limit or settings.SEARCH_MAX_RESULTS, settings.SEARCH_MAX_RESULTS)
+    ranked = _ranked_ids(user_id, query, terms, limit)
+    if not ranked:
+        return []
+
+    ids = [document_id for document_id, _ in ranked]
+    documents = Document.objects.filter(pk__in=ids).only('id', 'name', 'status', 'score', 'uploaded_at', 'risks').in_bulk()
+    texts = DocumentText.objects.in_bulk(ids)
+    pattern = _term_pattern(terms)
+
+    results = []
+    for document_id, rank in ranked:
+        document = documents.get(document_id)
+        if document is None:
+            continue
+        stored = texts.get(document_id)
+        titles = [risk.get('title', '') for risk in document.risks or [] if isinstance(risk, dict)]
+        results.append({
+            "id": document.id,
+            "name": document.name,
+            "status": document.status,
+            "score": document.score,
+            "uploaded_at": document.uploaded_at,
+            "rank": round(float(rank), 4),
+            "snippets": build_snippets(decompress_text(stored.content), pattern, stored) if stored else [],
+            "matched_risks": [title for title in titles if pattern.search(title)],
+        })
+    return results
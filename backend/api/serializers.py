@@ -14,8 +14,25 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'profile']
 
+# Лёгкие колонки для списка документов (?fields=list): без summary, risks и ссылок на файлы
+DOCUMENT_LIST_FIELDS = ['id', 'name', 'uploaded_at', 'status', 'score']
+# Поля, вычисляемые планировщиком, а не читаемые из БД
+QUEUE_FIELDS = ['queue_position', 'estimated_wait']
+
 class DocumentSerializer(serializers.ModelSerializer):
+    # Очередь анализа (api/scheduler.py): заполняются annotate_queue, иначе null
+    queue_position = serializers.IntegerField(read_only=True, allow_null=True)
+    estimated_wait = serializers.IntegerField(read_only=True, allow_null=True)  # секунды
+
+    def __init__(self, *args, **kwargs):
+        # Проекция полей: DocumentSerializer(..., fields=['id', 'status'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Document
-        fields = ['id', 'name', 'file', 'uploaded_at', 'status', 'score', 'summary', 'risks', 'recommendations', 'improved_file']
-        read_only_fields = ['id', 'uploaded_at', 'status', 'score', 'summary', 'risks', 'recommendations', 'improved_file']
+        fields = ['id', 'name', 'file', 'uploaded_at', 'status', 'score', 'summary', 'risks', 'recommendations', 'improved_file', 'stage_timings', 'queue_position', 'estimated_wait']
+        read_only_fields = ['id', 'uploaded_at', 'status', 'score', 'summary', 'risks', 'recommendations', 'improved_file', 'stage_timings']
@@ -1,32 +1,86 @@
-import fitz  # PyMuPDF
-import openai
+import functools
+import logging
 import os
 import json
 from django.conf import settings
 import docx
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from .pdf_extraction import extract_pdf_pages
+from .ocr import ocr_missing_pages
+from .chunked_analysis import analyze_contract_chunked
+from .llm_gateway import get_llm_gateway
+from .stream_parser import PartialAnalysisParser
+from .patching import apply_edits
+from .doc_conversion import ConversionError, convert_doc_with_libreoffice, libreoffice_available
+from .docx_render import render_docx
 
-# Инициализация клиента OpenAI (совместимый с DeepSeek)
-client = openai.OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.polza.ai/api/v1"
-)
+logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(file_stream):
+# Клиент OpenAI (совместимый с DeepSeek) создаётся внутри шлюза api/llm_gateway.py:
+# пул соединений, таймауты, повторы и общий лимит параллельных запросов
+
+# Модель и версия промпта участвуют в ключе кэша анализа:
+# при смене любой из них старые результаты перестают совпадать
+AI_MODEL = "deepseek/deepseek-chat"
+PROMPT_VERSION = 3
+
+def is_mock_ai():
+    """
+    Возвращает True, если вместо реального AI используется заглушка
+    (USE_MOCK_AI=True или не задан ключ API).
+    """
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    use_mock = os.getenv("USE_MOCK_AI", "False").lower() == "true"
+    return use_mock or (not api_key or api_key.startswith("sk-placeholder"))
+
+def get_ai_model_name(model=None):
+    """
+    Имя модели, которая фактически выполнит анализ ("mock" для заглушки).
+    """
+    return "mock" if is_mock_ai() else (model or AI_MODEL)
+
+def get_rewrite_mode():
+    """
+    'full' — модель переписывает договор целиком (по умолчанию),
+    'patch' — модель возвращает правки по пунктам (api/patching.py).
     """
-    Извлекает текст из потока PDF-файла, используя PyMuPDF.
+    return 'patch' if settings.AI_REWRITE_MODE == 'patch' else 'full'
+
+def get_prompt_version():
+    """
+    Версия промпта для ключа кэша анализа: режимы переписывания используют разные промпты.
+    """
+    return f"{PROMPT_VERSION}-{get_rewrite_mode()}"
+
+def extract_pages_from_pdf(source):
+    """
+    Извлекает текст PDF постранично, используя PyMuPDF. Возвращает список страниц или None.
+    Принимает путь к файлу (предпочтительно — без копирования в память) или поток.
+    Страницы без текстового слоя (сканы) у файла по пути распознаются OCR (api/ocr.py).
     """
     try:
-        doc = fitz.open(stream=file_stream.read(), filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        pages, stats = extract_pdf_pages(source)
+        logger.info("Текст PDF извлечён", extra={"pdf_" + key: value for key, value in stats.items()})
     except Exception as e:
-        print(f"Ошибка извлечения текста (PDF): {e}")
+        logger.error(f"Ошибка извлечения текста (PDF): {e}")
         return None
 
+    if isinstance(source, (str, os.PathLike)):
+        # Сбой OCR не отменяет уже извлечённый текстовый слой
+        try:
+            pages = ocr_missing_pages(source, pages)
+        except Exception as e:
+            logger.error(f"Ошибка распознавания сканов (OCR): {e}")
+    return pages
+
+def extract_text_from_pdf(source):
+    """
+    Извлекает текст из PDF-файла одной строкой (см. extract_pages_from_pdf).
+    """
+    pages = extract_pages_from_pdf(source)
+    return "".join(pages) if pages is not None else None
+
 def extract_text_from_docx(file_stream):
     """
     Извлекает текст из .docx файла.
@@ -36,7 +90,7 @@ def extract_text_from_docx(file_stream):
         text = "\n".join([para.text for para in doc.paragraphs])
         return text
     except Exception as e:
-        print(f"Ошибка извлечения текста (DOCX): {e}")
+        logger.error(f"Ошибка извлечения текста (DOCX): {e}")
         return None
 
 def extract_text_from_txt(file_stream):
@@ -50,14 +104,30 @@ def extract_text_from_txt(file_stream):
 
 def convert_doc_to_docx(doc_path):
     """
-    Конвертирует .doc в .docx используя MS Word через COM интерфейс.
-    Возвращает путь к новому файлу .docx.
-    ВНИМАНИЕ: Требует установленного MS Word на сервере/машине.
+    Конвертирует .doc в .docx.
+    На сервере — через пул headless LibreOffice (api/doc_conversion.py),
+    без него (Windows-разработка) — через MS Word COM.
+    Возвращает путь к файлу .docx или None при ошибке.
     """
     if not os.path.exists(doc_path):
-        print(f"Файл не найден для конвертации: {doc_path}")
+        logger.error(f"Файл не найден для конвертации: {doc_path}")
         return None
 
+    if libreoffice_available():
+        try:
+            return convert_doc_with_libreoffice(doc_path)
+        except ConversionError as e:
+            logger.error(f"Ошибка конвертации DOC -> DOCX: {e}")
+            return None
+
+    return convert_doc_to_docx_with_word(doc_path)
+
+def convert_doc_to_docx_with_word(doc_path):
+    """
+    Конвертирует .doc в .docx используя MS Word через COM интерфейс.
+    Возвращает путь к новому файлу .docx.
+    ВНИМАНИЕ: Требует установленного MS Word на сервере/машине.
+    """
     try:
         import win32com.client
         import pythoncom
@@ -86,7 +156,7 @@ def convert_doc_to_docx(doc_path):
         
         return docx_path
     except Exception as e:
-        print(f"Ошибка конвертации DOC -> DOCX: {e}")
+        logger.error(f"Ошибка конвертации DOC -> DOCX: {e}")
         # Пытаемся закрыть Word если ошибка
         try:
             if 'word' in locals():
@@ -95,10 +165,13 @@ def convert_doc_to_docx(doc_path):
             pass
         return None
 
-def analyze_contract_with_ai(contract_text):
+def analyze_contract_with_ai(contract_text, on_partial=None, model=None):
     """
     Отправляет текст договора в DeepSeek для юридического анализа.
     Возвращает JSON с рисками, рекомендациями и УЛУЧШЕННЫМ текстом.
+    Если передан on_partial, ответ запрашивается потоком и callback получает
+    score, summary, risks и recommendations по мере их готовности.
+    model — модель вместо AI_MODEL (например, AI_CHEAP_MODEL для «чистых» документов).
     """
     api_key = os.getenv("DEEPSEEK_API_KEY")
     use_mock = os.getenv("USE_MOCK_AI", "False").lower() == "true"
@@ -106,9 +179,12 @@ def analyze_contract_with_ai(contract_text):
     # Проверка на заглушку
     # Если стоит USE_MOCK_AI=True, то всегда мок
     # Если ключа нет, то тоже мок
-    print(f"DEBUG: api_key exists: {bool(api_key)}, startswith sk-placeholder: {api_key.startswith('sk-placeholder') if api_key else 'N/A'}, use_mock: {use_mock}")
-    if use_mock or (not api_key or api_key.startswith("sk-placeholder")):
-        print("--- ИСПОЛЬЗУЮ MOCK AI (Режим симуляции или нет ключа) ---")
+    logger.debug(
+        "Выбор режима AI",
+        extra={"api_key_set": bool(api_key), "api_key_placeholder": bool(api_key) and api_key.startswith('sk-placeholder'), "use_mock": use_mock},
+    )
+    if is_mock_ai():
+        logger.info("Используется MOCK AI (режим симуляции или нет ключа)")
         
         # Генерируем "улучшенный" текст на основе исходного
         # В реальной жизни тут AI переписывает. В эмуляторе просто делаем замену.
@@ -141,9 +217,40 @@ def analyze_contract_with_ai(contract_text):
     if not contract_text or len(contract_text) < 50:
         return {"error": "Текст слишком короткий или пустой."}
 
-    prompt = (
+    # Длинный договор не обрезаем, а анализируем по частям (map-reduce)
+    if len(contract_text) > settings.AI_CHUNK_CHARS:
+        return analyze_contract_chunked(contract_text, functools.partial(request_ai_analysis, model=model))
+
+    return request_ai_analysis(contract_text, on_partial=on_partial, model=model)
+
+def build_analysis_prompt(contract_text, part=None, total=None, mode='full'):
+    if part and total and total > 1:
+        scope = f"Ниже фрагмент договора (часть {part} из {total}). Найди риски в этом фрагменте"
+        rewrite_target = "ФРАГМЕНТ"
+        text_label = "Фрагмент договора"
+    else:
+        scope = "Твоя главная задача: найти риски"
+        rewrite_target = "ВЕСЬ ДОГОВОР"
+        text_label = "Текст договора"
+
+    if mode == 'patch':
+        # Модель не копирует неизменённые пункты: выходных токенов в разы меньше
+        task = (
+            f"{scope} и предложить ПРАВКИ только тех пунктов, которые нужно изменить для устранения рисков. "
+            "Неизменённые пункты не повторяй."
+        )
+        output_field = (
+            "  'edits': [{'op': 'replace' | 'delete' | 'insert_after', "
+            "'anchor': 'ДОСЛОВНАЯ цитата исходного пункта, который меняется (для insert_after - пункта, после которого вставить)', "
+            "'text': 'новый текст пункта (для replace и insert_after)'}] "
+        )
+    else:
+        task = f"{scope} и ПЕРЕПИСАТЬ {rewrite_target} ЦЕЛИКОМ, устранив эти риски, но сохранив остальной текст и структуру."
+        output_field = "  'rewritten_text': 'ПОЛНЫЙ текст документа от начала до конца. Если ты меняешь пункт, меняй его в тексте. Если пункт нормальный - оставляй как есть. Текст должен быть готов к подписанию.' "
+
+    return (
         "Ты профессиональный юрист. Проанализируй договор. "
-        "Твоя главная задача: найти риски и ПЕРЕПИСАТЬ ВЕСЬ ДОГОВОР ЦЕЛИКОМ, устранив эти риски, но сохранив остальной текст и структуру."
+        f"{task}"
         "\\n\\n"
         "Формат JSON: "
         "{"
@@ -151,39 +258,141 @@ def analyze_contract_with_ai(contract_text):
         "  'summary': '...', "
         "  'risks': [{'title': '...', 'description': '...', 'severity': '...'}], "
         "  'recommendations': [{'title': '...', 'description': '...', 'clause_example': '...'}], "
-        "  'rewritten_text': 'ПОЛНЫЙ текст документа от начала до конца. Если ты меняешь пункт, меняй его в тексте. Если пункт нормальный - оставляй как есть. Текст должен быть готов к подписанию.' "
+        f"{output_field}"
         "}"
         "\\n\\n"
-        f"Текст договора:\\n{contract_text[:14000]}" 
+        f"{text_label}:\\n{contract_text}" 
     )
 
+def apply_patch_result(result, contract_text, part=None, total=None, model=None):
+    """
+    Собирает rewritten_text из правок модели. Если якорь замены или удаления
+    не найден в тексте или в ответе нет списка edits, запасной вариант — повторный
+    запрос в режиме полного переписывания (для части договора — только этой части).
+    """
+    edits = result.pop('edits', None)
+    missing = not isinstance(edits, list)
+    patch = apply_edits(contract_text, [] if missing else edits)
+    result['rewritten_text'] = patch['text']
+    result['patch_stats'] = {k: patch[k] for k in ('applied', 'fuzzy', 'appended')}
+    result['patch_stats']['unmatched'] = len(patch['unmatched'])
+
+    if missing or patch['unmatched']:
+        logger.warning(
+            "Патч: нет списка правок или якоря не найдены, запрашиваю полное переписывание",
+            extra={"missing_edits": missing, "unmatched": len(patch['unmatched']), "part": part, "total": total},
+        )
+        full = request_ai_analysis(contract_text, part, total, mode='full', model=model)
+        if full.get('rewritten_text'):
+            result['rewritten_text'] = full['rewritten_text']
+            result['patch_stats']['fallback'] = True
+    return result
+
+def request_ai_analysis(contract_text, part=None, total=None, on_partial=None, mode=None, model=None):
+    """
+    Один запрос к AI. Если передан номер части (part из total),
+    модель получает фрагмент договора и правит только его.
+    mode — 'patch' или 'full' (по умолчанию AI_REWRITE_MODE).
+    """
+    mode = mode or get_rewrite_mode()
+    prompt = build_analysis_prompt(contract_text, part, total, mode)
+
+    request_model = model or AI_MODEL
     try:
-        print("--- Отправка запроса к DeepSeek ---")
-        response = client.chat.completions.create(
-            model="deepseek/deepseek-chat",
+        logger.info("Отправка запроса к AI", extra={"model": request_model, "mode": mode, "part": part, "total": total})
+        request = dict(
+            model=request_model,
             messages=[
                 {"role": "system", "content": "Output valid JSON only."},
                 {"role": "user", "content": prompt}
             ],
             response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content
-        
-        if content.startswith("```"):
-            content = content.strip("`").replace("json\n", "").replace("json", "")
-        
-        result = json.loads(content)
+
+        if on_partial:
+            # Потоковый режим: первые поля ответа сохраняются, пока модель пишет rewritten_text
+            parser = PartialAnalysisParser()
+            for delta in get_llm_gateway().stream_chat_completion(**request):
+                ready = parser.feed(delta)
+                if ready:
+                    on_partial(ready)
+            result = parser.finish()
+        else:
+            content = get_llm_gateway().chat_completion(**request)
+
+            if content.startswith("```"):
+                content = content.strip("`").replace("json\n", "").replace("json", "")
+
+            result = json.loads(content)
         if 'score' in result: result['score'] = int(result['score'])
+
+        if mode == 'patch' and not result.get('rewritten_text'):
+            result = apply_patch_result(result, contract_text, part, total, model)
              
         return result
     except Exception as e:
-        print(f"!!! Ошибка сервиса AI: {e} !!!")
-        return {
-            "score": 0,
-            "summary": f"Ошибка AI: {str(e)}",
-            "risks": [],
-            "recommendations": []
-        }
+        logger.error(f"Ошибка сервиса AI: {e}", extra={"part": part, "total": total})
+        # Стадия анализа переводит документ в failed и возвращает проверку на баланс
+        return {"error": f"Ошибка AI: {str(e)}"}
+
+def render_docx_with_python_docx(text):
+    """
+    Собирает DOCX через объектную модель python-docx. Возвращает байты файла.
+    Медленнее шаблонного рендерера (api/docx_render.py), оставлен для сравнения
+    и для DOCX_RENDERER=python-docx.
+    """
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = docx.Document()
+
+    # Настройка стиля Normal
+    style = doc.styles['Normal']
+    font = style.font
+    font.name = 'Times New Roman'
+    font.size = Pt(12)
+    font.color.rgb = RGBColor(0, 0, 0)
+
+    # Разбор текста по параграфам
+    paragraphs = text.split('\n')
+
+    for para_text in paragraphs:
+        para_text = para_text.strip()
+        if not para_text:
+            continue
+
+        # Простейший парсинг Markdown
+        # Заголовки
+        if para_text.startswith('# '):
+            p = doc.add_heading(para_text[2:], level=1)
+            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            continue
+        elif para_text.startswith('## '):
+            p = doc.add_heading(para_text[3:], level=2)
+            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            continue
+        elif para_text.startswith('### '):
+            p = doc.add_heading(para_text[4:], level=3)
+            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            continue
+
+        p = doc.add_paragraph()
+        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+        # Жирный текст (**text**)
+        parts = para_text.split('**')
+        for i, part in enumerate(parts):
+            run = p.add_run(part)
+            run.font.name = 'Times New Roman'
+            run.font.size = Pt(12)
+            # Если индекс нечетный, значит это текст ВНУТРИ ** **, делаем жирным
+            if i % 2 == 1:
+                run.bold = True
+
+    from io import BytesIO
+    f = BytesIO()
+    doc.save(f)
+    return f.getvalue()
 
 def save_improved_document(text, original_filename):
     """
@@ -193,61 +402,13 @@ def save_improved_document(text, original_filename):
     
     # Всегда стараемся сохранить как DOCX для удобства
     try:
-        from docx.shared import Pt, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        
-        doc = docx.Document()
-        
-        # Настройка стиля Normal
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Times New Roman'
-        font.size = Pt(12)
-        font.color.rgb = RGBColor(0, 0, 0)
-        
-        # Разбор текста по параграфам
-        paragraphs = text.split('\n')
-        
-        for para_text in paragraphs:
-            para_text = para_text.strip()
-            if not para_text:
-                continue
-                
-            # Простейший парсинг Markdown
-            # Заголовки
-            if para_text.startswith('# '):
-                p = doc.add_heading(para_text[2:], level=1)
-                p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                continue
-            elif para_text.startswith('## '):
-                p = doc.add_heading(para_text[3:], level=2)
-                p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                continue
-            elif para_text.startswith('### '):
-                p = doc.add_heading(para_text[4:], level=3)
-                p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                continue
-                
-            p = doc.add_paragraph()
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            
-            # Жирный текст (**text**)
-            parts = para_text.split('**')
-            for i, part in enumerate(parts):
-                run = p.add_run(part)
-                run.font.name = 'Times New Roman'
-                run.font.size = Pt(12)
-                # Если индекс нечетный, значит это текст ВНУТРИ ** **, делаем жирным
-                if i % 2 == 1:
-                    run.bold = True
-
-        # Сохраняем во временный буфер или сразу в storage
+        if settings.DOCX_RENDERER == 'python-docx':
+            content = render_docx_with_python_docx(text)
+        else:
+            # Шаблон загружается один раз на процесс, одинаковый текст — одинаковые байты
+            content = render_docx(text)
         # Django FileField принимает ContentFile
-        from io import BytesIO
-        f = BytesIO()
-        doc.save(f)
-        f.seek(0)
-        return ContentFile(f.read(), name=f"{filename_base}_improved.docx")
+        return ContentFile(content, name=f"{filename_base}_improved.docx")
     except Exception as e:
-        print(f"Ошибка создания DOCX: {e}. Сохраняем как TXT.")
+        logger.error(f"Ошибка создания DOCX: {e}. Сохраняем как TXT.")
         return ContentFile(text.encode('utf-8'), name=f"{filename_base}_improved.txt")
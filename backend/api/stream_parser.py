@@ -0,0 +1,89 @@
+import json
+
+# Поля, которые имеет смысл показать пользователю до окончания генерации.
+# rewritten_text (самое длинное поле) ждёт конца потока.
+EARLY_FIELDS = ('score', 'summary', 'risks', 'recommendations')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class PartialAnalysisParser:
+    """
+    Инкрементальный разбор JSON-ответа модели по мере поступления токенов.
+
+    feed() принимает очередной фрагмент и возвращает словарь полей верхнего
+    уровня, которые стали полностью известны после этого фрагмента.
+    Разбор идёт слева направо и продолжается с места остановки, поэтому
+    каждое значение декодируется один раз. Как только встречается поле не из
+    EARLY_FIELDS, инкрементальный разбор прекращается — остаток ответа
+    разбирается целиком в finish().
+    """
+
+    def __init__(self, early_fields=EARLY_FIELDS):
+        self.early_fields = set(early_fields)
+        self.buffer = ""
+        self.fields = {}
+        self._pos = None  # позиция после '{' или после последнего разобранного значения
+        self._stopped = False
+
+    def _skip_ws(self, pos):
+        while pos < len(self.buffer) and self.buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def feed(self, delta):
+        self.buffer += delta
+        if self._stopped:
+            return {}
+
+        if self._pos is None:
+            start = self.buffer.find('{')
+            if start == -1:
+                return {}
+            self._pos = start + 1
+
+        found = {}
+        while True:
+            pos = self._skip_ws(self._pos)
+            if pos < len(self.buffer) and self.buffer[pos] == ',':
+                pos = self._skip_ws(pos + 1)
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == '}':
+                self._stopped = True
+                break
+
+            try:
+                key, pos = _decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break  # Имя поля ещё не пришло целиком
+            pos = self._skip_ws(pos)
+            if pos >= len(self.buffer) or self.buffer[pos] != ':':
+                break
+            if key not in self.early_fields:
+                self._stopped = True
+                break
+
+            value_start = self._skip_ws(pos + 1)
+            try:
+                value, end = _decoder.raw_decode(self.buffer, value_start)
+            except json.JSONDecodeError:
+                break  # Значение ещё генерируется
+            # Число в конце буфера может быть не дописано: "8" из "85"
+            if end >= len(self.buffer) and isinstance(value, (int, float)):
+                break
+
+            self.fields[key] = value
+            found[key] = value
+            self._pos = end
+        return found
+
+    def finish(self):
+        """
+        Разбирает полный ответ. Формат очистки совпадает с нестриминговым режимом.
+        """
+        content = self.buffer
+        if content.startswith("```"):
+            content = content.strip("`").replace("json\n", "").replace("json", "")
+        return json.loads(content)
@@ -1,120 +1,436 @@
 import os
+import time
 import logging
+import functools
 from io import BytesIO
-from celery import shared_task
+from celery import Task, shared_task, chain
 from django.conf import settings
+from django.db import OperationalError
 from .models import Document
 from .services import (
-    extract_text_from_pdf, 
-    extract_text_from_docx, 
-    extract_text_from_txt, 
-    analyze_contract_with_ai, 
-    save_improved_document, 
-    convert_doc_to_docx
+    extract_pages_from_pdf,
+    extract_text_from_docx,
+    extract_text_from_txt,
+    analyze_contract_with_ai,
+    save_improved_document,
+    convert_doc_to_docx,
+    get_ai_model_name,
+    get_prompt_version,
 )
+from .analysis_cache import get_cached_analysis, store_analysis
+from .notifications import publish_document_status
+from .quota import commit_check, release_check
+from .risk_rules import is_clean_prescreen, prescreen_contract
+from .metrics import count_stage_outcome, observe_stage
+from .log_context import document_context
+from .scheduler import finish_analysis, recover_stale_analyses, stage_heartbeat
+from .search import update_search_index
+from .text_store import (
+    load_document_text,
+    load_rewritten_text,
+    reuse_document_text,
+    save_document_text,
+    save_rewritten_text,
+)
+from .uploads import cleanup_expired_uploads
 
 logger = logging.getLogger(__name__)
 
+# Конвейер анализа: extract (CPU) -> analyze (сеть, LLM) -> render (CPU).
+# Каждая стадия — отдельная задача в своей очереди (CELERY_TASK_ROUTES),
+# поэтому разбор PDF и ожидание ответа LLM не занимают один и тот же слот воркера.
+# Стадии идемпотентны: повтор любой из них не меняет результат и не списывает
+# проверку повторно. Сбой БД (OperationalError) повторяется автоматически;
+# когда повторы исчерпаны, документ переводится в failed (PipelineStage.on_failure).
+# Длительность, ожидание в очереди и исход каждой стадии попадают в метрики
+# (api/metrics.py), записи логов стадии несут document_id (api/log_context.py).
+
+def stage_document_id(arg):
+    # Аргумент стадии — id документа (первая стадия) или payload предыдущей
+    return arg.get("document_id") if isinstance(arg, dict) else arg
+
+class PipelineStage(Task):
+    """
+    Базовый класс стадий: необработанная ошибка (в том числе OperationalError
+    после всех повторов) переводит документ в failed и возвращает проверку,
+    иначе документ остался бы в конвейере с занятым слотом и резервом.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        document_id = stage_document_id(args[0]) if args else None
+        if document_id is None:
+            return
+        logger.error(
+            f"Стадия {self.name} завершилась ошибкой: {exc}",
+            extra={"document_id": document_id, "task_id": task_id},
+        )
+        try:
+            if Document.objects.filter(pk=document_id, status__in=['pending', 'analyzing']).exists():
+                mark_document_failed(document_id, "Ошибка обработки документа. Проверка возвращена на баланс.")
+        except Exception as e:
+            # БД всё ещё недоступна: документ вернёт в очередь recover_stale_analyses_task
+            logger.error(f"Не удалось отметить документ как failed: {e}", extra={"document_id": document_id})
+
+STAGE_RETRY_OPTIONS = dict(
+    base=PipelineStage,
+    bind=True,
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    retry_backoff_max=60,
+    max_retries=3,
+)
+
+def in_document_context(stage):
+    """
+    Выполняет стадию внутри document_context: document_id берётся
+    из аргумента стадии (id документа или payload предыдущей стадии).
+    Пока стадия работает, документ отмечается (stage_heartbeat, api/scheduler.py),
+    и восстановление зависших анализов не запускает его второй раз.
+    """
+    @functools.wraps(stage)
+    def wrapper(self, arg):
+        document_id = stage_document_id(arg)
+        with document_context(document_id), stage_heartbeat(document_id):
+            return stage(self, arg)
+    return wrapper
+
+def save_partial_analysis(document_id, user_id, fields):
+    """
+    Сохраняет готовые поля потокового ответа AI (score, summary, risks,
+    recommendations), пока модель ещё генерирует rewritten_text.
+    DocumentDetailView отдаёт их со статусом 'analyzing'.
+    """
+    updates = {k: fields[k] for k in ('summary', 'risks', 'recommendations') if k in fields}
+    if 'score' in fields:
+        try:
+            updates['score'] = int(fields['score'])
+        except (TypeError, ValueError):
+            pass
+    if updates:
+        Document.objects.filter(pk=document_id).update(status='analyzing', **updates)
+        # update() не вызывает post_save — уведомляем канал статусов вручную
+        publish_document_status(user_id, document_id, 'analyzing', updates.get('score'))
+        logger.info("Частичный результат AI", extra={"document_id": document_id, "fields": sorted(updates)})
+
+def save_prescreen(document_id, user_id, prescreen):
+    """
+    Сохраняет предварительную оценку и риски по правилам (api/risk_rules.py)
+    сразу после извлечения текста. Ответ AI потом перезаписывает их.
+    """
+    found = len(prescreen['risks'])
+    summary = (
+        f"Предварительная проверка: найдено типовых рисков — {found}. Идёт анализ AI."
+        if found else "Предварительная проверка: типовых рисков не найдено. Идёт анализ AI."
+    )
+    Document.objects.filter(pk=document_id, status='pending').update(
+        score=prescreen['score'], summary=summary, risks=prescreen['risks'],
+    )
+    publish_document_status(user_id, document_id, 'pending', prescreen['score'])
+
+def record_stage_timing(document_id, stage, seconds, queued_at=None):
+    """
+    Записывает длительность стадии (и время ожидания в очереди) в Document.stage_timings.
+    """
+    timings = Document.objects.filter(pk=document_id).values_list('stage_timings', flat=True).first() or {}
+    timings[stage] = round(seconds, 3)
+    queue_wait = None
+    if queued_at:
+        queue_wait = max(0.0, time.time() - seconds - queued_at)
+        timings[f"{stage}_queue_wait"] = round(queue_wait, 3)
+    Document.objects.filter(pk=document_id).update(stage_timings=timings)
+    observe_stage(stage, seconds, queue_wait)
+    logger.info(
+        f"Стадия {stage} завершена за {seconds:.3f} с",
+        extra={"document_id": document_id, "stage": stage, "seconds": round(seconds, 3),
+               "queue_wait": round(queue_wait, 3) if queue_wait is not None else None},
+    )
+
+def mark_document_failed(document_id, summary):
+    document = Document.objects.get(id=document_id)
+    document.status = 'failed'
+    document.summary = summary
+    document.save()
+    # Зарезервированная при загрузке проверка возвращается на баланс
+    if release_check(document_id):
+        logger.info("Проверка возвращена на баланс", extra={"document_id": document_id})
+    finish_analysis(document_id)
+
+def extract_document_pages(document):
+    """
+    Извлекает текст из файла документа по расширению: список страниц
+    (у DOCX и TXT — одна страница). Бросает исключение, если текст пуст.
+    """
+    file_path = document.file.path
+    file_ext = os.path.splitext(file_path)[1].lower()
+
+    text = None
+    if file_ext == '.doc':
+        logger.info("Конвертация .doc", extra={"document_id": document.id})
+        docx_path = convert_doc_to_docx(file_path)
+        if docx_path and os.path.exists(docx_path):
+            with open(docx_path, "rb") as f_docx:
+                stream_docx = BytesIO(f_docx.read())
+                text = extract_text_from_docx(stream_docx)
+        else:
+            raise Exception("Ошибка конвертации .doc")
+    elif file_ext == '.pdf':
+        # PDF открывается по пути, без чтения файла целиком в память
+        pages = extract_pages_from_pdf(file_path)
+        if not pages or not "".join(pages):
+            raise Exception("Текст не извлечен")
+        return pages
+    else:
+        with open(file_path, 'rb') as f:
+            file_content = f.read()
+            stream = BytesIO(file_content)
+
+            if file_ext == '.docx':
+                text = extract_text_from_docx(stream)
+            elif file_ext == '.txt':
+                text = extract_text_from_txt(stream)
+
+    if not text:
+        raise Exception("Текст не извлечен")
+    return [text]
+
+def load_or_extract_text(document):
+    """
+    Текст документа: сохранённый (повтор стадии, повторный анализ), сохранённый
+    у документа с тем же файлом или извлечённый из файла и сохранённый (api/text_store.py).
+    """
+    text = load_document_text(document.id) or reuse_document_text(document)
+    if text is not None:
+        logger.info("Текст взят из сохранённого, файл не разбирается", extra={"document_id": document.id})
+        return text
+    return save_document_text(document.id, extract_document_pages(document))
+
+@shared_task
+def recover_stale_analyses_task():
+    """
+    Периодическая задача (CELERY_BEAT_SCHEDULE): возвращает в очередь или
+    переводит в failed документы, зависшие в конвейере дольше ANALYSIS_SLOT_TIMEOUT.
+    """
+    requeued, failed = recover_stale_analyses()
+    if requeued or failed:
+        logger.info("Зависшие анализы обработаны", extra={"requeued": requeued, "failed": failed})
+    return {"requeued": requeued, "failed": failed}
+
+@shared_task
+def cleanup_expired_uploads_task():
+    """
+    Периодическая задача (CELERY_BEAT_SCHEDULE): удаляет незавершённые загрузки
+    по частям всех пользователей старше UPLOAD_SESSION_TTL — в том числе тех,
+    кто больше не начинает новых загрузок.
+    """
+    deleted = cleanup_expired_uploads()
+    if deleted:
+        logger.info("Брошенные загрузки удалены", extra={"sessions": deleted})
+    return {"deleted": deleted}
+
 @shared_task
 def analyze_document_task(document_id):
+    """
+    Точка входа: запускает конвейер стадий для документа.
+    """
+    logger.info("Запуск конвейера анализа", extra={"document_id": document_id})
+    chain(
+        extract_text_stage.s(document_id),
+        analyze_text_stage.s(),
+        render_document_stage.s(),
+    ).apply_async()
+    return "Pipeline started"
+
+@shared_task(**STAGE_RETRY_OPTIONS)
+@in_document_context
+def extract_text_stage(self, document_id):
+    """
+    Стадия 1 (CPU): извлечение текста из файла и предварительная проверка
+    по правилам (оценка и риски видны пользователю до ответа AI).
+    Возвращает payload для следующей стадии или None, если конвейер остановлен.
+    """
     try:
         document = Document.objects.get(id=document_id)
-        print(f"--- [CELERY] Начало задачи для документа {document_id} ---")
-        
-        file_path = document.file.path
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        text = None
-        
-        # 1. Извлечение текста
-        try:
-            if file_ext == '.doc':
-                print(f"--- [CELERY] Конвертация .doc для ID {document_id} ---")
-                docx_path = convert_doc_to_docx(file_path)
-                if docx_path and os.path.exists(docx_path):
-                    with open(docx_path, "rb") as f_docx:
-                        stream_docx = BytesIO(f_docx.read())
-                        text = extract_text_from_docx(stream_docx)
-                else:
-                    raise Exception("Ошибка конвертации .doc")
-            else:
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-                    stream = BytesIO(file_content)
-                    
-                    if file_ext == '.pdf':
-                        text = extract_text_from_pdf(stream)
-                    elif file_ext == '.docx':
-                        text = extract_text_from_docx(stream)
-                    elif file_ext == '.txt':
-                        text = extract_text_from_txt(stream)
-            
-            if not text:
-                raise Exception("Текст не извлечен")
-                
-            print(f"--- [CELERY] Текст извлечен для ID {document_id}: {len(text)} символов ---")
+    except Document.DoesNotExist:
+        logger.error("Документ не найден", extra={"document_id": document_id})
+        count_stage_outcome('extract', 'skipped')
+        return None
 
-        except Exception as e:
-            logger.error(f"[CELERY] Ошибка извлечения текста ID {document_id}: {e}")
-            document.status = 'failed'
-            document.summary = f"Ошибка извлечения текста: {str(e)}"
-            document.save()
-            return f"Failed: {str(e)}"
+    if document.status == 'processed':
+        logger.info("Документ уже обработан, конвейер не запускается", extra={"document_id": document_id})
+        count_stage_outcome('extract', 'skipped')
+        return None
+
+    started = time.monotonic()
+    try:
+        text = load_or_extract_text(document)
+        logger.info("Текст извлечён", extra={"document_id": document_id, "chars": len(text)})
+    except OperationalError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка извлечения текста: {e}", extra={"document_id": document_id, "stage": "extract"})
+        count_stage_outcome('extract', 'failed')
+        mark_document_failed(document_id, f"Ошибка извлечения текста: {str(e)}")
+        return None
+
+    update_search_index(document_id)
+    record_stage_timing(document_id, 'extract', time.monotonic() - started)
+    count_stage_outcome('extract', 'success')
+
+    started = time.monotonic()
+    prescreen = prescreen_contract(text)
+    save_prescreen(document_id, document.user_id, prescreen)
+    record_stage_timing(document_id, 'prescreen', time.monotonic() - started)
+    logger.info(
+        "Предварительная проверка по правилам",
+        extra={"document_id": document_id, "score": prescreen['score'], "risks": len(prescreen['risks'])},
+    )
+
+    # Текст не передаётся через брокер: следующая стадия читает сохранённый (api/text_store.py)
+    return {
+        "document_id": document_id,
+        "clean": is_clean_prescreen(prescreen),
+        "queued_at": time.time(),
+    }
+
+@shared_task(**STAGE_RETRY_OPTIONS)
+@in_document_context
+def analyze_text_stage(self, payload):
+    """
+    Стадия 2 (сеть): AI-анализ с кэшем результатов.
+    Сохраняет оценку, резюме, риски и рекомендации; переписанный текст
+    сохраняется в БД для стадии рендеринга (api/text_store.py).
+    """
+    if not payload:
+        return None
+    document_id = payload["document_id"]
+
+    document = Document.objects.filter(id=document_id).only('id', 'user_id', 'status').first()
+    if document is None or document.status == 'processed':
+        count_stage_outcome('analyze', 'skipped')
+        return None
+    # payload["text"] — задачи, поставленные до сохранения текста в БД
+    text = payload.get("text") or load_document_text(document_id)
+    if not text:
+        logger.error("Сохранённый текст не найден", extra={"document_id": document_id, "stage": "analyze"})
+        count_stage_outcome('analyze', 'failed')
+        mark_document_failed(document_id, "Ошибка AI анализа: текст документа не найден")
+        return None
+
+    # «Чистый» по правилам документ анализирует более дешёвая модель, если она задана
+    model = settings.AI_CHEAP_MODEL if payload.get("clean") and settings.AI_CHEAP_MODEL else None
+
+    started = time.monotonic()
+    try:
+        model_name = get_ai_model_name(model)
+        prompt_version = get_prompt_version()
+        analysis_result, cache_entry = get_cached_analysis(text, model_name, prompt_version)
+
+        if analysis_result is not None:
+            outcome = 'cache_hit'
+            logger.info(
+                "Кэш анализа: попадание, вызов AI пропущен",
+                extra={"document_id": document_id, "saved_seconds": round(cache_entry.latency, 1)},
+            )
+        else:
+            outcome = 'success'
+            logger.info("Запуск AI", extra={"document_id": document_id, "model": model_name})
+            analysis_result = analyze_contract_with_ai(
+                text,
+                on_partial=lambda fields: save_partial_analysis(document_id, document.user_id, fields),
+                model=model,
+            )
+            latency = time.monotonic() - started
 
-        # 2. AI Анализ
-        try:
-            print(f"--- [CELERY] Запуск AI для ID {document_id} ---")
-            analysis_result = analyze_contract_with_ai(text)
-            
             if "error" in analysis_result:
                 raise Exception(analysis_result.get('error'))
-            
-            print(f"--- [CELERY] AI анализ завершен для ID {document_id} ---")
 
-        except Exception as e:
-            logger.error(f"[CELERY] Ошибка AI ID {document_id}: {e}")
-            document.status = 'failed'
-            document.summary = f"Ошибка AI анализа: {str(e)}"
-            document.save()
-            return f"Failed AI: {str(e)}"
+            # Кэшируем только полноценный результат: без rewritten_text или обрезанный
+            # лимитом времени/токенов (partial) повторная загрузка должна анализироваться заново
+            if analysis_result.get('rewritten_text') and not analysis_result.get('partial'):
+                store_analysis(text, model_name, prompt_version, analysis_result, latency)
 
-        # 3. Сохранение результатов
-        try:
-            document.score = analysis_result.get('score')
-            document.summary = analysis_result.get('summary')
-            document.risks = analysis_result.get('risks')
-            document.recommendations = analysis_result.get('recommendations')
-            
-            # Сохранение улучшенного файла
-            rewritten_text = analysis_result.get('rewritten_text')
-            if rewritten_text:
-                improved_content_file = save_improved_document(rewritten_text, document.file.name)
-                document.improved_file.save(improved_content_file.name, improved_content_file, save=False)
-            
-            document.status = 'processed'
-            document.save()
-
-            # 4. Обновление баланса пользователя (decrement only on success)
-            if document.user:
-                profile = document.user.profile
-                profile.checks_remaining -= 1
-                profile.total_checks_count += 1
-                profile.save()
-                print(f"--- [CELERY] Баланс пользователя {document.user.username} обновлен ---")
-
-            print(f"--- [CELERY] Задача для ID {document_id} успешно завершена ---")
+            logger.info(
+                "AI анализ завершён",
+                extra={"document_id": document_id, "model": model_name, "seconds": round(latency, 1)},
+            )
+
+    except OperationalError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка AI: {e}", extra={"document_id": document_id, "stage": "analyze"})
+        count_stage_outcome('analyze', 'failed')
+        mark_document_failed(document_id, f"Ошибка AI анализа: {str(e)}")
+        return None
+
+    score = analysis_result.get('score')
+    Document.objects.filter(pk=document_id).update(
+        status='analyzing',
+        score=score,
+        summary=analysis_result.get('summary'),
+        risks=analysis_result.get('risks'),
+        recommendations=analysis_result.get('recommendations'),
+    )
+    # Резюме и заголовки рисков попадают в полнотекстовый индекс
+    update_search_index(document_id)
+    # Как и в рендеринге: время стадии — до уведомления о статусе
+    record_stage_timing(document_id, 'analyze', time.monotonic() - started, payload.get("queued_at"))
+    publish_document_status(document.user_id, document_id, 'analyzing', score)
+
+    count_stage_outcome('analyze', outcome)
+    next_payload = {"document_id": document_id, "queued_at": time.time()}
+    # Улучшенный текст не передаётся через брокер: рендеринг читает сохранённый
+    rewritten_text = analysis_result.get('rewritten_text')
+    if rewritten_text and not save_rewritten_text(document_id, rewritten_text):
+        # Задача, поставленная до сохранения текста в БД (текст пришёл в payload)
+        next_payload["rewritten_text"] = rewritten_text
+    return next_payload
+
+@shared_task(**STAGE_RETRY_OPTIONS)
+@in_document_context
+def render_document_stage(self, payload):
+    """
+    Стадия 3 (CPU): сборка улучшенного DOCX, перевод документа в 'processed'
+    и подтверждение резерва проверки. Подтверждение идемпотентно
+    (api/quota.py), поэтому повтор стадии не списывает проверку второй раз.
+    """
+    if not payload:
+        return None
+    document_id = payload["document_id"]
+
+    started = time.monotonic()
+    try:
+        document = Document.objects.get(id=document_id)
+        if document.status == 'processed':
+            count_stage_outcome('render', 'skipped')
             return "Success"
-            
-        except Exception as e:
-            logger.error(f"[CELERY] Ошибка сохранения ID {document_id}: {e}")
-            document.status = 'failed'
-            document.summary = "Ошибка сохранения результатов анализа."
-            document.save()
-            return f"Failed saving: {str(e)}"
 
-    except Document.DoesNotExist:
-        logger.error(f"[CELERY] Документ {document_id} не найден")
-        return "Not Found"
+        # Сохранение улучшенного файла
+        # payload["rewritten_text"] — задачи, поставленные до сохранения улучшенного текста в БД
+        rewritten_text = payload.get("rewritten_text") or load_rewritten_text(document_id)
+        if rewritten_text:
+            improved_content_file = save_improved_document(rewritten_text, document.file.name)
+            document.improved_file.save(improved_content_file.name, improved_content_file, save=False)
+            Document.objects.filter(pk=document_id).update(improved_file=document.improved_file.name)
+
+        # Время стадии записывается до уведомления: по версии уведомлений сбрасываются
+        # кэш списка документов и long-poll, и 'processed' не должен прийти без него
+        record_stage_timing(document_id, 'render', time.monotonic() - started, payload.get("queued_at"))
+        Document.objects.filter(pk=document_id).exclude(status='processed').update(status='processed')
+        publish_document_status(document.user_id, document_id, 'processed', document.score)
+
+        # Проверка списана резервом при загрузке — здесь резерв подтверждается
+        if commit_check(document_id):
+            logger.info("Проверка подтверждена", extra={"document_id": document_id, "user_id": document.user_id})
+
+    except OperationalError:
+        raise
     except Exception as e:
-        logger.error(f"[CELERY] Непредвиденная ошибка задачи {document_id}: {e}")
-        return f"Unexpected Error: {str(e)}"
+        logger.error(f"Ошибка сохранения результатов: {e}", extra={"document_id": document_id, "stage": "render"})
+        count_stage_outcome('render', 'failed')
+        mark_document_failed(document_id, "Ошибка сохранения результатов анализа.")
+        return f"Failed saving: {str(e)}"
+
+    count_stage_outcome('render', 'success')
+    logger.info("Анализ документа завершён", extra={"document_id": document_id})
+    finish_analysis(document_id)
+    return "Success"
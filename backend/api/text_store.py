@@ -0,0 +1,110 @@
+import bisect
+import zlib
+
+from .chunked_analysis import CLAUSE_BOUNDARY_RE
+from .models import DocumentText
+
+# Извлечённый текст документа сохраняется один раз (DocumentText), сжатым zlib:
+# договоры сжимаются в 3-5 раз. Повтор стадии, повторный анализ и загрузка того же
+# файла (совпадает file_hash) не читают и не разбирают исходный файл заново.
+# Смещения страниц и пунктов (границы как в api/chunked_analysis.py) позволяют
+# указать в результатах поиска страницу и пункт договора.
+# Улучшенный текст от AI хранится там же (rewritten_content): стадия рендеринга
+# читает его из БД, через брокер передаётся только id документа.
+
+COMPRESSION_LEVEL = 6
+CLAUSE_LABEL_CHARS = 60  # Длина заголовка пункта в clause_offsets
+
+
+def compress_text(text):
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_text(content):
+    return zlib.decompress(bytes(content)).decode('utf-8')
+
+
+def clause_offsets(text):
+    """
+    Начала пунктов и разделов договора: [[смещение, первая строка пункта], ...].
+    """
+    offsets = []
+    for match in CLAUSE_BOUNDARY_RE.finditer(text):
+        line_end = text.find('\n', match.start())
+        label = text[match.start():line_end if line_end != -1 else len(text)].strip()
+        offsets.append([match.start(), label[:CLAUSE_LABEL_CHARS]])
+    return offsets
+
+
+def save_document_text(document_id, pages):
+    """
+    Сохраняет текст документа по страницам. Возвращает текст целиком.
+    """
+    text = "".join(pages)
+    page_offsets, position = [], 0
+    for page in pages:
+        page_offsets.append(position)
+        position += len(page)
+    DocumentText.objects.update_or_create(
+        document_id=document_id,
+        defaults={
+            'content': compress_text(text),
+            'chars': len(text),
+            'page_offsets': page_offsets,
+            'clause_offsets': clause_offsets(text),
+        },
+    )
+    return text
+
+
+def load_document_text(document_id):
+    content = DocumentText.objects.filter(document_id=document_id).values_list('content', flat=True).first()
+    return decompress_text(content) if content is not None else None
+
+
+def save_rewritten_text(document_id, text):
+    """
+    Сохраняет улучшенный текст к сохранённому тексту документа.
+    Возвращает False, если текста документа в БД нет.
+    """
+    return bool(DocumentText.objects.filter(document_id=document_id).update(rewritten_content=compress_text(text)))
+
+
+def load_rewritten_text(document_id):
+    content = DocumentText.objects.filter(document_id=document_id).values_list('rewritten_content', flat=True).first()
+    return decompress_text(content) if content is not None else None
+
+
+def reuse_document_text(document):
+    """
+    Копирует сохранённый текст документа с тем же файлом (file_hash): сжатые данные
+    и смещения переносятся без распаковки. Возвращает текст или None.
+    """
+    if not document.file_hash:
+        return None
+    source = DocumentText.objects.filter(
+        document__file_hash=document.file_hash,
+    ).exclude(document_id=document.id).order_by('-created_at').first()
+    if source is None:
+        return None
+    DocumentText.objects.update_or_create(
+        document_id=document.id,
+        defaults={
+            'content': source.content,
+            'chars': source.chars,
+            'page_offsets': source.page_offsets,
+            'clause_offsets': source.clause_offsets,
+        },
+    )
+    return decompress_text(source.content)
+
+
+def locate(stored, offset):
+    """
+    Страница (с 1) и заголовок пункта, в которых находится символ offset текста.
+    """
+    page = bisect.bisect_right(stored.page_offsets, offset) if stored.page_offsets else None
+    starts = [start for start, _ in stored.clause_offsets]
+    index = bisect.bisect_right(starts, offset) - 1
+    clause = stored.clause_offsets[index][1] if index >= 0 else None
+    return page, clause
@@ -0,0 +1,229 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .models import Document, UploadChunk, UploadSession
+
+VALID_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt']
+
+# Сигнатуры начала файла: тип проверяется по первой части, а не только по расширению
+FILE_SIGNATURES = {
+    '.pdf': (b'%PDF',),
+    '.docx': (b'PK\x03\x04',),
+    '.doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+}
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadOffsetError(UploadError):
+    """
+    Смещение части не совпадает с уже принятым объёмом (повтор или пропуск части).
+    """
+
+    def __init__(self, expected):
+        super().__init__(f"Ожидается часть со смещением {expected}")
+        self.expected = expected
+
+
+class HashingFile(File):
+    """
+    Обёртка над загруженным файлом: считает SHA-256 в том же проходе,
+    в котором хранилище читает файл по чанкам. Файл читается один раз.
+
+    Атрибут temporary_file_path не проксируется, поэтому FileSystemStorage
+    не перемещает временный файл целиком, а пишет его через chunks().
+    """
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name or getattr(file, 'name', None))
+        self.sha256 = hashlib.sha256()
+        self.size_read = 0
+
+    def chunks(self, chunk_size=None):
+        for chunk in self.file.chunks(chunk_size) if hasattr(self.file, 'chunks') else super().chunks(chunk_size):
+            self.sha256.update(chunk)
+            self.size_read += len(chunk)
+            yield chunk
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def store_upload(file_obj):
+    """
+    Сохраняет загруженный файл в хранилище (в каталог upload_to поля Document.file)
+    и возвращает (имя в хранилище, SHA-256 содержимого).
+    """
+    hashing_file = HashingFile(file_obj)
+    name = Document._meta.get_field('file').generate_filename(None, file_obj.name)
+    stored_name = default_storage.save(name, hashing_file)
+    return stored_name, hashing_file.hexdigest
+
+
+# --- Загрузка по частям ---
+# init (имя и размер) -> части с указанием смещения -> finalize.
+# Каждая часть сразу сохраняется в хранилище отдельным объектом, поэтому веб-воркер
+# держит в памяти не больше одной части, а после обрыва связи клиент продолжает
+# с UploadSession.received. При finalize части склеиваются потоком в итоговый файл,
+# SHA-256 считается в том же проходе (HashingFile).
+
+
+class RawChunkParser(BaseParser):
+    """
+    Тело запроса — байты части файла (Content-Type: application/octet-stream).
+    Читается не больше UPLOAD_CHUNK_MAX_SIZE + 1 байт: слишком большая часть
+    отклоняется, не попадая в память целиком.
+    """
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return b''
+        data = stream.read(settings.UPLOAD_CHUNK_MAX_SIZE + 1)
+        if len(data) > settings.UPLOAD_CHUNK_MAX_SIZE:
+            raise ParseError(f"Часть больше {settings.UPLOAD_CHUNK_MAX_SIZE} байт")
+        return data
+
+
+class StoredChunks:
+    """
+    Последовательное чтение сохранённых частей как одного файла (для HashingFile).
+    """
+
+    def __init__(self, chunks, name, size):
+        self._chunks = chunks
+        self.name = name
+        self.size = size
+
+    def chunks(self, chunk_size=None):
+        for chunk in self._chunks:
+            with default_storage.open(chunk.name, 'rb') as f:
+                yield from File(f).chunks(chunk_size)
+
+
+def validate_upload_name(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in VALID_EXTENSIONS:
+        raise UploadError(f"Unsupported file type. Supported: {', '.join(VALID_EXTENSIONS)}")
+    return ext
+
+
+def check_file_signature(filename, head):
+    """
+    Сверяет начало файла с расширением. Для .txt — отсутствие нулевых байтов.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.txt':
+        valid = b'\x00' not in head
+    else:
+        valid = head.startswith(FILE_SIGNATURES[ext])
+    if not valid:
+        raise UploadError(f"Содержимое файла не соответствует расширению {ext}")
+
+
+def cleanup_expired_uploads(user=None):
+    """
+    Удаляет незавершённые сессии старше UPLOAD_SESSION_TTL вместе с частями в хранилище.
+    Возвращает число удалённых сессий.
+    """
+    sessions = UploadSession.objects.exclude(status='completed').filter(
+        updated_at__lt=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    )
+    if user is not None:
+        sessions = sessions.filter(user=user)
+    # Каскад удаляет UploadChunk, post_delete — их файлы в хранилище
+    _, deleted = sessions.delete()
+    return deleted.get(UploadSession._meta.label, 0)
+
+
+def start_upload_session(user, filename, size):
+    validate_upload_name(filename)
+    if size <= 0 or size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"Размер файла должен быть от 1 байта до {settings.UPLOAD_MAX_SIZE} байт")
+    cleanup_expired_uploads(user)
+    return UploadSession.objects.create(user=user, filename=os.path.basename(filename)[:255], size=size)
+
+
+def append_chunk(session, offset, data):
+    """
+    Принимает часть файла со смещением offset. Часть пишется в хранилище,
+    затем смещение сессии сдвигается условным UPDATE — параллельный повтор
+    той же части не будет принят дважды. Возвращает новое смещение.
+    """
+    if session.status != 'open':
+        raise UploadError("Загрузка уже завершена")
+    if offset != session.received:
+        raise UploadOffsetError(session.received)
+    if not data:
+        raise UploadError("Пустая часть файла")
+    if len(data) > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(f"Часть больше {settings.UPLOAD_CHUNK_MAX_SIZE} байт")
+    if offset + len(data) > session.size:
+        raise UploadError("Части превышают объявленный размер файла")
+    if offset == 0:
+        check_file_signature(session.filename, data[:512])
+
+    name = default_storage.save(f"uploads/chunks/{session.id}_{offset:012d}", ContentFile(data))
+    with transaction.atomic():
+        accepted = UploadSession.objects.filter(pk=session.pk, status='open', received=offset).update(
+            received=offset + len(data), updated_at=timezone.now()
+        )
+        if accepted:
+            UploadChunk.objects.create(session=session, offset=offset, size=len(data), name=name)
+    if not accepted:
+        default_storage.delete(name)
+        session.refresh_from_db(fields=['received'])
+        raise UploadOffsetError(session.received)
+
+    session.received = offset + len(data)
+    return session.received
+
+
+def claim_upload_session(session):
+    """
+    Переводит полностью принятую сессию в 'finalizing'. Только один из
+    параллельных finalize получает True.
+    """
+    if session.received != session.size:
+        raise UploadError(f"Принято {session.received} из {session.size} байт")
+    return UploadSession.objects.filter(pk=session.pk, status='open', received=session.size).update(
+        status='finalizing'
+    ) == 1
+
+
+def assemble_upload(session):
+    """
+    Склеивает части в итоговый файл в каталоге Document.file.
+    Возвращает (имя в хранилище, SHA-256 содержимого).
+    """
+    chunks = list(session.chunks.order_by('offset'))
+    hashing_file = HashingFile(StoredChunks(chunks, session.filename, session.size), name=session.filename)
+    name = Document._meta.get_field('file').generate_filename(None, session.filename)
+    stored_name = default_storage.save(name, hashing_file)
+    if hashing_file.size_read != session.size:
+        default_storage.delete(stored_name)
+        raise UploadError("Размер собранного файла не совпадает с объявленным")
+    return stored_name, hashing_file.hexdigest
+
+
+def complete_upload_session(session, document):
+    UploadSession.objects.filter(pk=session.pk).update(status='completed', document=document)
+    # Части больше не нужны: post_delete UploadChunk удаляет их из хранилища
+    UploadChunk.objects.filter(session=session).delete()
+
+
+def reopen_upload_session(session):
+    UploadSession.objects.filter(pk=session.pk, status='finalizing').update(status='open')
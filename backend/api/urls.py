@@ -1,20 +1,31 @@
 from django.urls import path, include
 from .views import (
-    HealthCheckView, ContractAnalysisView, DocumentListView, 
+    HealthCheckView, MetricsView, ContractAnalysisView, DocumentListView, 
     RegisterView, LoginView, LogoutView, DocumentDetailView, 
-    UserInfoView, ChangePasswordView, CreatePaymentView, PaymentWebhookView
+    UserInfoView, ChangePasswordView, CreatePaymentView, PaymentWebhookView,
+    DocumentEventsView, UploadSessionView, UploadSessionDetailView, UploadChunkView,
+    UploadFinalizeView, BatchUploadView, BatchDetailView, DocumentSearchView
 )
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health_check'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('user/info/', UserInfoView.as_view(), name='user-info'),
     path('user/change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('analyze/', ContractAnalysisView.as_view(), name='analyze_contract'),
+    path('analyze/batch/', BatchUploadView.as_view(), name='analyze_batch'),
+    path('batches/<uuid:pk>/', BatchDetailView.as_view(), name='batch_detail'),
+    path('uploads/', UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:pk>/', UploadSessionDetailView.as_view(), name='upload_session_detail'),
+    path('uploads/<uuid:pk>/chunk/', UploadChunkView.as_view(), name='upload_chunk'),
+    path('uploads/<uuid:pk>/finalize/', UploadFinalizeView.as_view(), name='upload_finalize'),
     path('documents/', DocumentListView.as_view(), name='document_list'),
+    path('documents/search/', DocumentSearchView.as_view(), name='document_search'),
     path('documents/<int:pk>/', DocumentDetailView.as_view(), name='document_detail'),
+    path('documents/events/', DocumentEventsView.as_view(), name='document_events'),
     path('payment/create/', CreatePaymentView.as_view(), name='payment_create'),
     path('payment/webhook/', PaymentWebhookView.as_view(), name='payment_webhook'),
     
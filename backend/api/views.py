@@ -1,18 +1,39 @@
 from rest_framework.views import APIView
 import os
+import time
+import asyncio
 import hashlib
 import logging
+from datetime import timedelta
 from rest_framework.response import Response
 from django.http import HttpResponse
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
-from rest_framework import generics
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from .models import Document, Transaction, UserProfile
-from .serializers import DocumentSerializer, UserSerializer
-from .tasks import analyze_document_task
+from .models import Document, Transaction, UserProfile, UploadSession, UploadBatch
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Avg, Count, Q
+from .serializers import DocumentSerializer, DOCUMENT_LIST_FIELDS, QUEUE_FIELDS
+from .pagination import DocumentCursorPagination
+from .uploads import (
+    VALID_EXTENSIONS, RawChunkParser, UploadError, UploadOffsetError, store_upload,
+    start_upload_session, append_chunk, claim_upload_session, assemble_upload,
+    complete_upload_session, reopen_upload_session,
+)
+from .quota import reserve_check, record_reservation, credit_payment
+from .scheduler import annotate_queue, schedule_analysis, schedule_analyses
+from .search import search_documents
+from .batches import BatchQuotaError, batch_progress, create_batch, delete_stored_files, store_batch_files
+from .notifications import acurrent_version, changes_since
+from .async_views import AsyncAPIView, AsyncGenericAPIView
+from .metrics import count_cache_lookup, render_metrics
+from .auth_cache import aget_user_info
+from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
@@ -60,44 +81,104 @@ class HealthCheckView(APIView):
     def get(self, request):
         return Response({"status": "ok", "message": "ContractCheck Backend is running"}, status=status.HTTP_200_OK)
 
+class MetricsView(APIView):
+    """
+    Метрики Prometheus (api/metrics.py), суммарно по процессам gunicorn и Celery.
+    Снаружи закрыт в nginx; при заданном METRICS_TOKEN требует Bearer-токен.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if settings.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {settings.METRICS_TOKEN}":
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        body, content_type = render_metrics()
+        return HttpResponse(body, content_type=content_type)
+
+def create_document_with_reservation(user, stored_name, name, file_hash):
+    """
+    Резервирует проверку и создаёт документ в одной транзакции.
+    Возвращает (document, duplicate): document — None, если баланс исчерпан
+    или найден дубликат.
+
+    Резерв проверки — один условный UPDATE (api/quota.py): параллельные
+    загрузки не уводят баланс в минус. UPDATE блокирует строку профиля до конца
+    транзакции, поэтому поиск дубликата ниже сериализован для пользователя.
+    Повторная загрузка тех же байтов (двойной клик, повтор запроса) —
+    резерв откатывается, возвращается уже существующий документ.
+    """
+    document = None
+    with transaction.atomic():
+        reserved = reserve_check(user.id)
+        duplicate = Document.objects.filter(
+            user=user,
+            file_hash=file_hash,
+            status__in=['pending', 'analyzing', 'processed'],
+            uploaded_at__gte=timezone.now() - timedelta(seconds=settings.DUPLICATE_UPLOAD_WINDOW),
+        ).order_by('-uploaded_at').first()
+        if duplicate is not None:
+            transaction.set_rollback(True)
+        elif reserved:
+            document = Document.objects.create(
+                file=stored_name, name=name, user=user, status='pending',
+                file_hash=file_hash, quota_state='reserved'
+            )
+            record_reservation(document)
+    return document, duplicate
+
 @method_decorator(csrf_exempt, name='dispatch')
-class ContractAnalysisView(APIView):
+class ContractAnalysisView(AsyncAPIView):
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_obj = request.FILES.get('file')
         
         if not file_obj:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Valid extensions
-        valid_extensions = ['.pdf', '.docx', '.doc', '.txt']
         file_ext = os.path.splitext(file_obj.name)[1].lower()
-        if file_ext not in valid_extensions:
-             return Response({"error": f"Unsupported file type. Supported: {', '.join(valid_extensions)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if file_ext not in VALID_EXTENSIONS:
+             return Response({"error": f"Unsupported file type. Supported: {', '.join(VALID_EXTENSIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # 0. Check limits (user is guaranteed to be authenticated)
+            # 0. Профиль должен существовать для резерва проверки (user is guaranteed to be authenticated).
+            # Баланс здесь не проверяется: повтор уже загруженного файла на последней
+            # проверке — не отказ, дубликат ищет create_document_with_reservation
             user = request.user
-            # Use get_or_create to ensure profile exists
-            profile, created = UserProfile.objects.get_or_create(user=user)
-            if profile.checks_remaining <= 0:
-                 return Response({
-                     "error": "Limit reached", 
-                     "details": "У вас закончились доступные проверки. Пожалуйста, обновите тариф."
-                 }, status=status.HTTP_403_FORBIDDEN)
-            
-            # 1. Сначала сохраняем документ со статусом pending
+            await UserProfile.objects.aget_or_create(user=user)
+
+            # 1. Пишем файл в хранилище, одновременно считая его хэш
+            stored_name, file_hash = await sync_to_async(store_upload)(file_obj)
+
+            # 2. Резерв проверки и документ (или найденный дубликат)
             try:
-                document = Document.objects.create(file=file_obj, user=user, status='pending')
-                print(f"--- Document created: ID {document.id}. Triggering task. ---")
+                document, duplicate = await sync_to_async(create_document_with_reservation)(
+                    user, stored_name, file_obj.name, file_hash
+                )
             except Exception as e:
+                 await sync_to_async(default_storage.delete)(stored_name)
                  logger.error(f"Error creating document: {e}")
                  return Response({"error": f"Database error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            # 2. Trigger asynchronous task
-            analyze_document_task.delay(document.id)
+            if duplicate is not None:
+                await sync_to_async(default_storage.delete)(stored_name)
+                logger.info("Повторная загрузка: возвращён существующий документ", extra={"document_id": duplicate.id, "status": duplicate.status})
+                return Response(DocumentSerializer(duplicate).data, status=status.HTTP_200_OK)
+
+            if document is None:
+                # Баланс исчерпан
+                await sync_to_async(default_storage.delete)(stored_name)
+                return Response({
+                    "error": "Limit reached",
+                    "details": "У вас закончились доступные проверки. Пожалуйста, обновите тариф."
+                }, status=status.HTTP_403_FORBIDDEN)
+
+            logger.info("Документ создан, постановка в очередь анализа", extra={"document_id": document.id})
+
+            # 3. Очередь анализа: запуск сразу или при освобождении слота (api/scheduler.py)
+            await sync_to_async(schedule_analysis)(document)
 
             # Return serialized data immediately (202 Accepted would be more semantic, but 201 is fine)
             serializer = DocumentSerializer(document)
@@ -107,17 +188,291 @@ class ContractAnalysisView(APIView):
             logger.error(f"Unexpected error in view: {e}")
             return Response({"error": f"Unexpected server error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class DocumentListView(generics.ListAPIView):
+LIMIT_REACHED_RESPONSE = {
+    "error": "Limit reached",
+    "details": "У вас закончились доступные проверки. Пожалуйста, обновите тариф."
+}
+
+def upload_session_data(session):
+    return {
+        "id": str(session.id),
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.received,
+        "status": session.status,
+        "document_id": session.document_id,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+    }
+
+class UploadSessionView(AsyncAPIView):
+    """
+    Начало загрузки по частям: {"filename": ..., "size": ...}.
+    Дальше части отправляются в UploadChunkView, в конце — UploadFinalizeView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        filename = request.data.get('filename') or ''
+        try:
+            size = int(request.data.get('size') or 0)
+        except (TypeError, ValueError):
+            return Response({"error": "size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Баланс проверяется при резерве: повтор уже загруженного файла не отклоняется
+        await UserProfile.objects.aget_or_create(user=request.user)
+
+        try:
+            session = await sync_to_async(start_upload_session)(request.user, filename, size)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload_session_data(session), status=status.HTTP_201_CREATED)
+
+class UploadSessionDetailView(AsyncAPIView):
+    """
+    Состояние загрузки: offset — с какого байта продолжать после обрыва.
+    DELETE отменяет загрузку и удаляет принятые части.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        session = await UploadSession.objects.filter(pk=pk, user=request.user).afirst()
+        if session is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(upload_session_data(session))
+
+    async def delete(self, request, pk):
+        session = await UploadSession.objects.filter(pk=pk, user=request.user).exclude(status='completed').afirst()
+        if session is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        await session.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadChunkView(AsyncAPIView):
+    """
+    Часть файла: PUT /uploads/<id>/chunk/?offset=N, тело — байты части
+    (Content-Type: application/octet-stream). При несовпадении смещения —
+    409 с ожидаемым offset.
+    """
+    parser_classes = (RawChunkParser,)
+    permission_classes = [IsAuthenticated]
+
+    async def put(self, request, pk):
+        session = await UploadSession.objects.filter(pk=pk, user=request.user).afirst()
+        if session is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            offset = int(request.query_params.get('offset', request.headers.get('Upload-Offset', '')))
+        except ValueError:
+            return Response({"error": "offset must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            received = await sync_to_async(append_chunk)(session, offset, request.data)
+        except UploadOffsetError as e:
+            return Response({"error": str(e), "offset": e.expected}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"offset": received, "size": session.size})
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadFinalizeView(AsyncAPIView):
+    """
+    Завершение загрузки: части склеиваются в файл документа (с подсчётом SHA-256),
+    резервируется проверка и ставится анализ — как в ContractAnalysisView.
+    Повторный finalize возвращает уже созданный документ.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, pk):
+        session = await UploadSession.objects.filter(pk=pk, user=request.user).afirst()
+        if session is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if session.status == 'completed' and session.document_id:
+            document = await Document.objects.filter(pk=session.document_id).afirst()
+            if document is not None:
+                return Response(DocumentSerializer(document).data, status=status.HTTP_200_OK)
+
+        try:
+            claimed = await sync_to_async(claim_upload_session)(session)
+        except UploadError as e:
+            return Response({"error": str(e), "offset": session.received}, status=status.HTTP_409_CONFLICT)
+        if not claimed:
+            return Response({"error": "Upload is already being finalized"}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            stored_name, file_hash = await sync_to_async(assemble_upload)(session)
+            document, duplicate = await sync_to_async(create_document_with_reservation)(
+                request.user, stored_name, session.filename, file_hash
+            )
+        except Exception as e:
+            await sync_to_async(reopen_upload_session)(session)
+            logger.error(f"Error finalizing upload {session.id}: {e}")
+            return Response({"error": f"Upload finalize error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if duplicate is not None:
+            await sync_to_async(default_storage.delete)(stored_name)
+            await sync_to_async(complete_upload_session)(session, duplicate)
+            logger.info("Повторная загрузка: возвращён существующий документ", extra={"document_id": duplicate.id, "status": duplicate.status})
+            return Response(DocumentSerializer(duplicate).data, status=status.HTTP_200_OK)
+
+        if document is None:
+            # Части сохраняются: после пополнения баланса finalize можно повторить
+            await sync_to_async(default_storage.delete)(stored_name)
+            await sync_to_async(reopen_upload_session)(session)
+            return Response(LIMIT_REACHED_RESPONSE, status=status.HTTP_403_FORBIDDEN)
+
+        await sync_to_async(complete_upload_session)(session, document)
+        logger.info("Документ создан из загрузки по частям, постановка в очередь анализа", extra={"document_id": document.id})
+        await sync_to_async(schedule_analysis)(document)
+        return Response(DocumentSerializer(document).data, status=status.HTTP_201_CREATED)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchUploadView(AsyncAPIView):
+    """
+    Пакетная загрузка: файлы в поле files и/или ZIP-архивы в поле archive.
+    Проверки резервируются на весь пакет (все или ни одной), документы ставятся
+    в очередь анализа разом. Ответ — id пакета с прогрессом, созданные документы,
+    найденные дубликаты и отклонённые файлы с причиной.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        files = request.FILES.getlist('files')
+        archives = request.FILES.getlist('archive')
+        if not files and not archives:
+            return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Баланс проверяется при резерве: повтор уже загруженного файла не отклоняется
+        await UserProfile.objects.aget_or_create(user=request.user)
+
+        try:
+            stored, rejected = await sync_to_async(store_batch_files)(files, archives)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not stored:
+            return Response({"error": "Нет файлов для анализа", "rejected": rejected}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch, documents, duplicates = await sync_to_async(create_batch)(request.user, stored)
+        except BatchQuotaError as e:
+            await sync_to_async(delete_stored_files)(stored)
+            return Response({**LIMIT_REACHED_RESPONSE, "required": e.required}, status=status.HTTP_403_FORBIDDEN)
+        except Exception as e:
+            await sync_to_async(delete_stored_files)(stored)
+            logger.error(f"Error creating batch: {e}")
+            return Response({"error": f"Database error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        logger.info(
+            "Пакет создан, постановка в очередь анализа",
+            extra={"batch_id": str(batch.id), "documents": len(documents), "duplicates": len(duplicates), "rejected": len(rejected)},
+        )
+        await sync_to_async(schedule_analyses)(documents)
+
+        data = await sync_to_async(batch_progress)(batch)
+        data['documents'] = DocumentSerializer(documents, many=True, fields=DOCUMENT_LIST_FIELDS).data
+        data['duplicates'] = DocumentSerializer(duplicates, many=True, fields=DOCUMENT_LIST_FIELDS).data
+        data['rejected'] = rejected
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class BatchDetailView(AsyncAPIView):
+    """
+    Прогресс пакетной загрузки и лёгкие поля его документов.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        batch = await UploadBatch.objects.filter(pk=pk, user=request.user).afirst()
+        if batch is None:
+            return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+        data = await sync_to_async(batch_progress)(batch)
+        documents = [d async for d in batch.documents.order_by('id').only(*DOCUMENT_LIST_FIELDS)]
+        data['documents'] = DocumentSerializer(documents, many=True, fields=DOCUMENT_LIST_FIELDS).data
+        return Response(data)
+
+class DocumentListView(AsyncGenericAPIView):
+    """
+    Список документов пользователя с курсорной пагинацией.
+    ?fields=list (или перечень полей через запятую) отдаёт только лёгкие колонки.
+    Страница кэшируется по версии канала статусов: любое изменение документа
+    пользователя (post_save/post_delete) меняет версию и ключ кэша.
+    """
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DocumentCursorPagination
+    cache_timeout = 300
+
+    def get_projection(self):
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        if raw == 'list':
+            return DOCUMENT_LIST_FIELDS
+        fields = [f for f in raw.split(',') if f in DocumentSerializer.Meta.fields and f not in QUEUE_FIELDS]
+        return fields or None
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return Document.objects.filter(user=user).order_by('-uploaded_at')
+            queryset = Document.objects.filter(user=user)
+            fields = self.get_projection()
+            if fields:
+                # Тяжёлые JSON-колонки не читаются из БД; uploaded_at и id нужны курсору
+                queryset = queryset.only(*(set(fields) | {'id', 'uploaded_at'}))
+            return queryset
         return Document.objects.none()
 
-class DocumentDetailView(generics.RetrieveDestroyAPIView):
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_projection())
+        return super().get_serializer(*args, **kwargs)
+
+    def paginate_documents(self):
+        # Курсорная пагинация DRF вычисляет queryset синхронно — выполняется в потоке
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
+
+    async def get(self, request, *args, **kwargs):
+        version = await acurrent_version(request.user.id)
+        query_hash = hashlib.md5(f"{request.get_host()}{request.get_full_path()}".encode()).hexdigest()
+        cache_key = f"doclist:{request.user.id}:{version}:{query_hash}"
+
+        data = await cache.aget(cache_key)
+        count_cache_lookup('document_list', data is not None)
+        if data is None:
+            page = await sync_to_async(self.paginate_documents)()
+            data = {**page, 'results': list(page['results'])}
+            # Сводка для карточек дашборда — только на первой странице
+            if not request.query_params.get('cursor'):
+                data['stats'] = await Document.objects.filter(user=request.user).aaggregate(
+                    total=Count('id'),
+                    processed=Count('id', filter=Q(status='processed')),
+                    avg_score=Avg('score', filter=Q(status='processed')),
+                )
+            await cache.aset(cache_key, data, self.cache_timeout)
+        return Response(data)
+
+class DocumentSearchView(AsyncAPIView):
+    """
+    Полнотекстовый поиск по своим документам: ?q=запрос&limit=N.
+    Результаты по релевантности с фрагментами текста (страница, пункт, подсветка)
+    и совпавшими заголовками рисков.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        query = (request.query_params.get('q') or '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit') or settings.SEARCH_MAX_RESULTS)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        results = await sync_to_async(search_documents)(request.user.id, query, max(1, limit))
+        return Response({"query": query, "results": results})
+
+class DocumentDetailView(AsyncGenericAPIView):
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -127,13 +482,71 @@ class DocumentDetailView(generics.RetrieveDestroyAPIView):
             return Document.objects.filter(user=user)
         return Document.objects.none()
 
-class UserInfoView(APIView):
+    async def get(self, request, *args, **kwargs):
+        document = await self.aget_object()
+        await sync_to_async(annotate_queue)(document)
+        return Response(self.get_serializer(document).data)
+
+    async def delete(self, request, *args, **kwargs):
+        document = await self.aget_object()
+        # Сигналы post_delete (канал статусов, возврат резерва) выполняются в потоке adelete
+        await document.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+def _parse_status_etag(value):
+    """
+    Извлекает номер версии из If-None-Match вида "docs-42".
+    """
+    if not value:
+        return None
+    try:
+        return int(value.strip().removeprefix('W/').strip('"').rsplit('-', 1)[-1])
+    except ValueError:
+        return None
+
+class DocumentEventsView(AsyncAPIView):
+    """
+    Изменения статусов документов пользователя вместо полного опроса списка.
+    Клиент передаёт полученный ETag в If-None-Match: без изменений — 304
+    (одно чтение из кэша, без запросов к БД), иначе — только изменившиеся
+    документы. Параметр wait включает long-poll (не дольше DOCUMENT_EVENTS_MAX_WAIT).
+    """
     permission_classes = [IsAuthenticated]
-    def get(self, request):
-        # Ensure profile exists before serialization
-        UserProfile.objects.get_or_create(user=request.user)
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+    poll_interval = 1  # секунды между проверками версии при long-poll
+
+    async def get(self, request):
+        user_id = request.user.id
+        since = _parse_status_etag(request.headers.get('If-None-Match'))
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), settings.DOCUMENT_EVENTS_MAX_WAIT)
+        except ValueError:
+            wait = 0
+
+        # Ожидание long-poll не занимает воркер: под ASGI это только asyncio.sleep
+        version = await acurrent_version(user_id)
+        deadline = time.monotonic() + wait
+        while since == version and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            version = await acurrent_version(user_id)
+
+        etag = f'"docs-{version}"'
+        if since == version:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            changes = await sync_to_async(changes_since)(user_id, since, version) if since is not None else None
+            full = changes is None
+            if full:
+                changes = [doc async for doc in Document.objects.filter(user=request.user).values('id', 'status', 'score')]
+            response = Response({"version": version, "full": full, "changes": changes})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+class UserInfoView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    async def get(self, request):
+        # Ответ из кэша до изменения профиля (api/auth_cache.py); профиль создаётся, если его нет
+        return Response(await aget_user_info(request.user))
 
 class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
@@ -228,28 +641,13 @@ class PaymentWebhookView(APIView):
             logger.error(f"Robokassa: Signature mismatch. Received: {signature_received}, Calculated: {signature_calculated}")
             return Response("fail", status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            transaction = Transaction.objects.get(id=inv_id)
-            if transaction.status == 'pending':
-                transaction.status = 'completed'
-                transaction.save()
-
-                # Credit user profile (ensure it exists)
-                profile, created = UserProfile.objects.get_or_create(user=transaction.user)
-                profile.checks_remaining += transaction.checks_count
-                
-                # Update tier if applicable
-                if transaction.checks_count >= 100:
-                    profile.subscription_tier = 'business'
-                elif transaction.checks_count >= 20:
-                    if profile.subscription_tier != 'business':
-                        profile.subscription_tier = 'pro'
-                
-                profile.save()
-                
-                logger.info(f"Robokassa: Success. Credited {transaction.checks_count} checks to {transaction.user.username}")
-            
-            return HttpResponse(f"OK{inv_id}", status=200) # Robokassa expects plain OK + InvId
-        except Transaction.DoesNotExist:
+        if not Transaction.objects.filter(id=inv_id).exists():
             logger.error(f"Robokassa: Transaction {inv_id} not found")
             return HttpResponse("fail", status=404)
+
+        # Начисление идемпотентно по InvId: повторное уведомление Robokassa ничего не начисляет
+        payment = credit_payment(inv_id)
+        if payment is not None:
+            logger.info(f"Robokassa: Success. Credited {payment.checks_count} checks to {payment.user.username}")
+
+        return HttpResponse(f"OK{inv_id}", status=200) # Robokassa expects plain OK + InvId
@@ -0,0 +1,74 @@
+"""
+Запросы к БД на опрос дашборда: TokenAuthentication против CachedTokenAuthentication.
+
+Запуск (из каталога backend):
+    python -m benchmarks.auth_cache [--requests 500]
+
+Дашборд раз в 5 секунд запрашивает /documents/events/ (без изменений — 304)
+и при изменениях /user/info/. Для каждого способа аутентификации печатаются
+запросы к БД и время на один запрос каждого эндпоинта через тестовый клиент DRF.
+Кэш — из настроек (LocMem в разработке, Redis в продакшне). Кэш ответа /user/info/
+действует в обоих режимах (до него представление делало ещё запрос профиля).
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+AUTH_CLASSES = {
+    "token": "rest_framework.authentication.TokenAuthentication",
+    "cached": "api.auth_cache.CachedTokenAuthentication",
+}
+ENDPOINTS = ["/api/documents/events/", "/api/user/info/"]
+
+
+def measure(client, path, requests, headers):
+    client.get(path, **headers)  # прогрев кэша
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(path, **headers)
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{path}: {response.status_code}")
+        elapsed = time.perf_counter() - started
+    return len(queries) / requests, elapsed / requests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f"auth-cache-{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex)
+    token = Token.objects.create(user=user)
+    client = APIClient(SERVER_NAME="localhost")
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    # Классы аутентификации читаются из настроек один раз при импорте APIView
+    default_classes = APIView.authentication_classes
+    try:
+        etag = client.get("/api/documents/events/")["ETag"]
+        for name, auth_class in AUTH_CLASSES.items():
+            APIView.authentication_classes = [import_string(auth_class)]
+            for path in ENDPOINTS:
+                headers = {"HTTP_IF_NONE_MATCH": etag} if "events" in path else {}
+                queries, seconds = measure(client, path, args.requests, headers)
+                print(f"{name:<7} | {path:<24} | запросов к БД {queries:>4.1f} | {seconds * 1000:>7.2f} мс")
+    finally:
+        APIView.authentication_classes = default_classes
+        user.delete()
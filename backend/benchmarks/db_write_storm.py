@@ -0,0 +1,208 @@
+"""
+Пропускная способность записи в БД при шквале загрузок.
+
+Запуск (из каталога backend):
+    python -m benchmarks.db_write_storm [--uploads 400] [--writers 16] [--readers 8] [--postgres]
+
+Каждая загрузка проходит те же записи, что и настоящая: резерв проверки и документ
+(create_document_with_reservation), предварительная оценка, статус 'analyzing', результат
+анализа и подтверждение резерва (commit_check). Параллельно читатели опрашивают список
+документов, как дашборд. Пишущие потоки — разные пользователи.
+
+Режимы (каждый — отдельный процесс со своими настройками БД):
+  sqlite-legacy — прежняя конфигурация: журнал DELETE, транзакции DEFERRED, ожидание блокировки 5 с;
+  sqlite-wal    — конфигурация по умолчанию (config/settings.py): WAL, IMMEDIATE, synchronous=NORMAL;
+  postgresql    — с --postgres: PostgreSQL из DB_* в .env с пулом соединений
+                  (пользователи и документы удаляются в конце).
+SQLite-режимы работают на временном файле БД с применёнными миграциями.
+Печатаются загрузки в секунду, p50/p95 длительности записей одной загрузки,
+чтения в секунду и число ошибок ('database is locked' и др.).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = {
+    "sqlite-legacy": {
+        "DB_ENGINE": "django.db.backends.sqlite3",
+        "DB_SQLITE_JOURNAL_MODE": "DELETE",
+        "DB_SQLITE_TRANSACTION_MODE": "DEFERRED",
+        "DB_SQLITE_TIMEOUT": "5",
+    },
+    "sqlite-wal": {
+        "DB_ENGINE": "django.db.backends.sqlite3",
+    },
+}
+PRESCREEN = {"score": 85, "risks": []}
+RESULT_RISKS = [{"title": "Штрафы за просрочку", "description": "Пеня 1% в день.", "severity": "high"}]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def upload(user, index):
+    """
+    Записи одной загрузки от POST /api/analyze/ до готового анализа.
+    """
+    from api.models import Document
+    from api.quota import commit_check
+    from api.tasks import save_prescreen
+    from api.views import create_document_with_reservation
+
+    document, _ = create_document_with_reservation(
+        user, f"contracts/storm_{index}.txt", f"storm_{index}.txt", uuid.uuid4().hex,
+    )
+    if document is None:
+        raise RuntimeError("Баланс проверок исчерпан")
+    save_prescreen(document.id, user.id, PRESCREEN)
+    Document.objects.filter(pk=document.id).update(status='analyzing')
+    Document.objects.filter(pk=document.id).update(
+        status='processed', score=70, summary="Анализ завершён.", risks=RESULT_RISKS,
+        stage_timings={"extract": 0.01, "analyze": 1.0, "render": 0.02},
+    )
+    commit_check(document.id)
+
+
+def run_storm(mode, uploads, writers, readers):
+    """
+    Выполняется в процессе режима: настройки БД уже заданы окружением.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import DatabaseError, connection, connections
+
+    from api.models import Document, UserProfile
+
+    if mode == "postgresql" and connection.vendor != 'postgresql':
+        raise SystemExit("Режим postgresql: в .env не задан DB_ENGINE=django.db.backends.postgresql")
+    if connection.vendor == 'sqlite':
+        call_command('migrate', verbosity=0)
+
+    prefix = f"storm-{uuid.uuid4().hex[:8]}-"
+    users = [User.objects.create_user(username=f"{prefix}{i}") for i in range(writers)]
+    UserProfile.objects.filter(user__in=users).update(checks_remaining=uploads)
+
+    counter = iter(range(uploads))
+    counter_lock = threading.Lock()
+    latencies, errors, reads = [], [], [0]
+    results_lock = threading.Lock()
+    writing = threading.Event()
+    writing.set()
+
+    def writer(user):
+        try:
+            while True:
+                with counter_lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    upload(user, index)
+                    elapsed = time.perf_counter() - started
+                    with results_lock:
+                        latencies.append(elapsed)
+                except (DatabaseError, RuntimeError) as e:
+                    with results_lock:
+                        errors.append(str(e))
+        finally:
+            connections.close_all()
+
+    def reader():
+        try:
+            while writing.is_set():
+                user = users[reads[0] % len(users)]
+                list(Document.objects.filter(user=user).order_by('-uploaded_at', '-id')
+                     .values('id', 'name', 'status', 'score')[:50])
+                with results_lock:
+                    reads[0] += 1
+        except DatabaseError as e:
+            with results_lock:
+                errors.append(f"чтение: {e}")
+        finally:
+            connections.close_all()
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    writing.clear()
+    for thread in reader_threads:
+        thread.join()
+
+    Document.objects.filter(user__in=users).delete()
+    User.objects.filter(username__startswith=prefix).delete()
+
+    return {
+        "uploads": len(latencies),
+        "uploads_per_sec": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "reads_per_sec": round(reads[0] / duration, 1),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def run_mode(mode, uploads, writers, readers):
+    with tempfile.TemporaryDirectory(prefix="crisha-storm-") as tmp:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings')
+        if mode in MODES:
+            env.update(MODES[mode], DB_NAME=os.path.join(tmp, "storm.sqlite3"))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.db_write_storm", "--run-mode", mode,
+             "--uploads", str(uploads), "--writers", str(writers), "--readers", str(readers)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return {"mode": mode, **json.loads(output.strip().splitlines()[-1])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=400)
+    parser.add_argument("--writers", type=int, default=16, help="параллельно загружающих пользователей")
+    parser.add_argument("--readers", type=int, default=8, help="параллельных читателей списка документов")
+    parser.add_argument("--postgres", action="store_true", help="добавить режим PostgreSQL из DB_* в .env")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_storm(args.run_mode, args.uploads, args.writers, args.readers), ensure_ascii=False))
+        sys.exit(0)
+
+    modes = list(MODES) + (["postgresql"] if args.postgres else [])
+    results = []
+    for mode in modes:
+        result = run_mode(mode, args.uploads, args.writers, args.readers)
+        results.append(result)
+        print(
+            f"{mode:<14} | {result['uploads_per_sec']:>7.1f} загрузок/с | p50 {result['p50_ms']:>8.1f} мс | "
+            f"p95 {result['p95_ms']:>8.1f} мс | {result['reads_per_sec']:>8.1f} чтений/с | "
+            f"ошибок {result['errors']}" + (f" ({result['first_error']})" if result['first_error'] else "")
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,104 @@
+"""
+Бенчмарк конвертации .doc -> .docx: пул LibreOffice против запуска soffice на каждый файл.
+
+Запуск (из каталога backend):
+    python -m benchmarks.doc_conversion [каталог_с_doc] [--files N] [--threads N]
+
+Без каталога генерируются N документов python-docx (LibreOffice открывает их
+тем же фильтром импорта, что и .doc). Кэш конвертаций на время замера
+направляется во временный каталог, чтобы не мерить попадания в кэш.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+import docx
+from django.conf import settings
+
+from api.doc_conversion import convert_doc_with_libreoffice, get_converter_pool, libreoffice_available
+
+
+def make_documents(directory, count):
+    paths = []
+    for i in range(count):
+        document = docx.Document()
+        document.add_heading(f"Договор аренды № {i + 1}", level=1)
+        for n in range(60):
+            document.add_paragraph(
+                f"{n + 1}. Арендатор обязуется своевременно вносить арендную плату. "
+                f"Пеня за просрочку составляет 1% в день. Документ {i + 1}."
+            )
+        path = os.path.join(directory, f"contract_{i + 1}.docx")
+        document.save(path)
+        paths.append(path)
+    return paths
+
+
+def convert_cold(path, out_dir):
+    """
+    Прежний подход без пула: новый процесс soffice на каждый файл.
+    """
+    subprocess.run(
+        ["soffice", "--headless", "--convert-to", "docx", "--outdir", out_dir, path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=300,
+    )
+
+
+def run_benchmark(paths, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        for path in paths:
+            convert_cold(path, tmp)
+        cold = time.perf_counter() - started
+        print(f"soffice на файл    | {len(paths):>4} файлов | {cold:>8.2f} с | {len(paths) / cold:>6.2f} док/с")
+
+    settings.DOC_CONVERTER_CACHE_DIR = tempfile.mkdtemp(prefix="doc_conversion_bench_")
+    pool = get_converter_pool()
+    try:
+        # Запуск воркеров не входит в замер: в продакшне они уже прогреты
+        started = time.perf_counter()
+        pool._ensure_started()
+        print(f"Запуск пула ({pool.size} LibreOffice): {time.perf_counter() - started:.2f} с")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(convert_doc_with_libreoffice, paths))
+        warm = time.perf_counter() - started
+        print(f"пул, {threads} потоков   | {len(paths):>4} файлов | {warm:>8.2f} с | {len(paths) / warm:>6.2f} док/с")
+        print(f"Статистика пула: {pool.throughput()}")
+    finally:
+        pool.shutdown()
+        shutil.rmtree(settings.DOC_CONVERTER_CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=settings.DOC_CONVERTER_POOL_SIZE)
+    args = parser.parse_args()
+
+    if not libreoffice_available():
+        sys.exit(f"unoserver недоступен в {settings.DOC_CONVERTER_PYTHON}: установите LibreOffice и unoserver")
+
+    if args.directory:
+        files = sorted(
+            os.path.join(args.directory, name) for name in os.listdir(args.directory)
+            if name.lower().endswith(".doc")
+        )
+        run_benchmark(files, args.threads)
+    else:
+        with tempfile.TemporaryDirectory() as source_dir:
+            run_benchmark(make_documents(source_dir, args.files), args.threads)
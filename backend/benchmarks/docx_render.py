@@ -0,0 +1,98 @@
+"""
+Бенчмарк сборки улучшенного DOCX: python-docx (render_docx_with_python_docx)
+против шаблонного рендерера (api/docx_render.render_docx).
+
+Запуск (из каталога backend):
+    python -m benchmarks.docx_render [--repeat 3]
+
+Для договоров разного размера печатается время сборки и размер файла.
+Дополнительно проверяется, что оба файла читаются python-docx с одинаковыми
+параграфами, стилями заголовков и жирными фрагментами, и что повторная
+сборка даёт те же байты.
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+import docx
+
+from api.docx_render import get_docx_template, render_docx
+from api.services import render_docx_with_python_docx
+
+# Размер договора в страницах, ~15 абзацев на страницу
+PAGES = [10, 100, 300]
+PARAGRAPHS_PER_PAGE = 15
+
+SECTION = [
+    "## {n}. Права и обязанности сторон",
+    "{n}.1. Арендатор обязуется своевременно вносить **арендную плату** не позднее 5 числа каждого месяца.",
+    "{n}.2. Арендодатель передаёт помещение по акту приёма-передачи в течение **3 рабочих дней** с даты подписания.",
+    "{n}.3. За просрочку платежа начисляется пеня в размере **0,1%** от суммы задолженности, но не более 10% <итого> & прочее.",
+    "### {n}.4. Ответственность",
+    "{n}.5. Споры разрешаются путём переговоров, а при недостижении согласия — в суде по месту нахождения ответчика.",
+]
+
+
+def make_text(pages):
+    lines = ["# ДОГОВОР АРЕНДЫ НЕЖИЛОГО ПОМЕЩЕНИЯ"]
+    n = 0
+    while len(lines) < pages * PARAGRAPHS_PER_PAGE:
+        n += 1
+        lines.extend(line.format(n=n) for line in SECTION)
+    return "\n".join(lines)
+
+
+def measure(render, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = render(text)
+        timings.append(time.perf_counter() - started)
+    return {"seconds": min(timings), "bytes": len(data), "data": data}
+
+
+def structure(data):
+    doc = docx.Document(io.BytesIO(data))
+    return [
+        (p.style.name, p.alignment, p.text, tuple(r.text for r in p.runs if r.bold and r.text))
+        for p in doc.paragraphs
+    ]
+
+
+def run_benchmark(repeat):
+    get_docx_template()  # шаблон загружается один раз на процесс, в замеры не входит
+    results = []
+    for pages in PAGES:
+        text = make_text(pages)
+        old = measure(render_docx_with_python_docx, text, repeat)
+        new = measure(render_docx, text, repeat)
+        same = structure(old["data"]) == structure(new["data"])
+        stable = hashlib.sha256(render_docx(text)).digest() == hashlib.sha256(new["data"]).digest()
+        for name, result in (("python-docx", old), ("template", new)):
+            print(
+                f"{pages:>4} стр. | {name:<11} | {result['seconds'] * 1000:>9.1f} мс | "
+                f"{result['bytes'] / 1024:>7.1f} КБ"
+            )
+        print(
+            f"     ускорение: {old['seconds'] / new['seconds']:.1f}x, "
+            f"структура совпадает: {same}, байты стабильны: {stable}"
+        )
+        results.append({"pages": pages, "speedup": old["seconds"] / new["seconds"], "same": same, "stable": stable})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
@@ -0,0 +1,190 @@
+"""
+Нагрузочный бенчмарк API: gunicorn sync (config.wsgi) против gunicorn + uvicorn (config.asgi).
+
+Запуск (из каталога backend):
+    python -m benchmarks.http_load [--clients 50] [--duration 10] [--workers 3]
+
+Для каждого режима поднимается gunicorn с одинаковым числом воркеров,
+затем по очереди выполняются сценарии:
+  list      — список документов (?fields=list, страница из кэша);
+  events    — опрос статусов с If-None-Match (304 без изменений);
+  long-poll — часть клиентов держит long-poll /documents/events/?wait=...,
+              остальные запрашивают /user/info/ (мерится только user/info).
+Печатаются запросы в секунду, p50/p99 задержки и число ошибок.
+Пользователь и документы создаются в базе из настроек и удаляются в конце.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from api.models import Document
+
+MODES = {
+    "sync": ["-k", "sync", "config.wsgi:application"],
+    "asgi": ["-k", "uvicorn_worker.UvicornWorker", "config.asgi:application"],
+}
+LONG_POLL_WAIT = 5
+DOCUMENTS = 50
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers):
+    env = dict(os.environ, DOCUMENT_EVENTS_MAX_WAIT=str(LONG_POLL_WAIT), DEBUG="False")
+    process = subprocess.Popen(
+        # Продакшн-конфиг gunicorn.conf.py; адрес, воркеры, тип воркера и логи — из аргументов
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+         "-w", str(workers), "--access-logfile", "/dev/null", "--error-logfile", "-", *MODES[mode]],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/api/health/", headers={"Host": "localhost"})
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Сервер {mode} не запустился")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def client_loop(port, path, headers, deadline, latencies, errors, lock, record=True):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status in (200, 304)
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        elapsed = time.perf_counter() - started
+        if record:
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(elapsed)
+    connection.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_scenario(port, name, token, etag, clients, duration):
+    headers = {"Host": "localhost", "Authorization": f"Token {token}"}
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + duration
+
+    if name == "list":
+        jobs = [("/api/documents/?fields=list&page_size=50", headers, True)] * clients
+    elif name == "events":
+        jobs = [("/api/documents/events/", {**headers, "If-None-Match": etag}, True)] * clients
+    else:
+        pollers = clients * 2 // 5
+        jobs = [(f"/api/documents/events/?wait={LONG_POLL_WAIT}", {**headers, "If-None-Match": etag}, False)] * pollers
+        jobs += [("/api/user/info/", headers, True)] * (clients - pollers)
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        for path, job_headers, record in jobs:
+            executor.submit(client_loop, port, path, job_headers, deadline, latencies, errors, lock, record)
+
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "errors": len(errors),
+    }
+
+
+def current_etag(port, token):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request("GET", "/api/documents/events/", headers={"Host": "localhost", "Authorization": f"Token {token}"})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader("ETag")
+
+
+def run_benchmark(clients, duration, workers):
+    user = User.objects.create_user(username=f"http-load-{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex)
+    token = Token.objects.create(user=user).key
+    Document.objects.bulk_create([
+        Document(user=user, file="contracts/load.txt", name=f"load_{i}.txt", status="processed", score=80)
+        for i in range(DOCUMENTS)
+    ])
+
+    results = []
+    try:
+        for mode in MODES:
+            port = free_port()
+            process = start_server(mode, port, workers)
+            try:
+                etag = current_etag(port, token)
+                for scenario in ("list", "events", "long-poll"):
+                    result = {"mode": mode, **run_scenario(port, scenario, token, etag, clients, duration)}
+                    results.append(result)
+                    print(
+                        f"{mode:<5} | {scenario:<9} | {result['rps']:>8.1f} rps | p50 {result['p50_ms']:>8.1f} мс | "
+                        f"p99 {result['p99_ms']:>8.1f} мс | ошибок {result['errors']}"
+                    )
+            finally:
+                stop_server(process)
+    finally:
+        user.delete()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+    results = run_benchmark(args.clients, args.duration, args.workers)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,607 @@
+"""
+Генератор нагрузки: тысячи одновременных пользовательских сессий против сервера API.
+
+Запуск (из каталога backend):
+    python -m benchmarks.loadgen [--users 50,200,500,1000] [--stage-duration 60]
+                                 [--workers 3] [--worker-class asgi] [--llm-latency 2]
+                                 [--long-poll 0] [--json results.json]
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 ...
+
+Сессия виртуального пользователя повторяет поведение фронтенда (frontend/js):
+  вход      — регистрация нового пользователя или вход вернувшегося (RETURNING_SHARE);
+  дашборд   — /user/info/ и список документов ?fields=list&page_size=50;
+  оплата    — если проверок меньше, чем файлов к загрузке (или с вероятностью PAYMENT_SHARE):
+              /payment/create/ и вебхук Robokassa /payment/webhook/ с подписью ROBOKASSA_PASSWORD_2;
+  загрузка  — 1–3 файла PDF/DOCX/TXT по 1, 10 или 50 страниц (FORMAT_WEIGHTS, PAGE_WEIGHTS);
+  ожидание  — раз в 5 секунд /documents/events/ с If-None-Match (с --long-poll — ?wait=),
+              при изменении статусов — перезапрос списка; затем открытие готового документа.
+Между шагами — пауза "на размышление" (--think). Закончив сессию, пользователь начинает следующую.
+Все пользователи работают в одном цикле asyncio: ожидающая сессия не занимает поток.
+
+Нагрузка растёт ступенями --users. На каждой ступени добавляются пользователи до заданного
+числа (не быстрее --spawn-rate в секунду), после чего --stage-duration секунд собирается
+статистика: запросы в секунду, p50/p95/p99 и доля ошибок по каждому эндпоинту, время от загрузки
+до готового анализа. Ступень, где доля ошибок выше --max-error-rate или p95 какого-либо
+эндпоинта (кроме long-poll) выше --max-p95, — точка отказа: следующие ступени не запускаются.
+
+Без --url поднимаются мок-LLM (benchmarks/mock_llm_server.py) и gunicorn с продакшн-конфигом
+gunicorn.conf.py и базой из настроек; Celery при этом работает в режиме eager, как в настройках
+по умолчанию. С --url нагрузка идёт на уже запущенный стек (например, gunicorn с воркерами Celery
+по deploy/systemd), LLM_BASE_URL сервера нужно направить на мок-LLM самостоятельно.
+Генератор и сервер на одной машине делят процессор — для поиска точки отказа лучше запускать
+генератор на отдельной машине с --url. Пользователи создаются с префиксом loadgen-<запуск>-
+и удаляются в конце вместе с файлами (если база из настроек та же, что у сервера).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+
+from api.docx_render import render_docx
+from api.models import Document
+from benchmarks.http_load import MODES, free_port, percentile, stop_server
+from benchmarks.pdf_extraction import CLAUSE, make_pdf
+
+FORMAT_WEIGHTS = {"pdf": 0.5, "docx": 0.35, "txt": 0.15}
+PAGE_WEIGHTS = {1: 0.5, 10: 0.4, 50: 0.1}
+UPLOADS_WEIGHTS = {1: 0.7, 2: 0.2, 3: 0.1}  # файлов за сессию
+CLAUSES_PER_PAGE = 12
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+RETURNING_SHARE = 0.3  # доля сессий, в которых пользователь входит в уже созданный аккаунт
+PAYMENT_SHARE = 0.05  # доля сессий с оплатой без нехватки проверок
+PAYMENT_PLAN = "pro"
+POLL_INTERVAL = 5  # сек, как watchDocumentStatus во фронтенде
+REQUEST_TIMEOUT = 120  # сек, как timeout в gunicorn.conf.py
+ANALYSIS_TIMEOUT = 600  # сек ожидания анализа, после — сессия считается неудачной
+OK_STATUSES = (200, 201, 304)
+
+
+class SessionError(Exception):
+    pass
+
+
+class Connection:
+    """
+    Одно keep-alive соединение HTTP/1.1 виртуального пользователя.
+    Тело ответа читается по Content-Length или chunked (ответы uvicorn).
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.target.hostname, self.target.port, ssl=self.target.ssl,
+            )
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.target.host_header}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("сервер закрыл соединение")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while await self.reader.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif status in (204, 304):
+            data = b""
+        else:
+            data = await self.reader.read()
+            response_headers["connection"] = "close"
+
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response_headers, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Target:
+    def __init__(self, url, host_header=None):
+        parts = urlsplit(url)
+        self.hostname = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.host_header = host_header or parts.netloc
+
+
+class StageStats:
+    """
+    Замеры одной ступени: задержки и ошибки по эндпоинтам, время до готового анализа.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.samples = defaultdict(dict)  # первое тело ответа каждой ошибки — причина отказа
+        self.turnaround = []
+        self.analyses = Counter()
+
+    def record(self, endpoint, elapsed, error=None, body=b""):
+        if error:
+            self.errors[endpoint][error] += 1
+            if body:
+                self.samples[endpoint].setdefault(error, body[:300].decode("utf-8", "replace"))
+        else:
+            self.latencies[endpoint].append(elapsed)
+
+    def summary(self, users, in_flight, stall_after, long_poll_endpoints=()):
+        """
+        in_flight — незавершённые запросы {ключ: (эндпоинт, начало)}: те, что ждут ответа
+        дольше stall_after секунд, считаются ошибкой "stalled" — иначе перегруженный сервер,
+        не ответивший ни на один запрос, выглядел бы как ступень без ошибок.
+        """
+        now = time.perf_counter()
+        for endpoint, started in in_flight.values():
+            if endpoint not in long_poll_endpoints and now - started > stall_after:
+                self.errors[endpoint]["stalled"] += 1
+        duration = time.monotonic() - self.started
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies[endpoint]
+            errors = sum(self.errors[endpoint].values())
+            total = len(latencies) + errors
+            endpoints[endpoint] = {
+                "requests": total,
+                "rps": round(total / duration, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "max_ms": round(max(latencies, default=0) * 1000, 1),
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "errors": dict(self.errors[endpoint]),
+                "error_samples": self.samples[endpoint],
+                "long_poll": endpoint in long_poll_endpoints,
+            }
+        requests = sum(e["requests"] for e in endpoints.values())
+        errors = sum(sum(c.values()) for c in self.errors.values())
+        return {
+            "users": users,
+            "duration": round(duration, 1),
+            "requests": requests,
+            "rps": round(requests / duration, 1),
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "analyses": dict(self.analyses),
+            "turnaround_p50_s": round(percentile(self.turnaround, 0.50), 2),
+            "turnaround_p95_s": round(percentile(self.turnaround, 0.95), 2),
+            "endpoints": endpoints,
+        }
+
+
+class FilePool:
+    """
+    Заранее сгенерированные договоры всех форматов и размеров: генерация PDF и DOCX
+    во время замера отнимала бы процессор у сервера. TXT уникален для каждой загрузки,
+    PDF и DOCX выбираются из variants вариантов (повторы попадают в кэш анализа).
+    """
+
+    def __init__(self, variants):
+        self.files = defaultdict(list)
+        with tempfile.TemporaryDirectory(prefix="crisha-loadgen-") as tmp:
+            for pages in PAGE_WEIGHTS:
+                for index in range(variants):
+                    nonce = uuid.uuid4().hex
+                    pdf_path = os.path.join(tmp, f"{pages}_{index}.pdf")
+                    make_pdf(pdf_path, pages, nonce)
+                    with open(pdf_path, "rb") as f:
+                        self.files["pdf", pages].append(f.read())
+                    self.files["docx", pages].append(render_docx(make_text(pages, nonce)))
+
+    def pick(self):
+        file_format = weighted_choice(FORMAT_WEIGHTS)
+        pages = weighted_choice(PAGE_WEIGHTS)
+        if file_format == "txt":
+            content = make_text(pages, uuid.uuid4().hex).encode("utf-8")
+        else:
+            content = random.choice(self.files[file_format, pages])
+        return f"contract_{pages}p.{file_format}", CONTENT_TYPES[file_format], content
+
+
+def make_text(pages, nonce):
+    lines = [CLAUSE.format(n=i + 1) for i in range(pages * CLAUSES_PER_PAGE)]
+    lines.append(f"Номер экземпляра: {nonce}")
+    return "\n".join(lines)
+
+
+def weighted_choice(weights):
+    return random.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def multipart(field, filename, content_type, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class LoadRun:
+    """
+    Общее состояние запуска: адрес сервера, файлы, текущая ступень и параметры сессий.
+    """
+
+    def __init__(self, target, files, prefix, think, long_poll, password_2):
+        self.target = target
+        self.files = files
+        self.prefix = prefix
+        self.think = think
+        self.long_poll = long_poll
+        self.password_2 = password_2
+        self.stats = StageStats()
+        self.in_flight = {}
+
+
+class VirtualUser:
+    def __init__(self, run, number):
+        self.run = run
+        self.number = number
+        self.connection = Connection(run.target)
+        self.account = None
+        self.sessions = 0
+        self.token = None
+
+    async def call(self, endpoint, method, path, body=b"", headers=None, auth=True):
+        request_headers = {"Accept": "application/json", **(headers or {})}
+        if auth:
+            request_headers["Authorization"] = f"Token {self.token}"
+        started = time.perf_counter()
+        key = object()
+        self.run.in_flight[key] = (endpoint, started)
+        try:
+            status, response_headers, data = await asyncio.wait_for(
+                self.connection.request(method, path, request_headers, body), REQUEST_TIMEOUT,
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            self.connection.close()
+            self.run.stats.record(endpoint, time.perf_counter() - started, type(e).__name__)
+            raise SessionError(f"{endpoint}: {type(e).__name__}") from e
+        finally:
+            del self.run.in_flight[key]
+        elapsed = time.perf_counter() - started
+        if status not in OK_STATUSES:
+            self.run.stats.record(endpoint, elapsed, f"HTTP {status}", data)
+            raise SessionError(f"{endpoint}: HTTP {status}")
+        self.run.stats.record(endpoint, elapsed)
+        return status, response_headers, (json.loads(data) if data and status != 304 else None)
+
+    async def call_json(self, endpoint, method, path, payload, auth=True):
+        body = json.dumps(payload).encode("utf-8")
+        return await self.call(endpoint, method, path, body, {"Content-Type": "application/json"}, auth)
+
+    async def pause(self):
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.run.think)
+
+    async def sign_in(self):
+        if self.account and random.random() < RETURNING_SHARE:
+            _, _, data = await self.call_json("login", "POST", "/api/auth/login/", self.account, auth=False)
+        else:
+            self.account = {
+                "username": f"{self.run.prefix}{self.number}-{self.sessions}",
+                "password": uuid.uuid4().hex,
+            }
+            payload = {**self.account, "email": f"{self.account['username']}@example.com"}
+            _, _, data = await self.call_json("register", "POST", "/api/auth/register/", payload, auth=False)
+        self.token = data["token"]
+
+    async def dashboard(self):
+        _, _, info = await self.call("user-info", "GET", "/api/user/info/")
+        await self.call("document-list", "GET", "/api/documents/?fields=list&page_size=50")
+        return info.get("profile", {}).get("checks_remaining", 0)
+
+    async def pay(self):
+        _, _, data = await self.call_json("payment-create", "POST", "/api/payment/create/", {"plan_id": PAYMENT_PLAN})
+        params = parse_qs(urlsplit(data["payment_url"]).query)
+        out_sum, inv_id = params["OutSum"][0], params["InvId"][0]
+        signature = hashlib.md5(f"{out_sum}:{inv_id}:{self.run.password_2}".encode()).hexdigest()
+        body = urlencode({"OutSum": out_sum, "InvId": inv_id, "SignatureValue": signature}).encode()
+        # Уведомление приходит от Robokassa — отдельное соединение без токена пользователя
+        robokassa = VirtualUser(self.run, self.number)
+        try:
+            await robokassa.call("payment-webhook", "POST", "/api/payment/webhook/", body,
+                                 {"Content-Type": "application/x-www-form-urlencoded"}, auth=False)
+        finally:
+            robokassa.connection.close()
+
+    async def upload(self):
+        filename, content_type, content = self.run.files.pick()
+        body, form_type = multipart("file", filename, content_type, content)
+        _, _, document = await self.call("analyze", "POST", "/api/analyze/", body, {"Content-Type": form_type})
+        return document
+
+    async def watch(self, pending):
+        """
+        Опрос статусов, пока загруженные документы не будут готовы. pending — {id: время загрузки}.
+        """
+        etag = None
+        path = "/api/documents/events/" + (f"?wait={self.run.long_poll}" if self.run.long_poll else "")
+        endpoint = "document-events-wait" if self.run.long_poll else "document-events"
+        deadline = time.monotonic() + ANALYSIS_TIMEOUT
+        while pending:
+            if time.monotonic() > deadline:
+                self.run.stats.record("analysis", ANALYSIS_TIMEOUT, "timeout")
+                raise SessionError("анализ не завершился")
+            started = time.monotonic()
+            _, headers, data = await self.call(endpoint, "GET", path, headers={"If-None-Match": etag} if etag else None)
+            etag = headers.get("etag", etag)
+            if data:
+                changed = False
+                for change in data["changes"]:
+                    if change["id"] in pending and change["status"] in ("processed", "failed"):
+                        self.finish_analysis(change["status"], pending.pop(change["id"]))
+                        changed = True
+                if changed:
+                    await self.call("document-list", "GET", "/api/documents/?fields=list&page_size=50")
+            if pending:
+                await asyncio.sleep(max(0, POLL_INTERVAL - (time.monotonic() - started)))
+
+    def finish_analysis(self, status, uploaded_at):
+        self.run.stats.analyses[status] += 1
+        if status == "processed":
+            self.run.stats.turnaround.append(time.monotonic() - uploaded_at)
+
+    async def session(self):
+        await self.sign_in()
+        await self.pause()
+        checks = await self.dashboard()
+        uploads = weighted_choice(UPLOADS_WEIGHTS)
+        if checks < uploads or random.random() < PAYMENT_SHARE:
+            await self.pause()
+            await self.pay()
+
+        pending, processed = {}, []
+        for _ in range(uploads):
+            await self.pause()
+            uploaded_at = time.monotonic()
+            document = await self.upload()
+            if document["status"] in ("processed", "failed"):
+                # Повторная загрузка или анализ прямо в запросе (Celery в режиме eager)
+                self.finish_analysis(document["status"], uploaded_at)
+            else:
+                pending[document["id"]] = uploaded_at
+            processed.append(document["id"])
+
+        await self.watch(pending)
+        await self.call("user-info", "GET", "/api/user/info/")
+        await self.pause()
+        await self.call("document-detail", "GET", f"/api/documents/{random.choice(processed)}/")
+
+    async def run_forever(self):
+        try:
+            while True:
+                try:
+                    await self.session()
+                except SessionError:
+                    pass  # Ошибка уже учтена; пользователь начинает заново, как после перезагрузки страницы
+                self.sessions += 1
+                await self.pause()
+        finally:
+            self.connection.close()
+
+
+def raise_open_files_limit():
+    # Каждый пользователь держит соединение: тысячи сокетов не помещаются в лимит 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def print_stage(summary):
+    analyses = ", ".join(f"{status} {count}" for status, count in summary["analyses"].items()) or "нет"
+    print(f"\nСтупень {summary['users']} пользователей, {summary['duration']} с: {summary['rps']} запросов/с, "
+          f"ошибок {summary['error_rate']:.1%}; анализов: {analyses}; до готового анализа "
+          f"p50 {summary['turnaround_p50_s']} с, p95 {summary['turnaround_p95_s']} с")
+    print(f"  {'эндпоинт':<22} {'запросов':>9} {'rps':>8} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} "
+          f"{'max мс':>9} {'ошибок':>8}")
+    for endpoint, e in summary["endpoints"].items():
+        errors = ", ".join(f"{reason}: {count}" for reason, count in e["errors"].items())
+        print(f"  {endpoint:<22} {e['requests']:>9} {e['rps']:>8.1f} {e['p50_ms']:>9.1f} {e['p95_ms']:>9.1f} "
+              f"{e['p99_ms']:>9.1f} {e['max_ms']:>9.1f} {e['error_rate']:>8.1%}" + (f"  ({errors})" if errors else ""))
+    for endpoint, e in summary["endpoints"].items():
+        for reason, sample in e["error_samples"].items():
+            print(f"  {endpoint} {reason}: {sample}")
+
+
+def breaking_reason(summary, max_error_rate, max_p95):
+    if summary["error_rate"] > max_error_rate:
+        return f"доля ошибок {summary['error_rate']:.1%} > {max_error_rate:.1%}"
+    for endpoint, e in summary["endpoints"].items():
+        if not e["long_poll"] and e["p95_ms"] > max_p95 * 1000:
+            return f"p95 {endpoint} {e['p95_ms'] / 1000:.2f} с > {max_p95} с"
+    return None
+
+
+async def run_stages(run, stages, stage_duration, spawn_rate, max_error_rate, max_p95):
+    tasks = []
+    summaries = []
+    try:
+        for users in stages:
+            while len(tasks) < users:
+                tasks.append(asyncio.create_task(VirtualUser(run, len(tasks)).run_forever()))
+                await asyncio.sleep(1 / spawn_rate)
+            run.stats = StageStats()
+            await asyncio.sleep(stage_duration)
+            summary = run.stats.summary(users, run.in_flight, max_p95, long_poll_endpoints={"document-events-wait"})
+            summary["breaking_reason"] = breaking_reason(summary, max_error_rate, max_p95)
+            summaries.append(summary)
+            print_stage(summary)
+            if summary["breaking_reason"]:
+                print(f"\nТочка отказа: {users} пользователей — {summary['breaking_reason']}")
+                break
+        else:
+            print(f"\nТочка отказа не достигнута: {stages[-1]} пользователей")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return summaries
+
+
+def wait_for_port(port, name, process=None):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            break
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{name} не запустился")
+
+
+def start_stack(args, password_2):
+    """
+    Мок-LLM и gunicorn с продакшн-конфигом. Возвращает (адрес API, процессы).
+    """
+    llm_port, api_port = free_port(), free_port()
+    llm = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(llm_port),
+         "--latency", str(args.llm_latency), "--tokens-per-second", str(args.tokens_per_second)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    processes = [llm]
+    try:
+        wait_for_port(llm_port, "Мок-LLM", llm)
+        env = dict(
+            os.environ, DEBUG="False", USE_MOCK_AI="False", DEEPSEEK_API_KEY="sk-test-mock",
+            LLM_BASE_URL=f"http://127.0.0.1:{llm_port}/v1", ROBOKASSA_PASSWORD_2=password_2,
+            DOCUMENT_EVENTS_MAX_WAIT=str(args.long_poll), LOG_LEVEL="WARNING",
+        )
+        api = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{api_port}",
+             "-w", str(args.workers), "--access-logfile", "/dev/null", "--error-logfile", "-",
+             *MODES[args.worker_class]],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        processes.append(api)
+        wait_for_port(api_port, "gunicorn", api)
+    except Exception:
+        for process in processes:
+            stop_server(process)
+        raise
+    return f"http://127.0.0.1:{api_port}", processes
+
+
+def cleanup(prefix):
+    documents = Document.objects.filter(user__username__startswith=prefix)
+    for document in documents.only("file", "improved_file").iterator():
+        for field in (document.file, document.improved_file):
+            if field:
+                field.delete(save=False)
+    # Сначала документы: возврат резерва незавершённых анализов пишет в журнал проверок пользователя
+    documents.delete()
+    User.objects.filter(username__startswith=prefix).delete()
+
+
+def main(args):
+    stages = [int(users) for users in args.users.split(",")]
+    prefix = f"loadgen-{uuid.uuid4().hex[:8]}-"
+    password_2 = os.getenv("ROBOKASSA_PASSWORD_2", "") if args.url else uuid.uuid4().hex
+    raise_open_files_limit()
+
+    print(f"Подготовка файлов ({args.file_variants} вариантов PDF и DOCX каждого размера)...")
+    files = FilePool(args.file_variants)
+
+    processes = []
+    if args.url:
+        url, host_header = args.url, None
+    else:
+        url, processes = start_stack(args, password_2)
+        host_header = "localhost"
+        print(f"gunicorn ({args.worker_class}, воркеров: {args.workers}) на {url}, "
+              f"мок-LLM с задержкой {args.llm_latency} с")
+
+    run = LoadRun(Target(url, host_header), files, prefix, args.think, args.long_poll, password_2)
+    try:
+        summaries = asyncio.run(run_stages(
+            run, stages, args.stage_duration, args.spawn_rate, args.max_error_rate, args.max_p95,
+        ))
+    finally:
+        for process in processes:
+            stop_server(process)
+        cleanup(prefix)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "url": args.url or "local",
+                "settings": {
+                    key: getattr(args, key) for key in (
+                        "users", "stage_duration", "spawn_rate", "think", "long_poll", "workers",
+                        "worker_class", "llm_latency", "tokens_per_second", "file_variants",
+                    )
+                },
+                "stages": summaries,
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="адрес уже запущенного сервера; без него поднимаются gunicorn и мок-LLM")
+    parser.add_argument("--users", default="50,200,500,1000", help="ступени числа одновременных пользователей")
+    parser.add_argument("--stage-duration", type=float, default=60, help="длительность замера ступени, сек")
+    parser.add_argument("--spawn-rate", type=float, default=50, help="новых пользователей в секунду")
+    parser.add_argument("--think", type=float, default=3, help="средняя пауза между действиями, сек")
+    parser.add_argument("--long-poll", type=int, default=0, help="wait для /documents/events/ (0 — обычный опрос)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="доля ошибок, после которой ступень — отказ")
+    parser.add_argument("--max-p95", type=float, default=5, help="p95 эндпоинта (сек), после которого ступень — отказ")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--worker-class", choices=list(MODES), default="asgi")
+    parser.add_argument("--llm-latency", type=float, default=2, help="задержка ответа мок-LLM, сек")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="скорость генерации мок-LLM (0 — мгновенно)")
+    parser.add_argument("--file-variants", type=int, default=10, help="вариантов PDF и DOCX каждого размера")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    main(parser.parse_args())
@@ -0,0 +1,190 @@
+"""
+Локальный мок OpenAI-совместимого API для проверки шлюза api/llm_gateway.py
+и бенчмарков без обращения к реальному провайдеру.
+
+Запуск (из каталога backend):
+    python -m benchmarks.mock_llm_server --port 8765 --latency 2 --failure-rate 0.1
+
+Затем указать приложению:
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 DEEPSEEK_API_KEY=sk-test-mock
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXT_MARKERS = ("Фрагмент договора:", "Текст договора:")
+
+
+def build_analysis(prompt):
+    """
+    Ответ в формате analyze_contract_with_ai: текст договора берётся из промпта
+    и "исправляется" так же, как в мок-режиме services.py. Если промпт просит
+    правки ('edits', режим patch), возвращаются только изменённые строки.
+    """
+    contract_text = prompt
+    for marker in TEXT_MARKERS:
+        if marker in prompt:
+            contract_text = prompt.split(marker, 1)[1]
+            break
+    contract_text = contract_text.removeprefix("\\n").strip()
+    result = {
+        "score": 70,
+        "summary": "Ответ мок-сервера LLM.",
+        "risks": [
+            {"title": "Штрафы за просрочку", "description": "Пеня 1% в день.", "severity": "high"},
+        ],
+        "recommendations": [
+            {"title": "Снизить пеню", "description": "Нормальная практика - 0.1%.", "clause_example": "Пеня 0.1% в день."},
+        ],
+    }
+    if "'edits'" in prompt:
+        result["edits"] = [
+            {"op": "replace", "anchor": line.strip(), "text": line.strip().replace("1%", "0.1%")}
+            for line in contract_text.splitlines() if "1%" in line
+        ]
+    else:
+        result["rewritten_text"] = contract_text.replace("1%", "0.1%")
+    return result
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего провайдера
+    latency = 0.0
+    failure_rate = 0.0
+    stream_delay = 0.0  # пауза между фрагментами потокового ответа
+    tokens_per_second = 0.0  # скорость генерации: время ответа растёт с числом выходных токенов
+    stats = {"requests": 0, "failures": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # Клиент закрыл keep-alive соединение
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request, content, piece=16):
+        """
+        SSE-поток в формате OpenAI: фрагменты по piece символов, затем [DONE].
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for i in range(0, len(content), piece):
+            write_event(json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + piece]}, "finish_reason": None}],
+            }, ensure_ascii=False))
+            delay = max(self.stream_delay, piece / 3 / self.tokens_per_second if self.tokens_per_second else 0)
+            if delay:
+                time.sleep(delay)
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if random.random() < self.failure_rate:
+            with self.stats_lock:
+                self.stats["failures"] += 1
+            status = random.choice([429, 500, 503])
+            self._send_json(status, {"error": {"message": "mock failure", "type": "server_error"}})
+            return
+
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = json.dumps(build_analysis(prompt), ensure_ascii=False)
+        with self.stats_lock:
+            self.stats["completion_tokens"] = self.stats.get("completion_tokens", 0) + len(content) // 3
+        if request.get("stream"):
+            self._send_stream(request, content)
+            return
+        if self.tokens_per_second:
+            time.sleep(len(content) / 3 / self.tokens_per_second)
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 3,
+                "completion_tokens": len(content) // 3,
+                "total_tokens": (len(prompt) + len(content)) // 3,
+            },
+        })
+
+
+def start_mock_server(port=0, latency=0.0, failure_rate=0.0, stream_delay=0.0, tokens_per_second=0.0):
+    """
+    Запускает мок-сервер в фоновом потоке и возвращает (server, base_url).
+    port=0 — выбрать свободный порт.
+    """
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {
+        "latency": latency,
+        "failure_rate": failure_rate,
+        "stream_delay": stream_delay,
+        "tokens_per_second": tokens_per_second,
+        "stats": {"requests": 0, "failures": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Мок OpenAI-совместимого API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="доля ответов 429/5xx")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="скорость генерации ответа (0 — мгновенно)")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(
+        args.port, args.latency, args.failure_rate, tokens_per_second=args.tokens_per_second
+    )
+    print(f"Мок LLM слушает {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
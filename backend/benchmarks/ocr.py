@@ -0,0 +1,92 @@
+"""
+Бенчмарк распознавания сканов PDF (api/ocr.py): страниц в секунду.
+
+Запуск (из каталога backend):
+    python -m benchmarks.ocr [--pages 20] [--scanned-share 0.5] [--workers N]
+
+Генерируется договор, в котором доля страниц — сканы (изображение страницы
+200 DPI без текстового слоя), остальные с текстом. Замеры:
+  все страницы    — распознавание каждой страницы, как при OCR всего документа;
+  без слоя, 1     — только страницы без текстового слоя, последовательно;
+  без слоя, пул   — то же пулом из --workers процессов;
+  повтор (кэш)    — тот же файл ещё раз: страницы берутся из кэша OCR.
+Кэш OCR на время замера направляется во временный каталог (кроме последнего замера).
+Нужен Tesseract с языками OCR_LANGUAGES (apt install tesseract-ocr tesseract-ocr-rus).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from api.ocr import find_scanned_pages, ocr_pages, tesseract_available
+from api.pdf_extraction import extract_pdf_pages
+from benchmarks.pdf_extraction import make_pdf
+
+SCAN_DPI = 200
+
+
+def make_scanned_pdf(path, page_count, scanned_share):
+    """
+    PDF, где каждая страница из доли scanned_share заменена её изображением.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "source.pdf")
+        make_pdf(source_path, page_count)
+        step = max(1, round(1 / scanned_share)) if scanned_share > 0 else page_count + 1
+        with fitz.open(source_path) as source, fitz.open() as doc:
+            for i, page in enumerate(source):
+                if i % step == 0:
+                    scan = doc.new_page(width=page.rect.width, height=page.rect.height)
+                    scan.insert_image(scan.rect, pixmap=page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY))
+                else:
+                    doc.insert_pdf(source, from_page=i, to_page=i)
+            doc.save(path)
+
+
+def measure(name, path, indices, workers, fresh_cache=True):
+    if fresh_cache:
+        shutil.rmtree(settings.OCR_CACHE_DIR, ignore_errors=True)
+    started = time.perf_counter()
+    texts, stats = ocr_pages(path, indices, workers=workers)
+    elapsed = time.perf_counter() - started
+    chars = sum(len(text) for text in texts.values())
+    print(
+        f"{name:<16} | {len(indices):>4} стр | {elapsed:>7.2f} с | {len(indices) / elapsed:>6.2f} стр/с | "
+        f"из кэша {stats['cached']:>4} | символов {chars}"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--scanned-share", type=float, default=0.5, help="доля страниц-сканов")
+    parser.add_argument("--workers", type=int, default=settings.OCR_MAX_WORKERS)
+    args = parser.parse_args()
+
+    if not tesseract_available():
+        sys.exit(f"Tesseract с языками {settings.OCR_LANGUAGES} недоступен ({settings.OCR_TESSERACT_CMD})")
+
+    with tempfile.TemporaryDirectory(prefix="ocr_bench_") as tmp:
+        settings.OCR_CACHE_DIR = os.path.join(tmp, "cache")
+        path = os.path.join(tmp, "scanned.pdf")
+        make_scanned_pdf(path, args.pages, args.scanned_share)
+        pages, _ = extract_pdf_pages(path, workers=1)
+        scanned = find_scanned_pages(path, pages)
+        print(f"Страниц: {len(pages)}, без текстового слоя: {len(scanned)}, процессов: {args.workers}")
+
+        measure("все страницы", path, list(range(len(pages))), args.workers)
+        measure("без слоя, 1", path, scanned, 1)
+        measure("без слоя, пул", path, scanned, args.workers)
+        measure("повтор (кэш)", path, scanned, args.workers, fresh_cache=False)
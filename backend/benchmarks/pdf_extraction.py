@@ -0,0 +1,113 @@
+"""
+Бенчмарк извлечения текста из PDF на документах 10/100/500 страниц.
+
+Запуск (из каталога backend):
+    python -m benchmarks.pdf_extraction
+
+Каждый замер выполняется в отдельном процессе, чтобы пиковый RSS
+не переносился между размерами документов.
+"""
+import os
+import sys
+import tempfile
+import multiprocessing
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from api.pdf_extraction import extract_pdf_pages, peak_rss_mb
+
+PAGE_COUNTS = [10, 100, 500]
+
+CLAUSE = (
+    "{n}. Арендатор обязуется своевременно вносить арендную плату. "
+    "За просрочку платежа начисляется пеня в размере 1% от суммы задолженности "
+    "за каждый день просрочки. Арендодатель вправе в одностороннем порядке "
+    "расторгнуть договор, уведомив Арендатора за 30 дней."
+)
+
+
+def make_pdf(path, page_count, nonce=""):
+    """
+    Генерирует PDF с текстовым слоем: по 12 пунктов договора на страницу.
+    nonce — строка внизу последней страницы, чтобы файлы одного размера различались.
+    """
+    doc = fitz.open()
+    for page_no in range(page_count):
+        page = doc.new_page()
+        text = "\n".join(CLAUSE.format(n=page_no * 12 + i + 1) for i in range(12))
+        page.insert_textbox(fitz.Rect(40, 40, 555, 800), text, fontsize=9, fontname="helv")
+    if nonce:
+        page.insert_text(fitz.Point(40, 815), f"ID: {nonce}", fontsize=8, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+
+def legacy_extract(path):
+    """
+    Прежняя реализация: копия файла в память и конкатенация строк в цикле.
+    """
+    from io import BytesIO
+    with open(path, "rb") as f:
+        doc = fitz.open(stream=BytesIO(f.read()).read(), filetype="pdf")
+    text = ""
+    for page in doc:
+        text += page.get_text()
+    return text
+
+
+def _run_case(path, mode, queue):
+    import time
+    started = time.perf_counter()
+    if mode == "legacy":
+        legacy_extract(path)
+        pages = fitz.open(path).page_count
+    else:
+        pages, _ = extract_pdf_pages(path, workers=1 if mode == "sequential" else None)
+        pages = len(pages)
+    wall_time = time.perf_counter() - started
+    queue.put({
+        "mode": mode,
+        "pages": pages,
+        "wall_time": round(wall_time, 4),
+        "ms_per_page": round(wall_time * 1000 / pages, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+
+def measure(path, mode):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(path, mode, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def run_benchmark():
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_count in PAGE_COUNTS:
+            path = os.path.join(tmp, f"contract_{page_count}.pdf")
+            make_pdf(path, page_count)
+            for mode in ("legacy", "sequential", "parallel"):
+                result = measure(path, mode)
+                results.append(result)
+                rss = result['peak_rss_mb']
+                print(
+                    f"{page_count:>4} стр. | {mode:<10} | {result['wall_time']:>8.3f} с | "
+                    f"{result['ms_per_page']:>7.3f} мс/стр. | пик RSS "
+                    + (f"{rss:>7.1f} МБ" if rss is not None else "    н/д")
+                )
+    return results
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,234 @@
+"""
+Стресс-тест учёта проверок (api/quota.py): сотни одновременных загрузок
+одного пользователя и повторы вебхука оплаты.
+
+Запуск (из каталога backend):
+    python -m benchmarks.quota_stress [--uploads 300] [--threads 50] [--checks 100]
+
+Работает на временной базе с применёнными миграциями, рабочая база не затрагивается:
+для PostgreSQL из настроек (для честной конкуренции) — test_<DB_NAME>, для SQLite —
+файл во временном каталоге. В конце временная база удаляется.
+Проверяемые инварианты:
+  - баланс не уходит в минус, подтверждённых проверок не больше, чем было;
+  - итоговый баланс = начальный + оплаты - подтверждённые проверки;
+  - сумма движений журнала совпадает с изменением баланса;
+  - повторная доставка вебхука начисляет проверки один раз;
+  - сбой AI (шлюз исчерпал повторы) переводит документ в failed и возвращает проверку.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.models import CheckLedgerEntry, Document, Transaction, UserProfile
+from api import services
+from api.quota import commit_check, credit_payment, record_reservation, release_check, reserve_check
+from api.tasks import analyze_text_stage, render_document_stage
+
+WEBHOOK_REPLAYS = 20
+CREDIT_CHECKS = 20
+
+
+def upload(user_id, outcome_lock, outcomes):
+    """
+    Загрузка так, как её делает ContractAnalysisView: резерв и документ в одной транзакции,
+    затем успех или ошибка анализа (каждый исход вызывается дважды — повтор стадии).
+    """
+    try:
+        with transaction.atomic():
+            if not reserve_check(user_id):
+                result = "rejected"
+                document = None
+            else:
+                document = Document.objects.create(
+                    file="contracts/stress.txt", name="stress.txt", user_id=user_id, quota_state="reserved"
+                )
+                record_reservation(document)
+                result = "reserved"
+
+        if document is not None:
+            if random.random() < 0.7:
+                committed = commit_check(document.id)
+                commit_check(document.id)
+                result = "committed" if committed else "commit_lost"
+            else:
+                released = release_check(document.id)
+                release_check(document.id)
+                result = "released" if released else "release_lost"
+    finally:
+        connection.close()
+
+    with outcome_lock:
+        outcomes[result] = outcomes.get(result, 0) + 1
+
+
+def webhook(inv_id):
+    try:
+        return credit_payment(inv_id) is not None
+    finally:
+        connection.close()
+
+
+class FailingGateway:
+    """
+    Шлюз LLM, у которого исчерпаны повторы: каждый запрос завершается ошибкой.
+    """
+
+    def chat_completion(self, **kwargs):
+        raise TimeoutError("LLM timeout after retries")
+
+    def stream_chat_completion(self, **kwargs):
+        raise TimeoutError("LLM timeout after retries")
+
+
+def failed_analysis(user_id):
+    """
+    Стадии анализа и рендеринга при сбое AI: проверка должна вернуться на баланс,
+    документ — перейти в failed. Возвращает список нарушений.
+    """
+    balance_before = UserProfile.objects.get(user_id=user_id).checks_remaining
+    with transaction.atomic():
+        if not reserve_check(user_id):
+            return ["нет проверки для сценария сбоя AI"]
+        document = Document.objects.create(
+            file="contracts/stress.txt", name="stress.txt", user_id=user_id, quota_state="reserved"
+        )
+        record_reservation(document)
+
+    # Уникальный текст: кэш анализа не должен отдать готовый результат
+    text = f"Договор {uuid.uuid4().hex}. " + "Арендатор обязуется вносить плату ежемесячно. " * 5
+    real_mock, real_gateway = services.is_mock_ai, services.get_llm_gateway
+    services.is_mock_ai = lambda: False
+    services.get_llm_gateway = FailingGateway
+    try:
+        payload = analyze_text_stage.run({"document_id": document.id, "text": text})
+        render_document_stage.run(payload)
+    finally:
+        services.is_mock_ai, services.get_llm_gateway = real_mock, real_gateway
+
+    document.refresh_from_db()
+    errors = []
+    if document.status != 'failed':
+        errors.append(f"сбой AI: документ в статусе {document.status}, а не failed")
+    if document.quota_state != 'released':
+        errors.append(f"сбой AI: резерв в состоянии {document.quota_state}, а не released")
+    if UserProfile.objects.get(user_id=user_id).checks_remaining != balance_before:
+        errors.append("сбой AI: проверка списана")
+    print(f"Сбой AI: статус {document.status}, резерв {document.quota_state}")
+    return errors
+
+
+def create_throwaway_database(tmp_dir):
+    """
+    Создаёт временную базу с миграциями и переключает на неё соединения.
+    Возвращает имя рабочей базы для destroy_test_db.
+    """
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite':
+        # По умолчанию тестовая SQLite-база — в памяти, а потокам нужен общий файл
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp_dir, "quota_stress.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return old_name
+
+
+def run(uploads, threads, checks):
+    user = User.objects.create_user(username=f"quota-stress-{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex)
+    UserProfile.objects.filter(user=user).update(checks_remaining=checks, total_checks_count=0)
+    payment = Transaction.objects.create(user=user, amount=990, checks_count=CREDIT_CHECKS, status='pending')
+
+    outcomes = {}
+    outcome_lock = threading.Lock()
+    negative_seen = []
+
+    def watch(stop):
+        while not stop.is_set():
+            balance = UserProfile.objects.filter(user=user).values_list('checks_remaining', flat=True).first()
+            if balance is not None and balance < 0:
+                negative_seen.append(balance)
+            time.sleep(0.01)
+        connection.close()
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch, args=(stop,))
+    watcher.start()
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(upload, user.id, outcome_lock, outcomes) for _ in range(uploads)]
+            # Robokassa повторяет уведомление — доставки приходят параллельно с загрузками
+            credits = [executor.submit(webhook, payment.id) for _ in range(WEBHOOK_REPLAYS)]
+            for future in futures:
+                future.result()
+            credited = sum(1 for future in credits if future.result())
+    finally:
+        stop.set()
+        watcher.join()
+    elapsed = time.perf_counter() - started
+
+    profile = UserProfile.objects.get(user=user)
+    committed = outcomes.get("committed", 0)
+    ledger_delta = CheckLedgerEntry.objects.filter(user=user).aggregate(total=Sum('amount'))['total'] or 0
+    expected = checks + CREDIT_CHECKS * credited - committed
+
+    print(f"Загрузок: {uploads}, потоков: {threads}, проверок в начале: {checks}, время: {elapsed:.2f} с")
+    print(f"Исходы: {outcomes}")
+    print(f"Начислений по вебхуку: {credited} из {WEBHOOK_REPLAYS} доставок")
+    print(f"Баланс: {profile.checks_remaining} (ожидается {expected}), списано всего: {profile.total_checks_count}")
+    print(f"Сумма журнала: {ledger_delta:+d} (изменение баланса {profile.checks_remaining - checks:+d})")
+
+    errors = []
+    if negative_seen:
+        errors.append(f"баланс уходил в минус: {min(negative_seen)}")
+    if committed > checks + CREDIT_CHECKS * credited:
+        errors.append("подтверждено больше проверок, чем было на балансе")
+    if credited != 1:
+        errors.append(f"вебхук начислил {credited} раз")
+    if profile.checks_remaining != expected:
+        errors.append("итоговый баланс не сходится")
+    if profile.total_checks_count != committed:
+        errors.append("счётчик списаний не совпадает с подтверждёнными проверками")
+    if ledger_delta != profile.checks_remaining - checks:
+        errors.append("журнал не совпадает с балансом")
+    if outcomes.get("commit_lost") or outcomes.get("release_lost"):
+        errors.append("резерв потерян между резервом и подтверждением")
+
+    UserProfile.objects.filter(user=user).update(checks_remaining=1)
+    errors.extend(failed_analysis(user.id))
+
+    if errors:
+        print("ОШИБКИ: " + "; ".join(errors))
+        return 1
+    print("Все инварианты выполнены")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--checks", type=int, default=100)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="crisha-quota-") as tmp:
+        old_name = create_throwaway_database(tmp)
+        try:
+            code = run(args.uploads, args.threads, args.checks)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    sys.exit(code)
@@ -0,0 +1,97 @@
+"""
+Бенчмарк режимов переписывания договора: полный текст ('full') против правок по пунктам ('patch').
+
+Запуск (из каталога backend):
+    python -m benchmarks.rewrite_modes [--tokens-per-second 400]
+
+Анализ идёт через analyze_contract_with_ai и шлюз LLM к локальному мок-серверу
+(benchmarks/mock_llm_server.py), у которого время ответа пропорционально числу
+выходных токенов — как у настоящей модели. Длинные договоры проходят через
+анализ по частям (AI_CHUNK_CHARS). Для каждого размера печатаются выходные
+токены, время от запроса до готового текста и совпадение итоговых текстов.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ['USE_MOCK_AI'] = 'False'
+os.environ['DEEPSEEK_API_KEY'] = 'sk-test-mock'
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from benchmarks.mock_llm_server import start_mock_server
+
+CLAUSE_COUNTS = [20, 60, 200]
+
+CLAUSES = [
+    "{n}. Арендатор обязуется своевременно вносить арендную плату не позднее 5 числа каждого месяца.",
+    "{n}. Арендодатель передаёт помещение по акту приёма-передачи в течение 3 рабочих дней.",
+    "{n}. Арендатор обязан содержать помещение в исправном состоянии и за свой счёт производить текущий ремонт.",
+    "{n}. За просрочку платежа начисляется пеня в размере 1% от суммы задолженности за каждый день просрочки.",
+    "{n}. Споры разрешаются путём переговоров, а при недостижении согласия — в суде по месту нахождения Арендодателя.",
+    "{n}. Изменения и дополнения к договору действительны, если совершены в письменной форме и подписаны сторонами.",
+]
+
+
+def make_contract(clause_count):
+    return "\n".join(CLAUSES[i % len(CLAUSES)].format(n=i + 1) for i in range(clause_count))
+
+
+def run_mode(mode, text, stats):
+    from api.services import analyze_contract_with_ai
+
+    settings.AI_REWRITE_MODE = mode
+    tokens_before = stats.get("completion_tokens", 0)
+    requests_before = stats["requests"]
+    started = time.perf_counter()
+    result = analyze_contract_with_ai(text)
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "output_tokens": stats.get("completion_tokens", 0) - tokens_before,
+        "requests": stats["requests"] - requests_before,
+        "seconds": round(elapsed, 2),
+        "text": result.get("rewritten_text") or "",
+        "patch_stats": result.get("patch_stats"),
+    }
+
+
+def run_benchmark(tokens_per_second):
+    server, base_url = start_mock_server(tokens_per_second=tokens_per_second)
+    settings.LLM_BASE_URL = base_url
+    stats = server.RequestHandlerClass.stats
+
+    results = []
+    try:
+        for clause_count in CLAUSE_COUNTS:
+            text = make_contract(clause_count)
+            full = run_mode("full", text, stats)
+            patch = run_mode("patch", text, stats)
+            same = full["text"].strip() == patch["text"].strip()
+            for result in (full, patch):
+                print(
+                    f"{clause_count:>4} п. ({len(text):>6} симв.) | {result['mode']:<5} | "
+                    f"{result['output_tokens']:>6} вых. токенов | {result['requests']:>2} запр. | {result['seconds']:>7.2f} с"
+                )
+            print(
+                f"     экономия токенов: {1 - patch['output_tokens'] / full['output_tokens']:.0%}, "
+                f"ускорение: {full['seconds'] / patch['seconds']:.1f}x, тексты совпадают: {same}"
+            )
+            results.append({"clauses": clause_count, "full": full, "patch": patch, "same_text": same})
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="скорость генерации мок-модели")
+    args = parser.parse_args()
+    run_benchmark(args.tokens_per_second)
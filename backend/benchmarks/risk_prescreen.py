@@ -0,0 +1,93 @@
+"""
+Бенчмарк предварительной проверки договора по правилам (api/risk_rules.py).
+
+Запуск (из каталога backend):
+    python -m benchmarks.risk_prescreen [--repeat 5]
+
+Сравнивается RiskMatcher (правила скомпилированы заранее, регулярные
+выражения запускаются только при наличии ключевых подстрок правила)
+с поочерёдным поиском каждого шаблона по тексту.
+Для договоров разного размера печатается время проверки, найденные
+правила и предварительная оценка.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from api.risk_rules import get_risk_matcher, prescreen_contract
+
+PAGES = [1, 10, 100, 300]
+CHARS_PER_PAGE = 3000
+
+CLAUSES = [
+    "{n}.1. Арендатор обязуется своевременно вносить арендную плату не позднее 5 числа каждого месяца.",
+    "{n}.2. Арендодатель передаёт помещение по акту приёма-передачи в течение 3 рабочих дней.",
+    "{n}.3. Арендатор обязан содержать помещение в исправном состоянии и за свой счёт производить текущий ремонт.",
+    "{n}.4. Изменения и дополнения к договору действительны, если совершены в письменной форме.",
+]
+RISKY_CLAUSES = [
+    "За просрочку платежа начисляется пеня в размере 1% от суммы задолженности за каждый день просрочки.",
+    "Арендодатель вправе расторгнуть договор в одностороннем порядке, уведомив Арендатора за 5 дней.",
+    "Обеспечительный платёж при досрочном расторжении договора не возвращается.",
+    "Споры рассматриваются в суде по месту нахождения Арендодателя.",
+]
+
+
+def make_text(pages):
+    lines = []
+    n = 0
+    while sum(len(line) + 1 for line in lines) < pages * CHARS_PER_PAGE:
+        n += 1
+        lines.extend(clause.format(n=n) for clause in CLAUSES)
+    # Рискованные пункты — в конце, чтобы поиск проходил весь текст
+    lines.extend(f"{n + 1}.{i + 1}. {clause}" for i, clause in enumerate(RISKY_CLAUSES))
+    return "\n".join(lines)
+
+
+def per_pattern_search(text):
+    found = set()
+    for rule in get_risk_matcher().rules:
+        for pattern in rule['patterns']:
+            if re.search(pattern, text, re.IGNORECASE):
+                found.add(rule['id'])
+                break
+    return found
+
+
+def best_time(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(text)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run_benchmark(repeat):
+    get_risk_matcher()  # свод правил компилируется один раз на процесс
+    for pages in PAGES:
+        text = make_text(pages)
+        combined, prescreen = best_time(prescreen_contract, text, repeat)
+        separate, found = best_time(per_pattern_search, text, repeat)
+        rules = sorted(risk['rule'] for risk in prescreen['risks'])
+        print(
+            f"{pages:>4} стр. ({len(text):>7} симв.) | RiskMatcher {combined * 1000:>7.2f} мс | "
+            f"по шаблонам {separate * 1000:>7.2f} мс | оценка {prescreen['score']:>3} | "
+            f"правила: {', '.join(rules)} | совпадает: {set(rules) == found}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
@@ -0,0 +1,91 @@
+"""
+Бенчмарк сохранённого текста и полнотекстового поиска (api/text_store.py, api/search.py).
+
+Запуск (из каталога backend):
+    python -m benchmarks.search [--documents 200] [--pages 20] [--repeat 20]
+
+Замеры:
+  извлечение      — повторный разбор исходного PDF, как при повторном анализе до сохранения текста;
+  из DocumentText — чтение и распаковка сохранённого текста того же документа;
+  поиск           — search_documents по архиву из --documents договоров пользователя
+                    (ранжирование в БД и фрагменты с подсветкой), мс на запрос.
+Пользователь и документы создаются в текущей БД и удаляются по завершении.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from api.models import Document, DocumentText
+from api.search import index_document, search_documents
+from api.services import extract_pages_from_pdf
+from api.text_store import load_document_text, save_document_text
+from benchmarks.pdf_extraction import CLAUSE, make_pdf
+
+QUERIES = ["просрочку платежа", "арендная плата", "расторгнуть договор", "пеня задолженности"]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def make_pages(page_count, offset):
+    return [
+        "\n".join(CLAUSE.format(n=offset + page_no * 12 + i + 1) for i in range(12)) + "\n"
+        for page_no in range(page_count)
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f"bench-search-{uuid.uuid4().hex[:8]}")
+    try:
+        with tempfile.TemporaryDirectory(prefix="search_bench_") as tmp:
+            path = os.path.join(tmp, "contract.pdf")
+            make_pdf(path, args.pages)
+            document = Document.objects.create(user=user, name="contract.pdf", status='processed')
+            text = save_document_text(document.id, extract_pages_from_pdf(path))
+            stored = DocumentText.objects.get(document=document)
+            print(f"Текст: {stored.chars} символов, сжато {len(stored.content)} байт "
+                  f"({stored.chars / max(len(stored.content), 1):.1f}x)")
+            print(f"{'извлечение':<16} | {timed(lambda: extract_pages_from_pdf(path), args.repeat):>8.2f} мс")
+            print(f"{'из DocumentText':<16} | {timed(lambda: load_document_text(document.id), args.repeat):>8.2f} мс")
+
+        for i in range(args.documents):
+            document = Document.objects.create(
+                user=user, name=f"Договор аренды {i}.pdf", status='processed',
+                summary="Договор аренды помещения", risks=[{"title": "Пеня за просрочку платежа"}],
+            )
+            save_document_text(document.id, make_pages(args.pages, i * 1000))
+            index_document(document.id)
+
+        print(f"Поиск ({connection.vendor}), документов: {args.documents}, страниц в каждом: {args.pages}")
+        for query in QUERIES:
+            found = len(search_documents(user.id, query))
+            print(f"  {query:<22} | {timed(lambda: search_documents(user.id, query), args.repeat):>8.2f} мс | "
+                  f"найдено {found}")
+    finally:
+        user.delete()
@@ -0,0 +1,284 @@
+"""
+Набор бенчмарков: извлечение текста, сборка DOCX, конвейер анализа и полный цикл загрузки.
+
+Запуск (из каталога backend):
+    python -m benchmarks.suite [--json results.json] [--compare baseline.json]
+                               [--repeat 5] [--llm-latency 0.2] [--only extract,render]
+
+Группы замеров:
+  extract — extract_text_from_pdf / docx / txt на сгенерированных договорах 1/10/50 страниц;
+  render  — save_improved_document для тех же размеров;
+  ai      — analyze_document_task (конвейер extract -> analyze -> render, Celery в режиме eager)
+            с мок-LLM (benchmarks/mock_llm_server.py) с настраиваемой задержкой;
+  e2e     — POST /api/analyze/ и GET /api/documents/<id>/ через тестовый клиент DRF
+            до статуса 'processed'.
+
+Каждый замер повторяется --repeat раз, в результат пишутся медиана, минимум и максимум.
+--json сохраняет результаты вместе с коммитом и окружением. --compare сравнивает их
+с файлом прошлого запуска и завершает процесс с кодом 1, если минимальное время
+какого-либо замера выросло больше чем на --threshold (и больше чем на --min-delta
+секунд — короткие замеры слишком шумные). Файлы, пользователи и документы создаются
+во временном каталоге MEDIA_ROOT и удаляются в конце. Кэш анализа не влияет на
+замеры: у каждого прогона свой текст договора.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Анализ идёт через шлюз LLM к мок-серверу, а не через встроенную заглушку
+os.environ['USE_MOCK_AI'] = 'False'
+os.environ['DEEPSEEK_API_KEY'] = 'sk-test-mock'
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.docx_render import render_docx
+from api.models import Document, UserProfile
+from api.services import (
+    extract_text_from_docx,
+    extract_text_from_pdf,
+    extract_text_from_txt,
+    save_improved_document,
+)
+from api.tasks import analyze_document_task
+from benchmarks.mock_llm_server import start_mock_server
+from benchmarks.pdf_extraction import CLAUSE, make_pdf
+
+GROUPS = ("extract", "render", "ai", "e2e")
+PAGE_COUNTS = [1, 10, 50]
+AI_PAGE_COUNTS = [1, 5]
+CLAUSES_PER_PAGE = 12
+E2E_TIMEOUT = 120  # сек на один документ
+
+
+def make_text(pages, nonce=""):
+    lines = [CLAUSE.format(n=i + 1) for i in range(pages * CLAUSES_PER_PAGE)]
+    if nonce:
+        # Уникальная строка: другой хэш файла и другой ключ кэша анализа
+        lines.append(f"Номер экземпляра: {nonce}")
+    return "\n".join(lines)
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        "median": round(statistics.median(timings), 4),
+        "min": round(min(timings), 4),
+        "max": round(max(timings), 4),
+        "runs": repeat,
+    }
+
+
+def report(results, group, name, params, timing, **extra):
+    result = {"group": group, "name": name, "params": params, **timing, **extra}
+    results.append(result)
+    params_text = ", ".join(f"{k}={v}" for k, v in params.items())
+    print(f"{group:<7} | {name:<22} | {params_text:<24} | медиана {timing['median'] * 1000:>9.1f} мс | "
+          f"мин {timing['min'] * 1000:>9.1f} мс")
+    return result
+
+
+def bench_extract(results, tmp, repeat):
+    for pages in PAGE_COUNTS:
+        text = make_text(pages)
+        pdf_path = os.path.join(tmp, f"extract_{pages}.pdf")
+        make_pdf(pdf_path, pages)
+        docx_bytes = render_docx(text)
+        txt_bytes = text.encode("utf-8")
+
+        report(results, "extract", "extract_text_from_pdf", {"pages": pages},
+               timed(lambda: extract_text_from_pdf(pdf_path), repeat))
+        report(results, "extract", "extract_text_from_docx", {"pages": pages},
+               timed(lambda: extract_text_from_docx(io.BytesIO(docx_bytes)), repeat))
+        report(results, "extract", "extract_text_from_txt", {"pages": pages},
+               timed(lambda: extract_text_from_txt(io.BytesIO(txt_bytes)), repeat))
+
+
+def bench_render(results, repeat):
+    for pages in PAGE_COUNTS:
+        text = make_text(pages)
+        report(results, "render", "save_improved_document", {"pages": pages},
+               timed(lambda: save_improved_document(text, "contracts/bench.txt"), repeat))
+
+
+def create_bench_user():
+    user = User.objects.create_user(username=f"bench-{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex)
+    UserProfile.objects.filter(user=user).update(checks_remaining=10000)
+    return user
+
+
+def bench_ai(results, repeat, llm_latency):
+    user = create_bench_user()
+    try:
+        for pages in AI_PAGE_COUNTS:
+            stage_timings = []
+
+            def run():
+                document = Document(user=user, name="bench.txt")
+                text = make_text(pages, uuid.uuid4().hex)
+                document.file.save("bench.txt", ContentFile(text.encode("utf-8")), save=True)
+                analyze_document_task(document.id)
+                document.refresh_from_db()
+                if document.status != "processed":
+                    raise RuntimeError(f"Документ {document.id}: статус {document.status}, {document.summary}")
+                stage_timings.append(document.stage_timings)
+
+            timing = timed(run, repeat)
+            stages = {
+                stage: round(statistics.median(t.get(stage, 0) for t in stage_timings), 4)
+                for stage in ("extract", "prescreen", "analyze", "render")
+            }
+            report(results, "ai", "analyze_document_task", {"pages": pages, "llm_latency": llm_latency},
+                   timing, stages=stages)
+    finally:
+        user.delete()
+
+
+def bench_e2e(results, repeat, llm_latency):
+    user = create_bench_user()
+    client = APIClient(SERVER_NAME="localhost")
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+    try:
+        for pages in AI_PAGE_COUNTS:
+            def run():
+                upload = ContentFile(make_text(pages, uuid.uuid4().hex).encode("utf-8"), name="bench.txt")
+                response = client.post("/api/analyze/", {"file": upload}, format="multipart")
+                if response.status_code != 201:
+                    raise RuntimeError(f"POST /api/analyze/: {response.status_code} {response.content[:200]}")
+                document_id = response.json()["id"]
+                deadline = time.monotonic() + E2E_TIMEOUT
+                while time.monotonic() < deadline:
+                    detail = client.get(f"/api/documents/{document_id}/").json()
+                    if detail["status"] in ("processed", "failed"):
+                        break
+                    time.sleep(0.05)
+                if detail["status"] != "processed":
+                    raise RuntimeError(f"Документ {document_id}: статус {detail['status']}")
+
+            report(results, "e2e", "analyze_upload_flow", {"pages": pages, "llm_latency": llm_latency},
+                   timed(run, repeat))
+    finally:
+        user.delete()
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def result_key(result):
+    return result["group"], result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline_path, threshold, min_delta):
+    """
+    Печатает изменение времени относительно прошлого запуска. Возвращает число регрессий.
+    Сравнивается минимум по повторам: он меньше всего зависит от фоновой нагрузки.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result_key(r): r for r in baseline["results"]}
+    print(f"\nСравнение с {baseline_path} (коммит {baseline.get('commit') or '?'}):")
+    regressions = 0
+    for result in results:
+        before = previous.get(result_key(result))
+        if not before or not before["min"]:
+            continue
+        change = result["min"] / before["min"] - 1
+        regressed = change > threshold and result["min"] - before["min"] > min_delta
+        regressions += regressed
+        params_text = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"{'РЕГРЕССИЯ ' if regressed else '          '}{result['group']:<7} | {result['name']:<22} | "
+              f"{params_text:<24} | {before['min'] * 1000:>9.1f} -> {result['min'] * 1000:>9.1f} мс ({change:+.0%})")
+    return regressions
+
+
+def run_suite(groups, repeat, llm_latency, tokens_per_second):
+    results = []
+    tmp = tempfile.mkdtemp(prefix="crisha-bench-")
+    server, base_url = start_mock_server(latency=llm_latency, tokens_per_second=tokens_per_second)
+    try:
+        with override_settings(
+            MEDIA_ROOT=os.path.join(tmp, "media"),
+            DOC_CONVERTER_CACHE_DIR=os.path.join(tmp, "doc_conversion_cache"),
+            LLM_BASE_URL=base_url,
+            CELERY_TASK_ALWAYS_EAGER=True,
+        ):
+            if "extract" in groups:
+                bench_extract(results, tmp, repeat)
+            if "render" in groups:
+                bench_render(results, repeat)
+            if "ai" in groups:
+                bench_ai(results, repeat, llm_latency)
+            if "e2e" in groups:
+                bench_e2e(results, repeat, llm_latency)
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--compare", help="файл результатов прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый относительный рост времени при сравнении")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="рост меньше этого (сек) не считается регрессией")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="задержка ответа мок-LLM, сек")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="скорость генерации мок-LLM (0 — мгновенно)")
+    parser.add_argument("--only", help=f"группы через запятую: {','.join(GROUPS)}")
+    args = parser.parse_args()
+
+    groups = args.only.split(",") if args.only else GROUPS
+    results = run_suite(groups, args.repeat, args.llm_latency, args.tokens_per_second)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": current_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "settings": {
+                    "repeat": args.repeat,
+                    "llm_latency": args.llm_latency,
+                    "tokens_per_second": args.tokens_per_second,
+                    "ai_rewrite_mode": settings.AI_REWRITE_MODE,
+                    "docx_renderer": settings.DOCX_RENDERER,
+                },
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold, args.min_delta):
+        sys.exit(1)
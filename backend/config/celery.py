@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -15,6 +16,30 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+def close_db_pools():
+    from django.db import connections
+    for connection in connections.all():
+        if connection.vendor == 'postgresql' and connection.settings_dict['OPTIONS'].get('pool'):
+            connection.close_pool()
+
+@worker_init.connect
+def close_db_pools_before_fork(**kwargs):
+    # Главный процесс воркера закрывает свой пул соединений PostgreSQL до запуска
+    # дочерних процессов: открытые соединения не достаются им по наследству
+    close_db_pools()
+
+@worker_process_init.connect
+def drop_inherited_db_pool(**kwargs):
+    # Объект пула, унаследованный через fork, дочернему процессу не подходит: фоновые
+    # потоки пула не копируются. Пул закрывается — процесс откроет свой при первом запросе к БД
+    close_db_pools()
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    # Дочерний процесс prefork-пула завершился: его gauge-метрики больше не учитываются
+    from api.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -68,7 +68,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.auth_cache.CachedTokenAuthentication',  # TokenAuthentication с кэшем токена
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -86,6 +86,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'api.metrics.MetricsMiddleware',  # Длительность и коды ответов API для /api/metrics/
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -111,12 +112,53 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Без DB_ENGINE — SQLite для разработки, в продакшне — PostgreSQL из .env (DB_*)
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL: чтения не ждут записи, запись не ждёт чтений. Транзакции берут блокировку
+                # записи сразу (IMMEDIATE), а не при первой записи, — параллельные загрузки
+                # ждут busy_timeout в очереди вместо 'database is locked' посреди транзакции
+                'init_command': (
+                    f"PRAGMA journal_mode={os.getenv('DB_SQLITE_JOURNAL_MODE', 'WAL')};"
+                    "PRAGMA synchronous=NORMAL;"
+                ),
+                'transaction_mode': os.getenv('DB_SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+                'timeout': int(os.getenv('DB_SQLITE_TIMEOUT', 20)),  # секунды ожидания блокировки
+            },
+        }
+    }
+else:
+    # Пул соединений psycopg 3 в каждом процессе gunicorn и Celery: соединение берётся
+    # на запрос или задачу и возвращается в пул, а не открывается заново. Размер пула —
+    # на процесс: воркеру Celery llm с пулом потоков нужно не меньше его --concurrency
+    # (DB_POOL_MAX_SIZE задаётся в его systemd-юните)
+    DB_POOL = os.getenv('DB_POOL', 'True') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', 'contractcheck_db'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Без пула — постоянные соединения с проверкой перед повторным использованием
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 8)),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),  # секунды ожидания свободного соединения
+                },
+            } if DB_POOL else {},
+        }
     }
-}
 
 
 # Password validation
@@ -186,11 +228,88 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
 ]
 
+# ETag нужен фронтенду для условного опроса /api/documents/events/
+CORS_EXPOSE_HEADERS = ['etag']
+
+# Кэш: Redis в продакшне (общий для gunicorn и Celery), LocMem в разработке
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэш аутентификации по токену и ответа /api/user/info/ (api/auth_cache.py), секунды.
+# Изменения сбрасывают кэш сразу; срок — предел на случай пропущенного сброса
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300))
+USER_INFO_CACHE_TTL = int(os.getenv('USER_INFO_CACHE_TTL', 300))
+
+# Long-poll статусов документов (api/notifications.py). Под ASGI (uvicorn-воркеры)
+# ожидание не занимает воркер — в продакшне включается через .env. По умолчанию 0:
+# под WSGI (runserver, sync-воркеры) ответ отдаётся сразу (304 без изменений)
+DOCUMENT_EVENTS_MAX_WAIT = int(os.getenv('DOCUMENT_EVENTS_MAX_WAIT', 0))  # секунды
+
 # Upload Settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 
+# Загрузка по частям (api/uploads.py): предел файла как у nginx (client_max_body_size 20M),
+# часть не больше DATA_UPLOAD_MAX_MEMORY_SIZE — веб-воркер держит в памяти одну часть
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # рекомендуемый размер части
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_SIZE', 5 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))  # незавершённая загрузка, сек
+UPLOAD_CLEANUP_INTERVAL = int(os.getenv('UPLOAD_CLEANUP_INTERVAL', 3600))  # сек между удалениями брошенных загрузок (Celery beat)
+
+# Пакетная загрузка (api/batches.py): файлов в пакете и их общий размер после распаковки ZIP
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 100))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 200 * 1024 * 1024))  # как client_max_body_size пакетов в nginx
+DATA_UPLOAD_MAX_NUMBER_FILES = BATCH_MAX_FILES
+
+# Повторная загрузка того же файла в этом окне возвращает существующий документ
+DUPLICATE_UPLOAD_WINDOW = int(os.getenv('DUPLICATE_UPLOAD_WINDOW', 3600))  # секунды
+
+# Логи: JSON в одну строку (api/log_context.py) с document_id для записей конвейера.
+# LOG_FORMAT=text — привычный текстовый вывод для локальной разработки
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'document_context': {'()': 'api.log_context.DocumentContextFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'api.log_context.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s [document_id=%(document_id)s] %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['document_context'],
+            'formatter': LOG_FORMAT,
+        },
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Метрики Prometheus (api/metrics.py) на /api/metrics/. Процессы gunicorn и Celery
+# пишут их в общий каталог PROMETHEUS_MULTIPROC_DIR (задаётся в .env, см. deploy/systemd).
+# METRICS_TOKEN — если задан, эндпоинт требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'django-db'
@@ -199,6 +318,17 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Конвейер анализа: CPU-стадии и ожидание LLM масштабируются отдельными воркерами
+# cpu — prefork-пул, llm — пул потоков (см. deploy/systemd)
+CELERY_TASK_ROUTES = {
+    'api.tasks.extract_text_stage': {'queue': 'cpu'},
+    'api.tasks.analyze_text_stage': {'queue': 'llm'},
+    'api.tasks.render_document_stage': {'queue': 'cpu'},
+}
+# Подтверждение после выполнения: стадии идемпотентны, упавший воркер не теряет задачу
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Режим разработки: задачи выполняются синхронно если Redis недоступен
 # Установить False когда Redis запущен для настоящей асинхронной обработки
 CELERY_TASK_ALWAYS_EAGER = True
@@ -223,3 +353,100 @@ REST_AUTH = {
     'SESSION_LOGIN': False
 }
 
+
+# Кэш результатов AI-анализа (api/analysis_cache.py)
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', 30 * 24 * 3600))  # секунды
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 5000))
+
+# Планировщик анализов (api/scheduler.py): слоты конвейера, полосы тарифов, оценка ожидания
+ANALYSIS_MAX_RUNNING = int(os.getenv('ANALYSIS_MAX_RUNNING', 16))  # документов в конвейере всего (потоки LLM-воркера)
+ANALYSIS_MAX_PER_USER = int(os.getenv('ANALYSIS_MAX_PER_USER', 3))  # документов в конвейере у одного пользователя
+ANALYSIS_LANE_AGING = int(os.getenv('ANALYSIS_LANE_AGING', 300))  # сек ожидания на подъём на полосу выше; 0 — без подъёма
+ANALYSIS_SLOT_TIMEOUT = int(os.getenv('ANALYSIS_SLOT_TIMEOUT', 1800))  # сек, после которых слот зависшего документа свободен
+ANALYSIS_DEFAULT_DURATION = int(os.getenv('ANALYSIS_DEFAULT_DURATION', 60))  # сек, оценка до первых завершённых анализов
+ANALYSIS_MAX_DISPATCHES = int(os.getenv('ANALYSIS_MAX_DISPATCHES', 2))  # запусков зависшего документа до перевода в failed
+ANALYSIS_RECOVERY_INTERVAL = int(os.getenv('ANALYSIS_RECOVERY_INTERVAL', 60))  # сек между проверками зависших (Celery beat)
+ANALYSIS_HEARTBEAT_INTERVAL = int(os.getenv('ANALYSIS_HEARTBEAT_INTERVAL', 30))  # сек между отметками работающей стадии
+ANALYSIS_HEARTBEAT_TIMEOUT = int(os.getenv('ANALYSIS_HEARTBEAT_TIMEOUT', 180))  # сек без отметки, после которых стадия считается остановившейся
+
+# Периодические задачи Celery beat (deploy/systemd/contractcheck-celery-beat.service)
+CELERY_BEAT_SCHEDULE = {
+    # Возврат в очередь документов, чей воркер упал или задача потерялась (api/scheduler.py)
+    'recover-stale-analyses': {
+        'task': 'api.tasks.recover_stale_analyses_task',
+        'schedule': ANALYSIS_RECOVERY_INTERVAL,
+    },
+    # Удаление брошенных загрузок по частям всех пользователей вместе с частями (api/uploads.py)
+    'cleanup-expired-uploads': {
+        'task': 'api.tasks.cleanup_expired_uploads_task',
+        'schedule': UPLOAD_CLEANUP_INTERVAL,
+    },
+}
+
+# Анализ длинных договоров по частям (api/chunked_analysis.py)
+AI_CHUNK_CHARS = int(os.getenv('AI_CHUNK_CHARS', 14000))  # максимальный размер части, символов
+AI_CHUNK_WORKERS = int(os.getenv('AI_CHUNK_WORKERS', 4))  # одновременных запросов к AI на документ
+AI_DOCUMENT_TOKEN_BUDGET = int(os.getenv('AI_DOCUMENT_TOKEN_BUDGET', 200000))
+AI_DOCUMENT_TIME_BUDGET = int(os.getenv('AI_DOCUMENT_TIME_BUDGET', 600))  # секунды
+
+# Режим переписывания договора: 'full' — модель переписывает текст целиком (по умолчанию);
+# 'patch' (экспериментальный) — модель возвращает правки по пунктам, они применяются
+# к тексту локально (api/patching.py)
+AI_REWRITE_MODE = os.getenv('AI_REWRITE_MODE', 'full')
+AI_PATCH_FUZZY_THRESHOLD = float(os.getenv('AI_PATCH_FUZZY_THRESHOLD', 0.85))  # сходство якоря с абзацем
+
+# Предварительная проверка по правилам до ответа AI (api/risk_rules.py)
+RISK_RULES_PATH = os.getenv('RISK_RULES_PATH', '')  # JSON-свод правил; пусто — встроенный DEFAULT_RISK_RULES
+AI_PRESCREEN_CLEAN_SCORE = int(os.getenv('AI_PRESCREEN_CLEAN_SCORE', 95))  # оценка «чистого» документа
+# Модель для «чистых» документов (без рисков high/medium); пусто — всегда основная модель
+AI_CHEAP_MODEL = os.getenv('AI_CHEAP_MODEL', '')
+
+# Шлюз к LLM (api/llm_gateway.py)
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'https://api.polza.ai/api/v1')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 180))  # таймаут одного запроса, сек
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 1))  # сек
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 30))  # сек
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))  # одновременных запросов на процесс
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 300))  # ожидание свободного слота, сек
+
+# Конвертация .doc через пул headless LibreOffice (api/doc_conversion.py)
+# unoserver ставится в системный Python вместе с python3-uno (см. deploy/deploy.sh)
+DOC_CONVERTER_PYTHON = os.getenv('DOC_CONVERTER_PYTHON', '/usr/bin/python3')
+DOC_CONVERTER_POOL_SIZE = int(os.getenv('DOC_CONVERTER_POOL_SIZE', 1))  # процессов LibreOffice на воркер
+DOC_CONVERTER_START_TIMEOUT = float(os.getenv('DOC_CONVERTER_START_TIMEOUT', 30))  # сек
+DOC_CONVERTER_TIMEOUT = float(os.getenv('DOC_CONVERTER_TIMEOUT', 120))  # таймаут одной конвертации, сек
+DOC_CONVERTER_QUEUE_TIMEOUT = float(os.getenv('DOC_CONVERTER_QUEUE_TIMEOUT', 300))  # ожидание свободного воркера, сек
+DOC_CONVERTER_MAX_CONVERSIONS = int(os.getenv('DOC_CONVERTER_MAX_CONVERSIONS', 200))  # после — перезапуск воркера
+# Кэш сконвертированных файлов — вне MEDIA_ROOT: /media/ nginx отдаёт публично
+DOC_CONVERTER_CACHE_DIR = os.getenv('DOC_CONVERTER_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'doc_conversion_cache'))
+
+# Полнотекстовый поиск по документам пользователя (api/search.py)
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+SEARCH_SNIPPETS_PER_DOCUMENT = int(os.getenv('SEARCH_SNIPPETS_PER_DOCUMENT', 3))
+SEARCH_SNIPPET_CHARS = int(os.getenv('SEARCH_SNIPPET_CHARS', 160))  # длина фрагмента вокруг совпадения
+# Символов текста в индексе: tsvector PostgreSQL не больше 1 МБ, хвост очень длинного договора не индексируется
+SEARCH_INDEX_MAX_CHARS = int(os.getenv('SEARCH_INDEX_MAX_CHARS', 300000))
+
+# Извлечение текста PDF (api/pdf_extraction.py): большие файлы — параллельно пулом процессов
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 64))  # страниц, с которых включается пул
+PDF_MAX_WORKERS = int(os.getenv('PDF_MAX_WORKERS', os.cpu_count() or 1))  # процессов пула на документ
+
+# Распознавание сканов PDF (api/ocr.py): только страницы без текстового слоя, локальный Tesseract
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'True') == 'True'
+OCR_TESSERACT_CMD = os.getenv('OCR_TESSERACT_CMD', 'tesseract')
+OCR_LANGUAGES = os.getenv('OCR_LANGUAGES', 'rus+eng')
+OCR_MIN_PAGE_CHARS = int(os.getenv('OCR_MIN_PAGE_CHARS', 20))  # меньше символов на странице — нет текстового слоя
+OCR_MIN_DPI = int(os.getenv('OCR_MIN_DPI', 200))  # пределы DPI растеризации страницы
+OCR_MAX_DPI = int(os.getenv('OCR_MAX_DPI', 400))
+OCR_MAX_WORKERS = int(os.getenv('OCR_MAX_WORKERS', os.cpu_count() or 1))  # страниц параллельно
+OCR_PAGE_TIMEOUT = float(os.getenv('OCR_PAGE_TIMEOUT', 120))  # таймаут распознавания страницы, сек
+# Кэш распознанного текста страниц — вне MEDIA_ROOT: /media/ nginx отдаёт публично
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'ocr_cache'))
+OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', 30 * 24 * 3600))  # секунды с последнего использования
+OCR_CACHE_MAX_SIZE = int(os.getenv('OCR_CACHE_MAX_SIZE', 500 * 1024 * 1024))  # байт
+
+# Сборка улучшенного DOCX: 'template' — XML параграфов в заранее подготовленный шаблон
+# (api/docx_render.py), 'python-docx' — через объектную модель python-docx
+DOCX_RENDERER = os.getenv('DOCX_RENDERER', 'template')
+DOCX_TEMPLATE_PATH = os.getenv('DOCX_TEMPLATE_PATH', '')  # свой .docx со стилями Normal и Heading 1-3; пусто — шаблон python-docx
@@ -1,5 +1,6 @@
 # Конфигурация Gunicorn для продакшна
-# Использование: gunicorn -c gunicorn.conf.py config.wsgi:application
+# Использование: gunicorn -c gunicorn.conf.py config.asgi:application
+import os
 
 # Адрес и порт (Django слушает здесь, Nginx проксирует сюда)
 bind = "127.0.0.1:8000"
@@ -7,8 +8,10 @@ bind = "127.0.0.1:8000"
 # Количество воркеров: (2 * CPU_cores) + 1
 workers = 3
 
-# Тип воркера (sync хорош для большинства случаев)
-worker_class = "sync"
+# Тип воркера: uvicorn (ASGI). Ожидание БД, кэша, загрузок и long-poll статусов
+# не занимает воркер целиком, в отличие от sync, где 3 медленных запроса блокируют сервер.
+# Для отката на WSGI: GUNICORN_WORKER_CLASS=sync и config.wsgi:application
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
 
 # Таймаут (секунды) — увеличен из-за долгого AI-анализа
 timeout = 120
@@ -21,3 +24,11 @@ loglevel = "info"
 # Перезапуск воркеров при утечке памяти
 max_requests = 1000
 max_requests_jitter = 100
+
+
+# Метрики Prometheus (api/metrics.py): gauge-значения завершившегося воркера
+# больше не учитываются. Каталог PROMETHEUS_MULTIPROC_DIR общий с Celery
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -19,7 +19,11 @@ apt-get install -y python3 python3-pip python3-venv \
     postgresql postgresql-contrib \
     nginx redis-server \
     certbot python3-certbot-nginx \
-    git curl
+    git curl \
+    libreoffice-writer-nogui python3-uno \
+    tesseract-ocr tesseract-ocr-rus tesseract-ocr-eng
+# unoserver работает в системном Python: модуль uno недоступен из venv
+pip3 install --break-system-packages unoserver
 
 # --- 2. PostgreSQL ---
 echo "🐘 Настраиваем PostgreSQL..."
@@ -44,13 +48,18 @@ python manage.py collectstatic --noinput
 echo "📝 Создаём директорию для логов..."
 mkdir -p /var/log/contractcheck
 chown www-data:www-data /var/log/contractcheck
+# Служебные кэши (распознанный текст сканов, сконвертированные .doc) — вне публичного /media/
+mkdir -p "$BACKEND_DIR/var"
+chown www-data:www-data "$BACKEND_DIR/var"
 
 # --- 6. Systemd сервисы ---
 echo "🔧 Устанавливаем Systemd сервисы..."
 cp "$PROJECT_DIR/deploy/systemd/contractcheck-gunicorn.service" /etc/systemd/system/
 cp "$PROJECT_DIR/deploy/systemd/contractcheck-celery.service" /etc/systemd/system/
+cp "$PROJECT_DIR/deploy/systemd/contractcheck-celery-llm.service" /etc/systemd/system/
+cp "$PROJECT_DIR/deploy/systemd/contractcheck-celery-beat.service" /etc/systemd/system/
 systemctl daemon-reload
-systemctl enable contractcheck-gunicorn contractcheck-celery redis
+systemctl enable contractcheck-gunicorn contractcheck-celery contractcheck-celery-llm contractcheck-celery-beat redis
 systemctl start redis
 
 # --- 7. Nginx ---
@@ -66,9 +75,11 @@ certbot --nginx -d contractcheck.ru -d www.contractcheck.ru --non-interactive --
 
 # --- 9. Запуск всего ---
 echo "▶️ Запускаем сервисы..."
-systemctl start contractcheck-gunicorn contractcheck-celery
+systemctl start contractcheck-gunicorn contractcheck-celery contractcheck-celery-llm contractcheck-celery-beat
 systemctl status contractcheck-gunicorn --no-pager
 systemctl status contractcheck-celery --no-pager
+systemctl status contractcheck-celery-llm --no-pager
+systemctl status contractcheck-celery-beat --no-pager
 
 echo ""
 echo "✅ Деплой завершён!"
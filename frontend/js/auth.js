@@ -119,6 +119,56 @@ const auth = {
         }
 
         return response;
+    },
+
+    /**
+     * Следит за сменой статусов документов через /documents/events/.
+     * Сервер отвечает 304 из кэша, пока ничего не изменилось, и отдаёт
+     * только изменившиеся документы, когда изменения есть.
+     * @param {Function} onChange - получает {version, full, changes}
+     * @param {number} interval - минимальная пауза между запросами, мс
+     * @returns {Function} остановка наблюдения
+     */
+    watchDocumentStatus(onChange, interval = 5000) {
+        let etag = null;
+        let stopped = false;
+        let timer = null;
+
+        const poll = async () => {
+            const token = localStorage.getItem('cc_token');
+            if (stopped || !token) return;
+
+            const started = Date.now();
+            try {
+                const headers = { 'Authorization': `Token ${token}` };
+                if (etag) headers['If-None-Match'] = etag;
+
+                // wait — long-poll, если сервер его разрешает (ASGI); иначе ответ приходит сразу
+                const response = await fetch(`${API_URL}/documents/events/?wait=25`, { headers });
+                if (response.status === 401) {
+                    stopped = true;
+                    return;
+                }
+                if (response.status === 200) {
+                    etag = response.headers.get('ETag');
+                    onChange(await response.json());
+                } else if (response.status === 304) {
+                    etag = response.headers.get('ETag') || etag;
+                }
+            } catch (error) {
+                console.error('Error watching document status:', error);
+            }
+
+            if (!stopped) {
+                timer = setTimeout(poll, Math.max(0, interval - (Date.now() - started)));
+            }
+        };
+
+        poll();
+        return () => {
+            stopped = true;
+            if (timer) clearTimeout(timer);
+        };
     }
 };
 
@@ -1,6 +1,7 @@
 document.addEventListener('DOMContentLoaded', async () => {
     // БЕЗ auth.checkAuth - работаем без авторизации
-    let pollingTimer = null;
+    let stopWatching = null;
+    let knownStatuses = {};
 
     // Пользователь
     await loadUserInfo();
@@ -148,7 +149,8 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
 
         try {
-            const response = await fetch('http://127.0.0.1:8000/api/documents/', {
+            // Только лёгкие колонки и первая страница; остальное — по кнопке "Показать ещё"
+            const response = await fetch('http://127.0.0.1:8000/api/documents/?fields=list&page_size=50', {
                 headers: {
                     'Authorization': `Token ${token}`,
                     'Content-Type': 'application/json'
@@ -163,19 +165,22 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             if (!response.ok) throw new Error('Failed');
 
-            const documents = await response.json();
+            const data = await response.json();
+            const documents = data.results;
+            knownStatuses = {};
             renderTable(documents);
-            updateStats(documents);
-
-            // Polling logic: if any document is pending, poll again in 5 seconds
-            const hasPending = documents.some(doc => doc.status === 'pending');
-            if (hasPending && !pollingTimer) {
-                console.log('--- Start polling for pending documents ---');
-                pollingTimer = setInterval(loadDocuments, 5000);
-            } else if (!hasPending && pollingTimer) {
-                console.log('--- Stop polling: all documents processed ---');
-                clearInterval(pollingTimer);
-                pollingTimer = null;
+            renderLoadMore(data.next);
+            updateStats(data.stats);
+
+            // Пока есть документы в обработке — следим за сменой статусов (без полного списка)
+            const hasPending = documents.some(doc => doc.status === 'pending' || doc.status === 'analyzing');
+            if (hasPending && !stopWatching) {
+                console.log('--- Start watching pending documents ---');
+                stopWatching = auth.watchDocumentStatus(onStatusChange);
+            } else if (!hasPending && stopWatching) {
+                console.log('--- Stop watching: all documents processed ---');
+                stopWatching();
+                stopWatching = null;
                 // Also refresh user info to show updated check count
                 await loadUserInfo();
             }
@@ -186,11 +191,47 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
-    function renderTable(documents) {
+    // Список перезапрашивается, только если статус или оценка действительно изменились
+    function onStatusChange(data) {
+        const changed = data.changes.some(doc => knownStatuses[doc.id] !== `${doc.status}:${doc.score}`);
+        if (changed) loadDocuments();
+    }
+
+    async function loadMoreDocuments(url) {
+        const token = localStorage.getItem('cc_token');
+        try {
+            const response = await fetch(url, {
+                headers: { 'Authorization': `Token ${token}` }
+            });
+            if (!response.ok) throw new Error('Failed');
+
+            const data = await response.json();
+            renderTable(data.results, true);
+            renderLoadMore(data.next);
+        } catch (error) {
+            console.error('Error loading more documents:', error);
+        }
+    }
+
+    function renderLoadMore(nextUrl) {
+        const tableBody = document.getElementById('documents-table-body');
+        const oldRow = document.getElementById('load-more-row');
+        if (oldRow) oldRow.remove();
+        if (!nextUrl) return;
+
+        const row = document.createElement('tr');
+        row.id = 'load-more-row';
+        row.innerHTML = '<td colspan="5" class="px-6 py-4 text-center"><button class="text-brand-orange hover:underline text-sm">Показать ещё</button></td>';
+        row.querySelector('button').addEventListener('click', () => loadMoreDocuments(nextUrl));
+        tableBody.appendChild(row);
+    }
+
+    function renderTable(documents, append = false) {
         const tableBody = document.getElementById('documents-table-body');
-        tableBody.innerHTML = '';
+        if (!append) tableBody.innerHTML = '';
+        documents.forEach(doc => knownStatuses[doc.id] = `${doc.status}:${doc.score}`);
 
-        if (documents.length === 0) {
+        if (documents.length === 0 && !append) {
             tableBody.innerHTML = '<tr><td colspan="5" class="px-6 py-4 text-center text-gray-500">Нет документов</td></tr>';
             return;
         }
@@ -202,7 +243,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                 <td class="px-6 py-4 text-sm text-gray-400" data-label="Дата">${new Date(doc.uploaded_at).toLocaleDateString('ru-RU')}</td>
                 <td class="px-6 py-4" data-label="Статус">
                     <span class="px-3 py-1 text-xs rounded-full ${doc.status === 'processed' ? 'bg-green-500/20 text-green-400' : doc.status === 'failed' ? 'bg-red-500/20 text-red-400' : 'bg-yellow-500/20 text-yellow-400'}">
-                        ${doc.status === 'processed' ? 'Готов' : doc.status === 'failed' ? 'Ошибка' : '<span class="inline-block animate-spin mr-1">⌛</span> Обработка'}
+                        ${doc.status === 'processed' ? 'Готов' : doc.status === 'failed' ? 'Ошибка' : doc.status === 'analyzing' ? '<span class="inline-block animate-spin mr-1">⌛</span> Улучшение текста' : '<span class="inline-block animate-spin mr-1">⌛</span> Обработка'}
                     </span>
                 </td>
                 <td class="px-6 py-4" data-label="Оценка">
@@ -224,14 +265,15 @@ document.addEventListener('DOMContentLoaded', async () => {
                 </td>
             </tr>
         `;
-            tableBody.innerHTML += row;
+            tableBody.insertAdjacentHTML('beforeend', row);
         });
     }
 
-    function updateStats(documents) {
-        const total = documents.length;
-        const processed = documents.filter(d => d.status === 'processed').length;
-        const avgScore = processed > 0 ? Math.round(documents.reduce((sum, d) => sum + (d.score || 0), 0) / processed) : 0;
+    // Сводка считается на сервере по всем документам, а не по загруженной странице
+    function updateStats(stats) {
+        const total = stats.total;
+        const processed = stats.processed;
+        const avgScore = Math.round(stats.avg_score || 0);
 
         // Safely update elements if they exist
         const elTotal = document.querySelector('.stat-total') || document.getElementById('docs-count');
@@ -1,5 +1,7 @@
 document.addEventListener('DOMContentLoaded', async () => {
-    let pollingTimer = null;
+    let stopWatching = null;
+    let lastState = null;
+    let queueTimer = null;
 
     // Auth Check
     const token = localStorage.getItem('cc_token');
@@ -78,15 +80,29 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             const doc = await response.json();
             renderDocument(doc);
+            lastState = `${doc.status}:${doc.score}`;
+
+            // Смена статуса приходит через /documents/events/, детали перезапрашиваются только при изменении
+            // 'analyzing' — оценка и риски уже готовы, AI ещё переписывает текст
+            const inProgress = doc.status === 'pending' || doc.status === 'analyzing';
+            if (inProgress && !stopWatching) {
+                console.log('--- Start watching document status ---');
+                stopWatching = auth.watchDocumentStatus(data => {
+                    const change = data.changes.find(d => String(d.id) === String(id));
+                    if (change && `${change.status}:${change.score}` !== lastState) {
+                        loadDocumentDetails(id, token);
+                    }
+                });
+            } else if (!inProgress && stopWatching) {
+                console.log('--- Stop watching: analysis complete ---');
+                stopWatching();
+                stopWatching = null;
+            }
 
-            // Polling logic
-            if (doc.status === 'pending' && !pollingTimer) {
-                console.log('--- Start polling for document details ---');
-                pollingTimer = setInterval(() => loadDocumentDetails(id, token), 5000);
-            } else if (doc.status !== 'pending' && pollingTimer) {
-                console.log('--- Stop polling: analysis complete ---');
-                clearInterval(pollingTimer);
-                pollingTimer = null;
+            // Позиция в очереди меняется без смены статуса — обновляем карточку, пока документ ждёт слота
+            clearTimeout(queueTimer);
+            if (doc.queue_position) {
+                queueTimer = setTimeout(() => loadDocumentDetails(id, token), 15000);
             }
         } catch (error) {
             console.error('Error loading document details:', error);
@@ -110,7 +126,11 @@ document.addEventListener('DOMContentLoaded', async () => {
         // Status
         const statusEl = document.getElementById('doc-status');
         if (statusEl) {
-            statusEl.textContent = doc.status === 'processed' ? 'Готов' : doc.status === 'failed' ? 'Ошибка' : 'Обработка';
+            statusEl.textContent = doc.status === 'processed' ? 'Готов' : doc.status === 'failed' ? 'Ошибка' : doc.status === 'analyzing' ? 'Улучшение текста' : 'Обработка';
+            if (doc.queue_position) {
+                const minutes = Math.max(1, Math.round((doc.estimated_wait || 0) / 60));
+                statusEl.textContent = `В очереди: ${doc.queue_position}, ожидание ~${minutes} мин`;
+            }
             statusEl.className = `px-3 py-1 rounded-lg text-white inline-block text-sm ${doc.status === 'processed' ? 'bg-green-500/20 text-green-400' :
                 doc.status === 'failed' ? 'bg-red-500/20 text-red-400' :
                     'bg-yellow-500/20 text-yellow-400'
@@ -16,6 +16,8 @@ document.addEventListener('DOMContentLoaded', () => {
         ENDPOINTS: {
             HEALTH: '/health/',
             ANALYZE: '/analyze/',
+            UPLOADS: '/uploads/',
+            BATCH: '/analyze/batch/',
             LOGOUT: '/auth/logout/'
         },
         SELECTORS: {
@@ -181,7 +183,14 @@ document.addEventListener('DOMContentLoaded', () => {
             e.stopPropagation();
             e.preventDefault();
 
-            const file = e.target.files[0];
+            const files = Array.from(e.target.files);
+            // Несколько файлов или ZIP-архив — один запрос пакетной загрузки (только для авторизованных)
+            if (state.token && (files.length > 1 || (files[0] && files[0].name.toLowerCase().endsWith('.zip')))) {
+                uploadFile(files);
+                return;
+            }
+
+            const file = files[0];
             const validTypes = ['application/pdf', 'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'text/plain'];
 
             // Simple extension check as fallback
@@ -199,8 +208,9 @@ document.addEventListener('DOMContentLoaded', () => {
     async function uploadFile(file) {
         const loadingState = document.querySelector(CONFIG.SELECTORS.LOADING_STATE);
         const loadingText = document.querySelector(CONFIG.SELECTORS.LOADING_TEXT);
+        const isBatch = Array.isArray(file);
 
-        log(`Starting upload: ${file.name} (${file.size} bytes)`);
+        log(isBatch ? `Starting batch upload: ${file.length} files` : `Starting upload: ${file.name} (${file.size} bytes)`);
 
         if (loadingState) loadingState.classList.remove('hidden');
 
@@ -223,18 +233,31 @@ document.addEventListener('DOMContentLoaded', () => {
             }, 1500);
         }
 
-        const formData = new FormData();
-        formData.append('file', file);
-
         try {
             const headers = { 'Accept': 'application/json' };
             if (state.token) headers['Authorization'] = `Token ${state.token}`;
 
-            const response = await fetch(`${CONFIG.API_URL}${CONFIG.ENDPOINTS.ANALYZE}`, {
-                method: 'POST',
-                body: formData,
-                headers: headers
-            });
+            // Авторизованные пользователи загружают файл по частям с докачкой после обрыва
+            let response;
+            if (isBatch) {
+                const formData = new FormData();
+                file.forEach(f => formData.append(f.name.toLowerCase().endsWith('.zip') ? 'archive' : 'files', f));
+                response = await fetch(`${CONFIG.API_URL}${CONFIG.ENDPOINTS.BATCH}`, {
+                    method: 'POST',
+                    body: formData,
+                    headers: headers
+                });
+            } else if (state.token) {
+                response = await uploadFileInChunks(file, headers);
+            } else {
+                const formData = new FormData();
+                formData.append('file', file);
+                response = await fetch(`${CONFIG.API_URL}${CONFIG.ENDPOINTS.ANALYZE}`, {
+                    method: 'POST',
+                    body: formData,
+                    headers: headers
+                });
+            }
 
             if (response.ok) {
                 const data = await response.json();
@@ -286,6 +309,53 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Загрузка по частям: init -> части со смещением -> finalize.
+     * При сетевой ошибке часть повторяется; смещение сверяется с сервером,
+     * поэтому после обрыва уже принятые байты заново не отправляются.
+     * Возвращает Response запроса init (при ошибке) или finalize.
+     */
+    async function uploadFileInChunks(file, headers) {
+        const base = `${CONFIG.API_URL}${CONFIG.ENDPOINTS.UPLOADS}`;
+        const initResponse = await fetch(base, {
+            method: 'POST',
+            headers: { ...headers, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        if (!initResponse.ok) return initResponse;
+
+        const session = await initResponse.json();
+        const chunkSize = session.chunk_size;
+        let offset = session.offset;
+        let attempts = 0;
+
+        while (offset < file.size) {
+            try {
+                const response = await fetch(`${base}${session.id}/chunk/?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { ...headers, 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(offset, offset + chunkSize)
+                });
+                if (response.ok || response.status === 409) {
+                    // 409 — сервер ожидает другое смещение (часть уже принята)
+                    offset = (await response.json()).offset;
+                    attempts = 0;
+                    continue;
+                }
+                if (response.status < 500) return response;
+            } catch (error) {
+                log(`Chunk upload error at ${offset}: ${error.message}`, 'error');
+            }
+
+            if (++attempts > 5) throw new Error('Не удалось загрузить файл: соединение прерывается');
+            await new Promise(resolve => setTimeout(resolve, 1000 * attempts));
+            const status = await fetch(`${base}${session.id}/`, { headers });
+            if (status.ok) offset = (await status.json()).offset;
+        }
+
+        return fetch(`${base}${session.id}/finalize/`, { method: 'POST', headers });
+    }
+
     // --- Results Modal Logic ---
     function initResultsModal() {
         const closeBtn = document.querySelector(CONFIG.SELECTORS.CLOSE_RESULTS_BTN);